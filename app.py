@@ -4,6 +4,8 @@ from flask import Flask, render_template, request, jsonify, redirect, url_for, s
 import pandas as pd
 import math
 
+from status_store import SUCCESS, open_store
+
 app = Flask(__name__)
 
 # Configuration
@@ -30,11 +32,9 @@ def get_favicon_path(shop_id, shop_name):
     filename = f"{shop_id}_{clean_shop_name}.png"
     return filename
 
-def favicon_exists(shop_id, shop_name):
-    """Check if favicon file exists"""
-    filename = get_favicon_path(shop_id, shop_name)
-    filepath = os.path.join(FAVICON_DIR, filename)
-    return os.path.exists(filepath)
+def shop_id_from_favicon(filename):
+    """Shop ID part of a favicon filename (format: ShopID_domain_name.png)"""
+    return filename.split('_', 1)[0]
 
 @app.route('/')
 def index():
@@ -44,10 +44,11 @@ def index():
     # Load shop data
     df = load_shop_data()
     
-    # Filter only shops with existing favicons
+    # Filter only shops with existing favicons (one indexed query instead of a stat per shop)
+    existing_shop_ids = open_store().shop_ids_with_status(SUCCESS)
     shops_with_favicons = []
     for _, row in df.iterrows():
-        if favicon_exists(row['Shop ID'], row['Shop']):
+        if str(row['Shop ID']) in existing_shop_ids:
             shops_with_favicons.append({
                 'id': row['Shop ID'],
                 'name': row['Shop'],
@@ -89,6 +90,7 @@ def move_favicon():
     try:
         if os.path.exists(source_path):
             shutil.move(source_path, dest_path)
+            open_store().mark_not_correct(shop_id_from_favicon(filename), dest_path)
             return jsonify({'success': True})
         else:
             return jsonify({'success': False, 'error': 'File not found'})
@@ -110,6 +112,7 @@ def undo_move():
     try:
         if os.path.exists(source_path):
             shutil.move(source_path, dest_path)
+            open_store().mark_success(shop_id_from_favicon(filename), None, dest_path, count_attempt=False)
             return jsonify({'success': True})
         else:
             return jsonify({'success': False, 'error': 'File not found'})
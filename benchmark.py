@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+"""
+Scraper Benchmark
+Measures the Google lookup path end to end without touching Google. A local
+HTTP server stands in for the search engine and answers every search with a
+SERP fixture built from the structures the extraction approaches look for
+(#search, cite, XNo5Ab, q0vns, DDKf1c), optionally behind a consent dialog,
+with injected delays, late-rendered favicons and block pages. The real
+FaviconScraper drives a real browser against it through the configurable
+search base URL, in a throwaway working directory.
+
+Reported per run: shops per minute, p50/p95 per-shop latency, WebDriver round
+trips per shop and the average seconds per phase. Every run is appended as one
+JSON line to benchmark_results.jsonl together with the git revision, and
+compared with the previous run of the same scenario.
+
+Saved debug pages (debug_{shop_id}_{domain}.html) can be replayed instead of
+the synthetic fixtures with --fixtures DIR.
+"""
+
+import base64
+import glob
+import hashlib
+import io
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlparse
+
+from PIL import Image
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_FILE = os.path.join(REPO_DIR, 'benchmark_results.jsonl')
+
+# Result layouts a search can come back with, each one hitting a different approach first
+KINDS = ('cite', 'q0vns', 'ddkf1c', 'nearby', 'none')
+# Other sites on every results page, so the domain matching has something to reject
+DISTRACTORS = ('wikipedia.org', 'marktplaats.nl', 'trustpilot.com', 'kvk.nl')
+
+# Stores the scraper opens, redirected into the benchmark's working directory
+STORE_ENV = {
+    'FAVICON_STATUS_DB': 'shop_status.db',
+    'FAVICON_DOMAIN_CACHE': 'domain_cache.db',
+    'FAVICON_DOWNLOAD_DB': 'download_validators.db',
+    'FAVICON_BLOB_DIR': 'favicon_blobs',
+    'FAVICON_PLACEHOLDERS': 'placeholder_hashes.txt',
+    'FAVICON_CONSENT_COOKIES': 'consent_cookies.json',
+}
+
+DEFAULT_SCENARIO = {
+    'mix': list(KINDS[:-1]) + ['none'],
+    'serp_delay_ms': 300,
+    'jitter_ms': 200,
+    'icon_delay_ms': 100,
+    'late_ms': 0,
+    'consent': True,
+    'block_rate': 0.0,
+    'url_icons': False,
+    'seed': 1,
+}
+
+CONSENT_OVERLAY = """
+<div id="consent-overlay" style="position:fixed;top:0;left:0;right:0;bottom:0;background:rgba(0,0,0,.5);z-index:9">
+  <div style="background:#fff;margin:100px auto;width:400px;padding:20px">
+    <p>Voordat je verdergaat naar Google</p>
+    <button onclick="document.cookie='CONSENT=YES+; path=/'; document.getElementById('consent-overlay').remove()">Alles accepteren</button>
+  </div>
+</div>
+"""
+
+def icon_png(domain):
+    """A small favicon with a colour of its own for every domain"""
+    digest = hashlib.sha256(domain.encode('utf-8')).digest()
+    image = Image.new('RGB', (32, 32), tuple(digest[:3]))
+    for i in range(32):
+        image.putpixel((i, i), tuple(digest[3:6]))
+    output = io.BytesIO()
+    image.save(output, format='PNG')
+    return output.getvalue()
+
+def result_block(kind, domain, icon_src):
+    """HTML of one search result for domain, laid out the way `kind` describes"""
+    name = domain.split('.')[0].capitalize()
+    if kind == 'cite':
+        # Current Google layout: matches approaches 1, 2 and 2.5
+        return f"""
+<div class="MjjYud"><div class="g"><div class="yuRUbf"><div><span><a href="https://www.{domain}/">
+  <h3>{name} - Webshop</h3>
+  <div class="notranslate"><div class="q0vns">
+    <span class="H9lube"><div class="eqA2re"><img class="XNo5Ab" src="{icon_src}" alt=""></div></span>
+    <div><span class="VuuXrf">{name}</span><div class="byrV5b"><cite class="qLRx3b">https://www.{domain}<span> › shop</span></cite></div></div>
+  </div></div>
+</a></span></div></div></div></div>"""
+    if kind == 'q0vns':
+        return f"""
+<div class="kb0PBd"><a href="https://www.{domain}/"><h3>{name}</h3>
+  <div class="q0vns"><img class="XNo5Ab" src="{icon_src}" alt=""><cite>https://www.{domain}</cite></div>
+</a></div>"""
+    if kind == 'ddkf1c':
+        return f"""
+<div class="hlcw0c"><div class="Wt5Tfe"><div><span class="DDKf1c"><img class="XNo5Ab" src="{icon_src}" alt=""></span></div>
+  <div><div><span>{name}</span><cite>{domain}</cite></div></div>
+</div></div>"""
+    if kind == 'nearby':
+        return f"""
+<div class="kb0PBd"><div><span><img src="{icon_src}" alt=""></span><cite>www.{domain} › contact</cite></div></div>"""
+    return ''
+
+class SerpFixtureServer:
+    """Local stand-in for the search engine, serving one results page per query"""
+
+    def __init__(self, scenario=None, recorded=None, port=0):
+        self.scenario = dict(DEFAULT_SCENARIO, **(scenario or {}))
+        self.recorded = recorded or {}  # domain -> saved results page
+        self.port = port
+        self.random = random.Random(self.scenario['seed'])
+        self.lock = threading.Lock()
+        self.stats = {'searches': 0, 'consent_pages': 0, 'blocked': 0, 'icons': 0}
+        self.kinds = {}
+        self.server = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def kind_for(self, domain):
+        """Layout of a domain's results page, fixed for the whole run"""
+        with self.lock:
+            if domain not in self.kinds:
+                mix = self.scenario['mix']
+                self.kinds[domain] = mix[len(self.kinds) % len(mix)]
+            return self.kinds[domain]
+
+    def delay(self, base_ms, jitter_ms=0):
+        with self.lock:
+            seconds = (base_ms + self.random.uniform(0, jitter_ms)) / 1000
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def icon_src(self, domain, kind):
+        # DDKf1c favicons are only taken as data URIs, like on the real page
+        if self.scenario['url_icons'] and kind != 'ddkf1c':
+            return f"{self.base_url}/icon/{quote(domain)}.png"
+        return 'data:image/png;base64,' + base64.b64encode(icon_png(domain)).decode('ascii')
+
+    def results_page(self, domain, consent_needed):
+        """Synthetic results page for a search, or the recorded one for this domain"""
+        overlay = CONSENT_OVERLAY if consent_needed else ''
+        if domain in self.recorded:
+            page = self.recorded[domain]
+            return page.replace('</body>', overlay + '</body>', 1) if '</body>' in page else page + overlay
+
+        kind = self.kind_for(domain)
+        blocks = [result_block('cite', other, self.icon_src(other, 'cite')) for other in DISTRACTORS[:2]]
+        if kind != 'none':
+            blocks.insert(0, result_block(kind, domain, self.icon_src(domain, kind)))
+        blocks += [result_block('cite', other, self.icon_src(other, 'cite')) for other in DISTRACTORS[2:]]
+        results = ''.join(blocks)
+        if self.scenario['late_ms']:
+            # Results rendered by script after a while, the way favicons trickle in on slow pages
+            results = (f"<template id=\"late\">{results}</template><script>setTimeout(function() {{"
+                       f"document.getElementById('rso').appendChild(document.getElementById('late').content);"
+                       f"}}, {int(self.scenario['late_ms'])});</script>")
+        return f"""<!DOCTYPE html>
+<html lang="nl"><head><meta charset="UTF-8"><title>{domain} - Google zoeken</title></head>
+<body>{overlay}<div id="search"><div id="rso">{results}</div></div></body></html>"""
+
+    def start(self):
+        fixtures = self
+
+        class SerpHandler(BaseHTTPRequestHandler):
+            def send_body(self, status, body, content_type='text/html; charset=utf-8'):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == '/search':
+                    fixtures.count('searches')
+                    fixtures.delay(fixtures.scenario['serp_delay_ms'], fixtures.scenario['jitter_ms'])
+                    with fixtures.lock:
+                        blocked = fixtures.random.random() < fixtures.scenario['block_rate']
+                    if blocked:
+                        fixtures.count('blocked')
+                        self.send_response(302)
+                        self.send_header('Location', f"/sorry/index?continue={quote(self.path)}")
+                        self.end_headers()
+                        return
+                    domain = parse_qs(url.query).get('q', [''])[0].strip()
+                    consent_needed = fixtures.scenario['consent'] and 'CONSENT=YES' not in self.headers.get('Cookie', '')
+                    if consent_needed:
+                        fixtures.count('consent_pages')
+                    self.send_body(200, fixtures.results_page(domain, consent_needed).encode('utf-8'))
+                elif url.path.startswith('/sorry/'):
+                    self.send_body(429, b"<html><body><form id=\"captcha-form\">Unusual traffic</form></body></html>")
+                elif url.path.startswith('/icon/'):
+                    fixtures.count('icons')
+                    fixtures.delay(fixtures.scenario['icon_delay_ms'])
+                    domain = url.path[len('/icon/'):-len('.png')]
+                    self.send_body(200, icon_png(domain), 'image/png')
+                else:
+                    self.send_body(404, b'')
+
+            def log_message(self, *args):
+                pass  # Keep requests out of the scraper output
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', self.port), SerpHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.base_url
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+def load_recorded_fixtures(fixtures_dir):
+    """Saved debug pages as (shops, domain -> page); the shop comes from debug_{shop_id}_{domain}.html"""
+    shops = []
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(fixtures_dir, 'debug_*.html'))):
+        shop_id, _, domain_part = os.path.basename(path)[len('debug_'):-len('.html')].partition('_')
+        domain = domain_part.replace('_', '.')  # Underscores never occur in host names
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            pages[domain] = f.read()
+        shops.append((len(shops), shop_id, domain))
+    return shops, pages
+
+def synthetic_shops(count):
+    return [(i, f"bench{i:05d}", f"benchshop{i:05d}.nl") for i in range(count)]
+
+def percentile(values, share):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, math.ceil(share * len(ordered)) - 1))]
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=REPO_DIR, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def summarize(lookups, wall_seconds, shop_count):
+    """Benchmark figures from the lookup lines of the metrics JSONL"""
+    latencies = [lookup['seconds'] for lookup in lookups]
+    phases = {}
+    for lookup in lookups:
+        for phase, seconds in lookup['spans']:
+            phases[phase] = phases.get(phase, 0.0) + seconds
+    count = len(lookups) or 1
+    return {
+        'shops': shop_count,
+        'lookups': len(lookups),
+        'found': sum(1 for lookup in lookups if lookup['found']),
+        'wall_seconds': round(wall_seconds, 2),
+        'shops_per_minute': round(len(lookups) / wall_seconds * 60, 2) if wall_seconds else None,
+        'latency_p50': percentile(latencies, 0.50),
+        'latency_p95': percentile(latencies, 0.95),
+        'latency_max': max(latencies) if latencies else None,
+        'round_trips_per_shop': round(sum(lookup.get('commands', 0) for lookup in lookups) / count, 2),
+        'phases': {phase: round(seconds / count, 3) for phase, seconds in sorted(phases.items(), key=lambda item: -item[1])},
+    }
+
+def run_benchmark(shops, scenario, recorded=None, rate=600.0, shop_timeout=60, offline_extract=False, lean=False,
+                  tabs=1, keep_workdir=False):
+    """Scrape `shops` against a local SERP server and return the summary"""
+    server = SerpFixtureServer(scenario, recorded)
+    base_url = server.start()
+    workdir = tempfile.mkdtemp(prefix='favicon_bench_')
+    print(f"🧪 SERP stand-in on {base_url}, working directory {workdir}")
+
+    # The scraper keeps favicons/ and its stores relative to the working directory,
+    # so it is imported only after moving into the throwaway one
+    for variable, name in STORE_ENV.items():
+        os.environ[variable] = os.path.join(workdir, name)
+    os.environ['FAVICON_SEARCH_BASE_URL'] = base_url
+    # Binary paths are machine state, not run state: share the cache with normal runs
+    os.environ.setdefault('FAVICON_DRIVER_PATHS', os.path.join(os.getcwd(), 'driver_paths.json'))
+    if REPO_DIR not in sys.path:
+        sys.path.insert(0, REPO_DIR)
+    previous_dir = os.getcwd()
+    os.chdir(workdir)
+    try:
+        from metrics import configure_metrics
+        import google_favicon_scraper
+
+        google_favicon_scraper.SEARCH_BASE_URL = base_url
+        google_favicon_scraper.LEAN_BROWSER = lean
+        jsonl_path = os.path.join(workdir, 'metrics.jsonl')
+        configure_metrics(jsonl_path)
+        scraper = google_favicon_scraper.FaviconScraper(site_first=False, offline_extract=offline_extract, rate=rate,
+                                                        shop_timeout=shop_timeout, tabs=tabs)
+        started = time.monotonic()
+        try:
+            scraper.run(shops)
+            wall_seconds = time.monotonic() - started
+        finally:
+            scraper.close()
+        with open(jsonl_path, 'r', encoding='utf-8') as f:
+            lookups = [entry for entry in map(json.loads, f) if entry['type'] == 'lookup']
+    finally:
+        os.chdir(previous_dir)
+        server.stop()
+        if not keep_workdir:
+            import shutil
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    results = summarize(lookups, wall_seconds, len(shops))
+    results['server'] = server.stats
+    return results
+
+def previous_result(results_file, scenario):
+    """Latest earlier record of the same scenario, or None"""
+    if not os.path.exists(results_file):
+        return None
+    latest = None
+    with open(results_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get('scenario') == scenario:
+                latest = record
+    return latest
+
+def print_results(record, previous=None):
+    results = record['results']
+    print(f"\n📊 Benchmark {record['revision'] or '(no git)'}" + (f" [{record['label']}]" if record.get('label') else ''))
+    rows = (('Shops per minute', 'shops_per_minute', ''), ('Latency p50', 'latency_p50', 's'),
+            ('Latency p95', 'latency_p95', 's'), ('WebDriver round trips/shop', 'round_trips_per_shop', ''))
+    for title, key, unit in rows:
+        value = results[key]
+        line = f"  {title:<28} {value}{unit}"
+        if previous and previous['results'].get(key) is not None and value is not None:
+            line += f"   (was {previous['results'][key]}{unit} at {previous['revision']})"
+        print(line)
+    print(f"  Favicons found               {results['found']}/{results['lookups']}")
+    top = list(results['phases'].items())[:8]
+    print("  Seconds per shop by phase:   " + ', '.join(f"{phase} {seconds}" for phase, seconds in top))
+    print(f"  Server: {results['server']}")
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the Google lookup path against a local SERP stand-in")
+    parser.add_argument('--shops', type=int, default=30, help="Number of synthetic shops to look up")
+    parser.add_argument('--fixtures', help="Replay saved debug_{shop_id}_{domain}.html pages from this directory")
+    parser.add_argument('--mix', default=','.join(DEFAULT_SCENARIO['mix']), help=f"Result layouts to rotate through ({', '.join(KINDS)})")
+    parser.add_argument('--serp-delay-ms', type=int, default=DEFAULT_SCENARIO['serp_delay_ms'], help="Server delay per search")
+    parser.add_argument('--jitter-ms', type=int, default=DEFAULT_SCENARIO['jitter_ms'], help="Random extra delay per search")
+    parser.add_argument('--icon-delay-ms', type=int, default=DEFAULT_SCENARIO['icon_delay_ms'], help="Server delay per favicon URL")
+    parser.add_argument('--late-ms', type=int, default=0, help="Render the results by script this long after the page loaded")
+    parser.add_argument('--url-icons', action='store_true', help="Serve favicons as URLs to download instead of data URIs")
+    parser.add_argument('--no-consent', action='store_true', help="Never show the consent dialog")
+    parser.add_argument('--block-rate', type=float, default=0.0, help="Share of searches sent to the /sorry/ block page")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SCENARIO['seed'], help="Seed for delays and blocks")
+    parser.add_argument('--rate', type=float, default=600.0, help="Pacer target lookups per minute (high: measure the scraper, not the pacing)")
+    parser.add_argument('--shop-timeout', type=float, default=60, help="Watchdog seconds per shop")
+    parser.add_argument('--offline-extract', action='store_true', help="Benchmark the offline extraction path")
+    parser.add_argument('--lean', action='store_true', help="Benchmark the lean headless browser profile")
+    parser.add_argument('--tabs', type=int, default=1, help="Results pages loading at once in the browser")
+    parser.add_argument('--label', help="Free text stored with the result, e.g. the change being measured")
+    parser.add_argument('--results', default=RESULTS_FILE, help="JSON lines file the results are appended to")
+    parser.add_argument('--keep-workdir', action='store_true', help="Keep the scraper's working directory for inspection")
+    parser.add_argument('--serve-only', action='store_true', help="Only run the SERP stand-in (use with the scraper's --search-base-url)")
+    parser.add_argument('--port', type=int, default=0, help="Port for --serve-only")
+    args = parser.parse_args()
+
+    mix = [kind.strip() for kind in args.mix.split(',') if kind.strip()]
+    unknown = [kind for kind in mix if kind not in KINDS]
+    if unknown or not mix:
+        parser.error(f"unknown layouts in --mix: {', '.join(unknown) or '(none given)'}")
+    scenario = {'mix': mix, 'serp_delay_ms': args.serp_delay_ms, 'jitter_ms': args.jitter_ms,
+                'icon_delay_ms': args.icon_delay_ms, 'late_ms': args.late_ms, 'consent': not args.no_consent,
+                'block_rate': args.block_rate, 'url_icons': args.url_icons, 'seed': args.seed}
+
+    recorded = None
+    shops = synthetic_shops(args.shops)
+    if args.fixtures:
+        shops, recorded = load_recorded_fixtures(args.fixtures)
+        if not shops:
+            parser.error(f"no debug_*.html pages in {args.fixtures}")
+
+    if args.serve_only:
+        server = SerpFixtureServer(scenario, recorded, port=args.port)
+        print(f"🧪 SERP stand-in on {server.start()} (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.stop()
+        sys.exit(0)
+
+    results = run_benchmark(shops, scenario, recorded, rate=args.rate, shop_timeout=args.shop_timeout,
+                            offline_extract=args.offline_extract, lean=args.lean, tabs=args.tabs,
+                            keep_workdir=args.keep_workdir)
+    # Runs are only compared with runs of exactly the same scenario
+    scenario.update({'shops': len(shops), 'fixtures': os.path.abspath(args.fixtures) if args.fixtures else None,
+                     'rate': args.rate, 'offline_extract': args.offline_extract, 'lean': args.lean,
+                     'tabs': args.tabs})
+    record = {'ts': datetime.now().isoformat(timespec='seconds'), 'revision': git_revision(), 'label': args.label,
+              'scenario': scenario, 'results': results}
+    previous = previous_result(args.results, scenario)
+    with open(args.results, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record) + '\n')
+    print_results(record, previous)
+    print(f"\n💾 Appended to {args.results}")
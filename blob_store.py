@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Favicon Blob Store
+Content-addressed storage for favicon bytes, keyed by SHA-256. Each distinct
+icon is stored once under favicon_blobs/; the per-shop file in favicons/ is a
+hard link to its blob (a copy where links are not supported) and the shop's
+record in the status store holds the hash. A list of known placeholder hashes
+(Google's generic globe and the like) keeps fallback icons from being counted
+as successes.
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+from urllib.parse import urlparse
+
+BLOB_DIR = os.environ.get('FAVICON_BLOB_DIR', 'favicon_blobs')
+PLACEHOLDER_FILE = os.environ.get('FAVICON_PLACEHOLDERS', 'placeholder_hashes.txt')
+
+# Google's favicon services answer with their generic globe for a domain without favicon;
+# the same globe shows up inlined in result pages. Asked for a domain that cannot exist.
+GLOBE_NOTE = 'google globe'
+GLOBE_URLS = tuple(
+    [f'https://www.google.com/s2/favicons?domain=no-favicon.invalid&sz={size}' for size in (16, 32, 64)]
+    + [f'https://t0.gstatic.com/faviconV2?client=SOCIAL&type=FAVICON&fallback_opts=TYPE,SIZE,URL'
+       f'&url=http://no-favicon.invalid&size={size}' for size in (16, 32, 64)]
+)
+
+def content_sha256(content):
+    return hashlib.sha256(content).hexdigest()
+
+class PlaceholderIcon(Exception):
+    """Raised when favicon bytes match a known placeholder icon"""
+
+class BlobStore:
+    """Write-once blobs named by their SHA-256, plus the placeholder hash list"""
+
+    def __init__(self, blob_dir=BLOB_DIR, placeholder_file=PLACEHOLDER_FILE):
+        self.blob_dir = blob_dir
+        self.placeholder_file = placeholder_file
+        self._placeholders = None
+
+    def blob_path(self, content_hash):
+        # Two-level fan-out keeps single directories small
+        return os.path.join(self.blob_dir, content_hash[:2], content_hash)
+
+    def exists(self, content_hash):
+        return os.path.exists(self.blob_path(content_hash))
+
+    def read(self, content_hash):
+        with open(self.blob_path(content_hash), 'rb') as f:
+            return f.read()
+
+    def put(self, content):
+        """Store bytes once, returns their hash"""
+        content_hash = content_sha256(content)
+        path = self.blob_path(content_hash)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temp file and rename, so a blob is never seen half written
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, 'wb') as f:
+                f.write(content)
+            os.chmod(tmp_path, 0o644)  # mkstemp creates owner-only files
+            os.replace(tmp_path, path)
+        return content_hash
+
+    def link(self, content_hash, dest):
+        """Point dest at a blob: a hard link where possible, a copy otherwise"""
+        blob_path = self.blob_path(content_hash)
+        if os.path.exists(dest) and os.path.samefile(blob_path, dest):
+            return  # Already linked (renaming a link onto itself would be a no-op)
+        tmp_path = f"{dest}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        try:
+            os.link(blob_path, tmp_path)
+        except OSError:
+            shutil.copyfile(blob_path, tmp_path)
+        os.replace(tmp_path, dest)
+
+    def store_file(self, content, dest):
+        """Store favicon bytes and expose them at dest, returns the hash.
+
+        Raises PlaceholderIcon (and writes nothing) for a known placeholder.
+        """
+        content_hash = content_sha256(content)
+        if self.is_placeholder(content_hash):
+            raise PlaceholderIcon(content_hash)
+        self.put(content)
+        self.link(content_hash, dest)
+        return content_hash
+
+    def remove(self, content_hash):
+        path = self.blob_path(content_hash)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def iter_hashes(self):
+        if not os.path.isdir(self.blob_dir):
+            return
+        for fanout in os.scandir(self.blob_dir):
+            if fanout.is_dir():
+                for entry in os.scandir(fanout.path):
+                    if entry.is_file() and len(entry.name) == 64:
+                        yield entry.name
+
+    # ----- placeholders -----
+
+    def placeholders(self):
+        """Set of known placeholder hashes, read from the list file once"""
+        if self._placeholders is None:
+            self._placeholders = set()
+            if os.path.exists(self.placeholder_file):
+                with open(self.placeholder_file, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        content_hash = line.split('#', 1)[0].strip().lower()
+                        if content_hash:
+                            self._placeholders.add(content_hash)
+        return self._placeholders
+
+    def is_placeholder(self, content_hash):
+        return content_hash in self.placeholders()
+
+    def add_placeholder(self, content_hash, note=''):
+        if self.is_placeholder(content_hash):
+            return False
+        with open(self.placeholder_file, 'a', encoding='utf-8') as f:
+            f.write(f"{content_hash}" + (f"  # {note}" if note else '') + '\n')
+        self._placeholders.add(content_hash)
+        return True
+
+_default_blob_store = None
+
+def open_blob_store():
+    """Blob store shared by the whole process"""
+    global _default_blob_store
+    if _default_blob_store is None:
+        _default_blob_store = BlobStore()
+    return _default_blob_store
+
+def icon_digests(content):
+    """Hashes an icon is known by: its original bytes and, when it decodes, its canonical PNG"""
+    from favicon_ingest import InvalidImage, ingest_favicon
+
+    digests = [content_sha256(content)]
+    try:
+        canonical = content_sha256(ingest_favicon(content).canonical)
+    except InvalidImage:
+        return digests
+    if canonical not in digests:
+        digests.append(canonical)
+    return digests
+
+def original_files(favicon_file):
+    """The original bytes kept next to a shop's canonical favicon (favicons/originals/<name>.<ext>)"""
+    stem = os.path.splitext(os.path.basename(favicon_file))[0]
+    originals = os.path.join(os.path.dirname(favicon_file), 'originals')
+    if not os.path.isdir(originals):
+        return []
+    return [entry.path for entry in os.scandir(originals) if os.path.splitext(entry.name)[0] == stem]
+
+def mark_placeholder(path_or_hash, note=''):
+    """Add a placeholder and turn every shop that only got it back into a failure, returns how many.
+
+    Both digests of the icon are listed and purged: shop records hold the canonical
+    PNG's hash, domain cache entries from shop websites hold the original bytes.
+    """
+    from status_store import open_store
+    from domain_cache import open_cache
+
+    blobs = open_blob_store()
+    if os.path.exists(path_or_hash):
+        with open(path_or_hash, 'rb') as f:
+            digests = icon_digests(f.read())
+        note = note or os.path.basename(path_or_hash)
+    else:
+        digests = [path_or_hash.lower()]
+        if blobs.exists(digests[0]):
+            digests = icon_digests(blobs.read(digests[0]))
+
+    store = open_store()
+    reset = 0
+    for record in [record for digest in list(digests) for record in store.records_with_hash(digest)]:
+        if record['file_path']:
+            # The shop's original names the other digest when only one was given
+            for original in original_files(record['file_path']):
+                with open(original, 'rb') as f:
+                    digest = content_sha256(f.read())
+                if digest not in digests:
+                    digests.append(digest)
+                os.remove(original)
+            if os.path.exists(record['file_path']):
+                os.remove(record['file_path'])
+        store.mark_failed(record['shop_id'], record['domain'], 'placeholder icon')
+        reset += 1
+
+    cache = open_cache()
+    for digest in digests:
+        blobs.add_placeholder(digest, note)
+        cache.forget_content(digest)
+        blobs.remove(digest)
+    return reset
+
+def is_google_host(url):
+    host = urlparse(url).hostname or ''
+    return 'google' in host.split('.')
+
+def seed_google_placeholders(urls=GLOBE_URLS, timeout=5, search_base_url=None):
+    """List Google's globe icons as placeholders, once per placeholder file; returns how many hashes were added.
+
+    Skipped when the file already has them, and when search_base_url is given and
+    is not Google (a local SERP server never serves the globe). Network errors
+    leave it for the next time.
+    """
+    import requests
+
+    if search_base_url and not is_google_host(search_base_url):
+        print(f"  Not seeding Google's globe: searches go to {search_base_url}")
+        return 0
+    blobs = open_blob_store()
+    if os.path.exists(blobs.placeholder_file):
+        with open(blobs.placeholder_file, 'r', encoding='utf-8') as f:
+            if GLOBE_NOTE in f.read():
+                return 0
+    added = 0
+    for url in urls:
+        try:
+            # The globe comes with a 404 status: it is the answer for "no favicon"
+            content = requests.get(url, timeout=timeout).content
+        except requests.RequestException:
+            continue
+        if not content:
+            continue
+        size = url.rsplit('=', 1)[-1]
+        for digest in icon_digests(content):
+            added += blobs.add_placeholder(digest, f"{GLOBE_NOTE} {size}px")
+    if added:
+        print(f"  Listed {added} hashes of Google's globe icon as placeholders")
+    return added
+
+def collect_garbage():
+    """Delete blobs no shop refers to any more, returns how many"""
+    from status_store import open_store
+
+    referenced = open_store().content_hashes()
+    blobs = open_blob_store()
+    removed = 0
+    for content_hash in list(blobs.iter_hashes()):
+        if content_hash not in referenced:
+            blobs.remove(content_hash)
+            removed += 1
+    return removed
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect and maintain the favicon blob store")
+    parser.add_argument('--shared', type=int, metavar='N', help="Show the N icons shared by the most shops (placeholder suspects)")
+    parser.add_argument('--mark-placeholder', metavar='FILE_OR_HASH', help="Treat this icon as a placeholder and re-queue the shops that got it")
+    parser.add_argument('--gc', action='store_true', help="Delete blobs no shop refers to")
+    parser.add_argument('--seed-google', action='store_true', help="Fetch Google's globe icon and list it as a placeholder")
+    args = parser.parse_args()
+
+    if args.seed_google:
+        added = seed_google_placeholders(search_base_url=os.environ.get('FAVICON_SEARCH_BASE_URL'))
+        print(f"Added {added} placeholder hashes")
+
+    if args.mark_placeholder:
+        print(f"Marked placeholder, {mark_placeholder(args.mark_placeholder)} shops set back to failed")
+    if args.gc:
+        print(f"Removed {collect_garbage()} unreferenced blobs")
+    if args.shared:
+        from status_store import open_store
+        print(f"Most shared icons:")
+        for row in open_store().shared_hashes(args.shared):
+            print(f"  {row['content_hash']}  {row['shops']} shops, {row['domains']} domains, e.g. {row['file_path']}")
+
+    blobs = open_blob_store()
+    print(f"Blob store {blobs.blob_dir}: {sum(1 for _ in blobs.iter_hashes())} blobs, "
+          f"{len(blobs.placeholders())} known placeholders")
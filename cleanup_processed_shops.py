@@ -1,25 +1,11 @@
 import csv
 import os
 
+from status_store import SUCCESS, open_store
+
 def scan_existing_favicons():
-    """Scan existing favicons and return a set of shop IDs that already have favicons"""
-    existing_shop_ids = set()
-    
-    if not os.path.exists('favicons'):
-        print("No favicons directory found")
-        return existing_shop_ids
-    
-    favicon_files = [f for f in os.listdir('favicons') if f.endswith(('.png', '.jpg', '.jpeg', '.gif'))]
-    
-    print(f"Found {len(favicon_files)} favicon files:")
-    
-    for favicon_file in favicon_files:
-        # Extract shop ID from filename (format: ShopID_domain_name.extension)
-        parts = favicon_file.split('_', 1)
-        if len(parts) >= 1:
-            shop_id = parts[0]
-            existing_shop_ids.add(shop_id)
-            print(f"  {favicon_file} -> Shop ID: {shop_id}")
+    """Return a set of shop IDs that already have favicons, from the status store"""
+    existing_shop_ids = open_store().shop_ids_with_status(SUCCESS)
     
     print(f"\nTotal unique shop IDs with favicons: {len(existing_shop_ids)}")
     return existing_shop_ids
@@ -78,14 +64,14 @@ def create_remaining_shops_csv(input_csv='urls.csv', output_csv='remaining_shops
 
 def show_favicon_stats():
     """Show detailed statistics about existing favicons"""
-    if not os.path.exists('favicons'):
-        print("No favicons directory found")
-        return
-    
-    favicon_files = [f for f in os.listdir('favicons') if f.endswith(('.png', '.jpg', '.jpeg', '.gif'))]
+    store = open_store()
+    favicon_files = [os.path.basename(record['file_path'] or '') for record in store.records_with_status(SUCCESS)]
     
     print(f"\n=== FAVICON STATISTICS ===")
     print(f"Total favicon files: {len(favicon_files)}")
+    print("By status:")
+    for status, count in sorted(store.counts().items()):
+        print(f"  {status}: {count}")
     
     # Count by file type
     extensions = {}
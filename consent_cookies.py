@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Consent Cookie Store
+Keeps the cookies Google sets when its consent dialog is accepted, per search
+host, in a small JSON file. Every new browser session gets them injected before
+its first search, so the cookie wall only has to be clicked away once instead
+of after every browser restart. The file is shared by all workers on a host and
+rewritten atomically; expired cookies are dropped when it is read.
+"""
+
+import json
+import os
+import threading
+import time
+
+CONSENT_COOKIE_FILE = os.environ.get('FAVICON_CONSENT_COOKIES', 'consent_cookies.json')
+
+# Cookie fields the DevTools protocol accepts, mapped from the WebDriver names
+CDP_FIELDS = {'name': 'name', 'value': 'value', 'domain': 'domain', 'path': 'path', 'secure': 'secure',
+              'httpOnly': 'httpOnly', 'sameSite': 'sameSite', 'expiry': 'expires'}
+
+class ConsentCookieStore:
+    """Consent cookies per search host, persisted across browser sessions and processes"""
+
+    def __init__(self, path=CONSENT_COOKIE_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def _read(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def load(self, host):
+        """Unexpired cookies saved for a host"""
+        now = time.time()
+        entry = self._read().get(host) or {}
+        return [cookie for cookie in entry.get('cookies', []) if cookie.get('expiry', now + 1) > now]
+
+    def save(self, host, cookies):
+        """Replace the cookies of a host (the ones the browser holds right after accepting)"""
+        with self.lock:
+            data = self._read()
+            data[host] = {'saved_at': time.time(), 'cookies': cookies}
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=1)
+            os.replace(tmp_path, self.path)  # Other workers never read a half written file
+
+    def entries(self):
+        """Everything saved, host -> {'saved_at', 'cookies'}"""
+        return self._read()
+
+    def clear(self, host=None):
+        with self.lock:
+            data = {} if host is None else {key: value for key, value in self._read().items() if key != host}
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+
+    def inject(self, driver, host, base_url):
+        """Put a host's saved cookies into a fresh browser, returns how many.
+
+        Chrome takes them over the DevTools protocol without loading a page; other
+        drivers need one page of the host open before add_cookie works.
+        """
+        cookies = self.load(host)
+        if not cookies:
+            return 0
+        if hasattr(driver, 'execute_cdp_cmd'):
+            driver.execute_cdp_cmd('Network.setCookies', {'cookies': [
+                {CDP_FIELDS[key]: value for key, value in cookie.items() if key in CDP_FIELDS} for cookie in cookies]})
+        else:
+            driver.get(f"{base_url}/")
+            for cookie in cookies:
+                driver.add_cookie(cookie)
+        return len(cookies)
+
+_default_consent_store = None
+
+def open_consent_store():
+    """Consent cookie store shared by the whole process"""
+    global _default_consent_store
+    if _default_consent_store is None:
+        _default_consent_store = ConsentCookieStore()
+    return _default_consent_store
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect or reset the saved consent cookies")
+    parser.add_argument('--clear', nargs='?', const='', metavar='HOST', help="Forget the cookies of one host, or of all hosts")
+    args = parser.parse_args()
+
+    store = open_consent_store()
+    if args.clear is not None:
+        store.clear(args.clear or None)
+        print(f"Cleared consent cookies" + (f" of {args.clear}" if args.clear else ''))
+
+    print(f"Consent cookies in {store.path}:")
+    for host, entry in store.entries().items():
+        print(f"  {host}: {len(store.load(host))} cookies, saved {time.ctime(entry.get('saved_at', 0))}")
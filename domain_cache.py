@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Domain Result Cache
+Persistent SQLite cache of favicon lookups keyed by normalized domain. A hit
+holds the favicon bytes and their hash, a miss remembers that nothing was
+found so re-runs don't query Google again for the same domain right away.
+Entries expire after a positive/negative TTL and the least recently used ones
+are evicted once the cache grows past its entry or byte budget.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+DOMAIN_CACHE_DB = os.environ.get('FAVICON_DOMAIN_CACHE', 'domain_cache.db')
+POSITIVE_TTL = 30 * 24 * 3600  # A found favicon is reused for 30 days
+NEGATIVE_TTL = 24 * 3600       # A domain without favicon is retried after a day
+MAX_ENTRIES = 200000
+MAX_BYTES = 256 * 1024 * 1024
+
+HIT = 'hit'
+MISS = 'miss'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS domains (
+    domain       TEXT PRIMARY KEY,
+    result       TEXT NOT NULL,
+    content      BLOB,
+    content_hash TEXT,
+    icon_url     TEXT,
+    source       TEXT,
+    size         INTEGER NOT NULL DEFAULT 0,
+    created_at   REAL NOT NULL,
+    expires_at   REAL NOT NULL,
+    last_used    REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_domains_last_used ON domains(last_used);
+"""
+
+def normalize_domain(domain):
+    """Cache key for a shop domain: lowercase, no scheme/path/port, no leading www., IDNA encoded"""
+    domain = (domain or '').strip().lower()
+    if '://' in domain:
+        domain = domain.split('://', 1)[1]
+    domain = domain.split('/', 1)[0].split(':', 1)[0].rstrip('.')
+    if domain.startswith('www.'):
+        domain = domain[4:]
+    try:
+        return domain.encode('idna').decode('ascii')
+    except UnicodeError:
+        # Labels the codec refuses (too long, empty) are still usable as a plain key
+        return domain
+
+class DomainCache:
+    """Per-domain favicon results with TTLs and LRU eviction.
+
+    Like the shop status store, every thread/process opens its own connection.
+    """
+
+    def __init__(self, path=DOMAIN_CACHE_DB, positive_ttl=POSITIVE_TTL, negative_ttl=NEGATIVE_TTL,
+                 max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.path = path
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            conn.close()
+        self._local.conn = None
+
+    def get(self, domain):
+        """Unexpired entry for a domain as a dict (result, content, content_hash, icon_url, source), or None"""
+        key = normalize_domain(domain)
+        now = time.time()
+        conn = self._connection()
+        row = conn.execute('SELECT * FROM domains WHERE domain = ? AND expires_at > ?', (key, now)).fetchone()
+        if row is None:
+            return None
+        with conn:
+            conn.execute('UPDATE domains SET last_used = ? WHERE domain = ?', (now, key))
+        if row['result'] == HIT:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return dict(row)
+
+    def _put(self, domain, result, ttl, content=None, icon_url=None, source=None):
+        now = time.time()
+        content_hash = hashlib.sha256(content).hexdigest() if content else None
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO domains (domain, result, content, content_hash, icon_url, source, size, '
+                'created_at, expires_at, last_used) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (normalize_domain(domain), result, content, content_hash, icon_url, source,
+                 len(content) if content else 0, now, now + ttl, now))
+
+    def put_hit(self, domain, content, icon_url=None, source=None):
+        """Remember the favicon bytes found for a domain"""
+        self._put(domain, HIT, self.positive_ttl, content, icon_url, source)
+
+    def put_miss(self, domain, source=None):
+        """Remember that no favicon could be found for a domain"""
+        self._put(domain, MISS, self.negative_ttl, source=source)
+
+    def forget_content(self, content_hash):
+        """Drop every domain whose cached favicon has this hash (e.g. it turned out to be a placeholder)"""
+        conn = self._connection()
+        with conn:
+            return conn.execute('DELETE FROM domains WHERE content_hash = ?', (content_hash,)).rowcount
+
+    def evict(self):
+        """Drop expired entries, then least recently used ones over the entry/byte budget; returns how many"""
+        conn = self._connection()
+        with conn:
+            removed = conn.execute('DELETE FROM domains WHERE expires_at <= ?', (time.time(),)).rowcount
+            count, total = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM domains').fetchone()
+            if count <= self.max_entries and total <= self.max_bytes:
+                return removed
+            # Walk from least to most recently used until both budgets fit
+            victims = []
+            for row in conn.execute('SELECT domain, size FROM domains ORDER BY last_used'):
+                if count <= self.max_entries and total <= self.max_bytes:
+                    break
+                victims.append((row['domain'],))
+                count -= 1
+                total -= row['size']
+            conn.executemany('DELETE FROM domains WHERE domain = ?', victims)
+        return removed + len(victims)
+
+    def clear(self):
+        conn = self._connection()
+        with conn:
+            conn.execute('DELETE FROM domains')
+
+    def stats(self):
+        """Number of entries and stored bytes per result type"""
+        rows = self._connection().execute(
+            'SELECT result, COUNT(*) AS n, COALESCE(SUM(size), 0) AS bytes FROM domains WHERE expires_at > ? GROUP BY result',
+            (time.time(),))
+        return {row['result']: {'entries': row['n'], 'bytes': row['bytes']} for row in rows}
+
+_default_cache = None
+
+def open_cache(path=None, **options):
+    """Shared cache for the given path; options (TTLs, budgets) apply when it is first opened"""
+    global _default_cache
+    path = path or DOMAIN_CACHE_DB
+    if _default_cache is None or _default_cache.path != path:
+        _default_cache = DomainCache(path, **options)
+    return _default_cache
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect or maintain the domain result cache")
+    parser.add_argument('--evict', action='store_true', help="Remove expired entries and enforce the size budget")
+    parser.add_argument('--clear', action='store_true', help="Remove every entry")
+    parser.add_argument('--lookup', metavar='DOMAIN', help="Show the cached result for one domain")
+    args = parser.parse_args()
+
+    cache = open_cache()
+    if args.clear:
+        cache.clear()
+        print(f"Cleared {cache.path}")
+    if args.evict:
+        print(f"Evicted {cache.evict()} entries")
+    if args.lookup:
+        entry = cache.get(args.lookup)
+        if entry is None:
+            print(f"{normalize_domain(args.lookup)}: not cached")
+        else:
+            print(f"{entry['domain']}: {entry['result']} from {entry['source']} ({entry['size']} bytes, "
+                  f"expires in {(entry['expires_at'] - time.time()) / 3600:.1f}h)")
+
+    print(f"Domain cache {cache.path}:")
+    stats = cache.stats()
+    for result in (HIT, MISS):
+        entry = stats.get(result, {'entries': 0, 'bytes': 0})
+        print(f"  {result}: {entry['entries']} domains, {entry['bytes'] / 1024:.0f} KB")
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Browser Factory
+Starts Chrome sessions as cheaply as possible. The chromedriver and Chrome
+binaries are resolved by Selenium Manager once and the paths are cached in
+driver_paths.json (re-resolved after a week, or when a file went missing), and
+one chromedriver process is kept running for the whole process: every browser
+is a new session on it (webdriver.Remote against service.service_url) instead
+of a new chromedriver plus a new binary lookup. Launch times are recorded, so
+the cost of a browser start stays visible.
+"""
+
+import atexit
+import json
+import os
+import signal
+import threading
+import time
+
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.chromium.remote_connection import ChromiumRemoteConnection
+
+from metrics import get_metrics
+from recycle_policy import process_table, browser_pids, chrome_children
+
+DRIVER_PATHS_FILE = os.environ.get('FAVICON_DRIVER_PATHS', 'driver_paths.json')
+PATHS_MAX_AGE = 7 * 24 * 3600  # Pick up Chrome updates once a week
+
+def resolve_binaries(refresh=False, path=None):
+    """{'driver_path', 'browser_path', 'resolved_at'}, from the cache file when it is still valid.
+
+    FAVICON_CHROMEDRIVER / FAVICON_CHROME override the lookup entirely.
+    """
+    path = path or DRIVER_PATHS_FILE
+    if os.environ.get('FAVICON_CHROMEDRIVER'):
+        return {'driver_path': os.environ['FAVICON_CHROMEDRIVER'], 'browser_path': os.environ.get('FAVICON_CHROME', ''),
+                'resolved_at': time.time()}
+    if not refresh:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                paths = json.load(f)
+            fresh = time.time() - paths['resolved_at'] < PATHS_MAX_AGE
+            if fresh and os.path.isfile(paths['driver_path']) and (not paths['browser_path'] or os.path.isfile(paths['browser_path'])):
+                return paths
+        except (OSError, ValueError, KeyError):
+            pass
+
+    from selenium.webdriver.common.driver_finder import DriverFinder  # Selenium 4.11+
+
+    started = time.monotonic()
+    finder = DriverFinder(Service(), Options())
+    paths = {'driver_path': finder.get_driver_path(), 'browser_path': finder.get_browser_path(), 'resolved_at': time.time()}
+    print(f"  🔎 Resolved chromedriver and Chrome in {time.monotonic() - started:.1f}s: {paths['driver_path']}")
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(paths, f, indent=1)
+    os.replace(tmp_path, path)
+    return paths
+
+class SharedServiceChrome(webdriver.Remote):
+    """A Chrome session on the shared chromedriver, with Chrome's DevTools commands available.
+
+    quit() only ends the session; the chromedriver process keeps serving the next one.
+    launched_pids holds the Chrome main process of this session, recorded at launch.
+    """
+
+    launched_pids = ()
+
+    def execute_cdp_cmd(self, cmd, cmd_args):
+        return self.execute('executeCdpCommand', {'cmd': cmd, 'params': cmd_args})['value']
+
+class DriverFactory:
+    """One long-lived chromedriver and the browser sessions started on it"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.service = None
+        self.paths = None
+        self.launch_lock = threading.Lock()  # One launch at a time, so new Chrome processes are ours
+        self.launches = 0
+        self.launch_seconds = 0.0
+        self.service_starts = 0
+
+    def _ensure_service(self):
+        """Start chromedriver the first time, or again when it died (or was killed by the watchdog)"""
+        with self.lock:
+            if self.service is not None and self.service.process is not None and self.service.process.poll() is None:
+                return self.service
+            if self.service is not None:
+                print(f"  chromedriver is gone, starting a new one")
+            started = time.monotonic()
+            self.paths = self.paths or resolve_binaries()
+            self.service = Service(executable_path=self.paths['driver_path'])
+            self.service.start()
+            self.service_starts += 1
+            get_metrics().record_span('service_start', time.monotonic() - started)
+            return self.service
+
+    def _chrome_children(self, service):
+        try:
+            return chrome_children(process_table(), service.process.pid)
+        except OSError:
+            return set()  # Without psutil or /proc the browser is found by its profile directory
+
+    def new_driver(self, options):
+        """A new browser session for these Chrome options"""
+        service = self._ensure_service()
+        if self.paths.get('browser_path') and not options.binary_location:
+            options.binary_location = self.paths['browser_path']
+        with self.launch_lock:
+            started = time.monotonic()
+            before = self._chrome_children(service)
+            executor = ChromiumRemoteConnection(remote_server_addr=service.service_url, vendor_prefix='goog', browser_name='chrome')
+            driver = SharedServiceChrome(command_executor=executor, options=options)
+            seconds = time.monotonic() - started
+            # The Chrome process chromedriver started for this session, so kill() and the memory
+            # signal hit this browser and not the others on the same chromedriver
+            driver.launched_pids = tuple(sorted(self._chrome_children(service) - before))
+        with self.lock:
+            self.launches += 1
+            self.launch_seconds += seconds
+        get_metrics().record_span('browser_launch', seconds)
+        return driver
+
+    def kill(self, driver):
+        """Kill a driver's browser so a WebDriver call stuck on it fails right away, returns whether it was found.
+
+        Only this driver's Chrome: the shared chromedriver and the other sessions (the standby) stay up.
+        """
+        pids = browser_pids(driver)
+        if not pids:
+            # Without psutil or /proc (Windows) the process is not known: have chromedriver end the session,
+            # from a thread of its own because the stuck call may hold up the quit as well
+            print(f"  Could not find the browser process of this session, quitting it instead")
+            threading.Thread(target=quit_quietly, args=(driver,), name='driver-quit', daemon=True).start()
+            return False
+        for pid in pids:
+            try:
+                os.kill(pid, getattr(signal, 'SIGKILL', signal.SIGTERM))
+            except OSError:
+                pass
+        return True
+
+    def summary(self):
+        if not self.launches:
+            return None
+        return (f"Browser launches: {self.launches}, {self.launch_seconds / self.launches:.1f}s avg "
+                f"on {self.service_starts} chromedriver start(s)")
+
+    def stop(self):
+        with self.lock:
+            if self.service is not None:
+                try:
+                    self.service.stop()
+                except Exception:
+                    pass
+                self.service = None
+
+def quit_quietly(driver):
+    """Quit a session whose browser may be hung or gone, ignoring the errors that brings"""
+    try:
+        driver.quit()
+    except Exception:
+        pass
+
+_default_factory = None
+
+def get_driver_factory():
+    """Browser factory of this process; its chromedriver is stopped when the process exits"""
+    global _default_factory
+    if _default_factory is None:
+        _default_factory = DriverFactory()
+        atexit.register(_default_factory.stop)
+    return _default_factory
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Resolve the browser binaries once and time browser launches")
+    parser.add_argument('--refresh', action='store_true', help="Resolve the binaries again instead of using the cache")
+    parser.add_argument('--launch', type=int, default=0, metavar='N', help="Start and quit N headless browsers and show the timings")
+    args = parser.parse_args()
+
+    started = time.monotonic()
+    paths = resolve_binaries(refresh=args.refresh)
+    print(f"chromedriver: {paths['driver_path']}\nChrome:       {paths['browser_path'] or '(default)'}\n"
+          f"Resolved in {time.monotonic() - started:.2f}s ({DRIVER_PATHS_FILE})")
+    factory = get_driver_factory()
+    for i in range(args.launch):
+        options = Options()
+        options.add_argument('--headless=new')
+        launch_started = time.monotonic()
+        driver = factory.new_driver(options)
+        print(f"  Launch {i + 1}: {time.monotonic() - launch_started:.2f}s")
+        driver.quit()
+    if args.launch:
+        print(factory.summary())
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Double-Buffered Browser Manager
+Keeps the browser in use plus, once a rotation is coming up, a standby one
+that is launched and prepared (options, stealth scripts, consent cookies,
+timeouts) in a background thread while the current browser finishes its last
+shops. Rotating is then a swap instead of a quit, a sleep and a cold start,
+and the old browser is quit in the background too.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+class DriverManager:
+    """Hands out browsers from a factory, with an optional pre-warmed standby"""
+
+    def __init__(self, factory, standby=True, metrics=None):
+        self.factory = factory
+        self.standby_enabled = standby
+        self.metrics = metrics
+        self._standby = None  # Future of (driver, launch seconds)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='standby-browser')
+
+    def _launch(self):
+        started = time.monotonic()
+        driver = self.factory()
+        return driver, time.monotonic() - started
+
+    def prepare_standby(self):
+        """Start launching the next browser in the background, if none is on the way yet"""
+        if self.standby_enabled and self._standby is None:
+            print(f"  🔥 Warming up a standby browser")
+            self._standby = self._executor.submit(self._launch)
+
+    def take(self):
+        """The next browser: the standby when there is one (waiting for it if still starting), else a new one"""
+        standby, self._standby = self._standby, None
+        if standby is not None:
+            try:
+                driver, launch_seconds = standby.result()
+                if self.metrics:
+                    self.metrics.record_span('standby_start', launch_seconds)
+                    self.metrics.count('favicon_standby_swaps_total')
+                print(f"  ⚡ Switched to the standby browser (started in {launch_seconds:.1f}s)")
+                return driver
+            except Exception as e:
+                print(f"  Standby browser failed to start ({type(e).__name__}: {e}), starting one now")
+        return self.factory()
+
+    def retire(self, driver):
+        """Quit a browser without making the caller wait for it"""
+        if driver is not None:
+            threading.Thread(target=self._quit, args=(driver,), daemon=True).start()
+
+    @staticmethod
+    def _quit(driver):
+        try:
+            driver.quit()
+        except Exception as e:
+            print(f"  Error quitting WebDriver: {e}")
+
+    def close(self):
+        """Quit the standby browser (the current one belongs to the caller)"""
+        standby, self._standby = self._standby, None
+        if standby is not None:
+            try:
+                self._quit(standby.result()[0])
+            except Exception:
+                pass
+        self._executor.shutdown(wait=False)
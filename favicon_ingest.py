@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Favicon Ingest
+Every favicon passes through here before it is stored: the real format is
+sniffed from the magic bytes, the image must decode and be larger than a
+tracking pixel, and a canonical PNG at a fixed size is rendered from it.
+The canonical PNG is what favicons/{shop_id}_{domain}.png holds; the original
+bytes are kept next to it under favicons/originals/ with their real extension.
+SVG icons are rasterized with cairosvg when it is installed.
+"""
+
+import io
+
+from PIL import Image
+
+try:
+    import cairosvg
+except ImportError:  # Optional: needs the system cairo library
+    cairosvg = None
+
+CANONICAL_SIZE = 64
+MIN_BYTES = 32   # Smaller than any real icon file, e.g. empty bodies and 1x1 GIFs
+MIN_EDGE = 8     # 1x1 and 2x2 spacer images are not favicons
+MAX_PIXELS = 4096 * 4096
+
+# File extension for each sniffed format
+EXTENSIONS = {'png': 'png', 'jpeg': 'jpg', 'gif': 'gif', 'webp': 'webp', 'ico': 'ico', 'bmp': 'bmp', 'svg': 'svg'}
+
+class InvalidImage(Exception):
+    """Raised when favicon bytes are empty, unknown, corrupt or too small"""
+
+class IngestedFavicon:
+    """A validated favicon: the original bytes and format plus the canonical PNG"""
+
+    def __init__(self, original, image_format, canonical, width, height):
+        self.original = original
+        self.format = image_format
+        self.canonical = canonical
+        self.width = width
+        self.height = height
+
+    @property
+    def extension(self):
+        return EXTENSIONS[self.format]
+
+def sniff_format(content):
+    """Image format from the magic bytes, or None"""
+    head = content[:512]
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'jpeg'
+    if head.startswith((b'GIF87a', b'GIF89a')):
+        return 'gif'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    if head.startswith((b'\x00\x00\x01\x00', b'\x00\x00\x02\x00')):
+        return 'ico'
+    if head.startswith(b'BM'):
+        return 'bmp'
+    text = head.lstrip().lower()
+    if text.startswith(b'<svg') or (text.startswith(b'<?xml') and b'<svg' in content[:4096].lower()):
+        return 'svg'
+    return None
+
+def render_canonical(image):
+    """Fit a decoded image into a transparent CANONICAL_SIZE square and encode it as PNG"""
+    image = image.convert('RGBA')
+    image.thumbnail((CANONICAL_SIZE, CANONICAL_SIZE), Image.LANCZOS)
+    if image.size != (CANONICAL_SIZE, CANONICAL_SIZE):
+        # Small icons are scaled up, non-square ones are centred
+        scale = CANONICAL_SIZE / max(image.size)
+        if scale > 1:
+            image = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))), Image.LANCZOS)
+        canvas = Image.new('RGBA', (CANONICAL_SIZE, CANONICAL_SIZE), (0, 0, 0, 0))
+        canvas.paste(image, ((CANONICAL_SIZE - image.width) // 2, (CANONICAL_SIZE - image.height) // 2))
+        image = canvas
+    output = io.BytesIO()
+    image.save(output, format='PNG', optimize=True)
+    return output.getvalue()
+
+def decode_image(content, image_format):
+    """Decode bytes into a PIL image, raises InvalidImage"""
+    if image_format == 'svg':
+        if cairosvg is None:
+            raise InvalidImage("SVG favicon but cairosvg is not installed")
+        try:
+            content = cairosvg.svg2png(bytestring=content, output_width=CANONICAL_SIZE, output_height=CANONICAL_SIZE)
+        except Exception as e:
+            raise InvalidImage(f"SVG does not render: {e}")
+    try:
+        image = Image.open(io.BytesIO(content))
+        if image.width * image.height > MAX_PIXELS:
+            raise InvalidImage(f"{image.width}x{image.height} is too large")
+        image.load()  # Truncated or corrupt files fail here, not at open()
+        return image
+    except InvalidImage:
+        raise
+    except Exception as e:
+        raise InvalidImage(f"{image_format} does not decode: {e}")
+
+def ingest_favicon(content):
+    """Validate favicon bytes and build the canonical PNG, raises InvalidImage"""
+    if not content or len(content) < MIN_BYTES:
+        raise InvalidImage(f"only {len(content or b'')} bytes")
+    image_format = sniff_format(content)
+    if image_format is None:
+        raise InvalidImage("not a known image format")
+
+    image = decode_image(content, image_format)
+    width, height = image.size
+    if image_format != 'svg' and min(width, height) < MIN_EDGE:
+        raise InvalidImage(f"{width}x{height} is too small")
+    return IngestedFavicon(content, image_format, render_canonical(image), width, height)
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        print("Usage: python favicon_ingest.py FILE [FILE ...]")
+        sys.exit(1)
+
+    for path in sys.argv[1:]:
+        with open(path, 'rb') as f:
+            content = f.read()
+        try:
+            favicon = ingest_favicon(content)
+            print(f"✅ {path}: {favicon.format} {favicon.width}x{favicon.height}, "
+                  f"{len(content)} bytes -> {len(favicon.canonical)} byte canonical PNG")
+        except InvalidImage as e:
+            print(f"❌ {path}: {e}")
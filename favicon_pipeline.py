@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Favicon Pipeline
+Takes the image work off the browser thread. Once a results page has been
+extracted the browser moves straight on to the next shop, while the shop's
+favicon candidates go through two more stages:
+
+  fetch     decode data URIs or download image URLs, then validate and
+            normalize them (a thread pool; a rejected image means fetching
+            the next candidate, so validation stays with the fetching)
+  store     write the favicon and its original to the blob store, and the
+            debug HTML dumps (one writer thread)
+
+The stages are connected by bounded queues. When they fall behind, putting
+work in blocks (backpressure) instead of piling up shops in memory; the
+blocked time, the number of times it happened and the queue depths are
+exported as metrics. Finished shops are handed back to the browser thread
+through deliver() and drain(), so the result bookkeeping stays single-threaded.
+"""
+
+import queue
+import threading
+import time
+
+from metrics import get_metrics
+
+class PipelineJob:
+    """One shop on its way through the pipeline"""
+
+    def __init__(self, shop_id, shop_domain, candidates, lookup=None):
+        self.shop_id = shop_id
+        self.shop_domain = shop_domain
+        self.candidates = candidates  # (approach, img_src, base64_only) in priority order
+        self.lookup = lookup          # The shop's metrics lookup, finished when the job is
+        self.approach = None
+        self.favicon = None
+        self.found = False
+        self.error = None
+        self.on_done = None           # Called with the job by deliver(), in the browser thread
+
+class FaviconPipeline:
+    """Fetch and store stages behind bounded queues.
+
+    fetch(job) returns (approach, favicon) for the first usable candidate or None,
+    store(job) saves job.favicon. Exceptions in either fail only that shop.
+    """
+
+    def __init__(self, fetch, store, workers=4, queue_size=8, metrics=None):
+        self.fetch = fetch
+        self.store = store
+        self.metrics = metrics or get_metrics()
+        self.queues = {'fetch': queue.Queue(maxsize=queue_size), 'store': queue.Queue(maxsize=queue_size)}
+        self.done = queue.Queue()
+        self.pending = 0  # Submitted but not yet delivered; only touched by the submitting thread
+        self.threads = [threading.Thread(target=self._fetch_worker, name=f'pipeline-fetch-{i}', daemon=True)
+                        for i in range(workers)]
+        self.threads.append(threading.Thread(target=self._store_worker, name='pipeline-store', daemon=True))
+        for thread in self.threads:
+            thread.start()
+
+    def _put(self, stage, item):
+        """Queue work for a stage, waiting (and counting the wait) while the stage is full"""
+        work = self.queues[stage]
+        try:
+            work.put_nowait(item)
+        except queue.Full:
+            self.metrics.count('favicon_pipeline_backpressure_total', stage=stage)
+            started = time.monotonic()
+            work.put(item)
+            self.metrics.record_span(f'backpressure_{stage}', time.monotonic() - started)
+        self.metrics.set_gauge('favicon_pipeline_queue_depth', work.qsize(), stage=stage)
+
+    def _get(self, stage):
+        item = self.queues[stage].get()
+        self.metrics.set_gauge('favicon_pipeline_queue_depth', self.queues[stage].qsize(), stage=stage)
+        return item
+
+    def submit(self, job):
+        """Hand a shop's candidates to the fetch stage, returns the job"""
+        self.pending += 1
+        self._put('fetch', job)
+        return job
+
+    def write_text(self, path, text):
+        """Write a file from the store stage (debug HTML dumps)"""
+        self._put('store', (path, text))
+
+    def _finish(self, job):
+        if job.lookup is not None:
+            self.metrics.finish_lookup(job.found, job.error, lookup=job.lookup)
+        self.done.put(job)
+
+    def _fetch_worker(self):
+        while True:
+            job = self._get('fetch')
+            if job is None:
+                break
+            self.metrics.resume_lookup(job.lookup)  # Spans of this stage belong to the job's shop
+            try:
+                result = self.fetch(job)
+            except Exception as e:
+                print(f"  💥 Fetching favicon for {job.shop_domain} failed: {e}")
+                job.error, result = f"{type(e).__name__}: {e}", None
+            if result is None:
+                self._finish(job)
+            else:
+                job.approach, job.favicon = result
+                self._put('store', job)
+            self.metrics.resume_lookup(None)
+
+    def _store_worker(self):
+        while True:
+            item = self._get('store')
+            if item is None:
+                break
+            if isinstance(item, tuple):
+                path, text = item
+                try:
+                    with open(path, 'w', encoding='utf-8') as f:
+                        f.write(text)
+                except OSError as e:
+                    print(f"  Could not write {path}: {e}")
+                continue
+            self.metrics.resume_lookup(item.lookup)
+            try:
+                self.store(item)
+                item.found = True
+            except Exception as e:
+                print(f"  💥 Saving favicon for {item.shop_domain} failed: {e}")
+                item.error = f"{type(e).__name__}: {e}"
+            self._finish(item)
+            self.metrics.resume_lookup(None)
+
+    def deliver(self, wait=False):
+        """Run on_done for every finished job in the calling thread, returns how many.
+
+        With wait, blocks until every submitted job has finished.
+        """
+        delivered = 0
+        while self.pending:
+            try:
+                job = self.done.get(block=wait)
+            except queue.Empty:
+                break
+            self.pending -= 1
+            delivered += 1
+            if job.on_done is not None:
+                job.on_done(job)
+        return delivered
+
+    def drain(self):
+        """Wait for every submitted shop and deliver it"""
+        if self.pending:
+            print(f"  ⏳ Waiting for {self.pending} favicon downloads to finish")
+        return self.deliver(wait=True)
+
+    def close(self):
+        """Finish the queued work and stop the stage threads"""
+        fetchers = self.threads[:-1]
+        for _ in fetchers:
+            self.queues['fetch'].put(None)
+        for thread in fetchers:
+            thread.join()
+        self.queues['store'].put(None)
+        self.threads[-1].join()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Async Fetch Engine
+asyncio/aiohttp based HTTP fetcher for the download step and any HTTP-only
+resolution path. Runs many fetches concurrently with a global concurrency cap,
+per-host concurrency and rate limits, connect/read timeouts, bounded retries
+and a response size cap.
+"""
+
+import asyncio
+import random
+import time
+from urllib.parse import urlsplit
+
+import aiohttp
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept-Language': 'nl-NL,nl;q=0.9,en-US;q=0.8,en;q=0.7',
+}
+
+# Status codes worth another attempt
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class FetchResult:
+    """Outcome of a single fetch"""
+
+    def __init__(self, url, status=None, final_url=None, headers=None, content=None, error=None, attempts=0, elapsed=0.0):
+        self.url = url
+        self.status = status
+        self.final_url = final_url or url
+        self.headers = headers or {}
+        self.content = content
+        self.error = error
+        self.attempts = attempts
+        self.elapsed = elapsed
+
+    @property
+    def ok(self):
+        return self.error is None and self.status == 200 and self.content is not None
+
+    def __repr__(self):
+        size = len(self.content) if self.content is not None else 0
+        return f"FetchResult({self.url!r}, status={self.status}, bytes={size}, error={self.error!r})"
+
+class ResponseTooLarge(Exception):
+    """Raised when a response body exceeds the configured size cap"""
+
+class HostLimiter:
+    """Per-host concurrency slot plus a minimum interval between request starts"""
+
+    def __init__(self, concurrency, rate):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.interval = 1.0 / rate if rate else 0.0
+        self.next_start = 0.0
+        self.lock = asyncio.Lock()
+
+    async def wait_turn(self):
+        if not self.interval:
+            return
+        async with self.lock:
+            now = time.monotonic()
+            delay = self.next_start - now
+            self.next_start = max(now, self.next_start) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+class FetchEngine:
+    """Concurrent HTTP fetcher with global and per-host politeness limits.
+
+    Use as an async context manager:
+
+        async with FetchEngine(max_concurrency=200) as engine:
+            results = await engine.fetch_all(urls)
+    """
+
+    def __init__(self, max_concurrency=200, per_host_concurrency=4, per_host_rate=4.0,
+                 connect_timeout=5.0, read_timeout=10.0, total_timeout=30.0,
+                 max_retries=2, backoff_base=0.5, max_bytes=1024 * 1024, headers=None):
+        self.max_concurrency = max_concurrency
+        self.per_host_concurrency = per_host_concurrency
+        self.per_host_rate = per_host_rate
+        self.timeout = aiohttp.ClientTimeout(total=total_timeout, sock_connect=connect_timeout, sock_read=read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.max_bytes = max_bytes
+        self.headers = dict(DEFAULT_HEADERS, **(headers or {}))
+        self.session = None
+        self.global_semaphore = None
+        self.host_limiters = {}
+
+    async def __aenter__(self):
+        self.global_semaphore = asyncio.Semaphore(self.max_concurrency)
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency, limit_per_host=self.per_host_concurrency, ttl_dns_cache=300)
+        self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout, headers=self.headers)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.session.close()
+        self.session = None
+
+    def host_limiter(self, url):
+        host = urlsplit(url).netloc.lower()
+        if host not in self.host_limiters:
+            self.host_limiters[host] = HostLimiter(self.per_host_concurrency, self.per_host_rate)
+        return self.host_limiters[host]
+
+    async def read_capped(self, response, max_bytes, truncate=False):
+        """Read the body in chunks, aborting (or truncating) once it grows past max_bytes"""
+        declared = response.content_length
+        if not truncate and declared is not None and declared > max_bytes:
+            raise ResponseTooLarge(f"Content-Length {declared} exceeds {max_bytes} bytes")
+        chunks = []
+        total = 0
+        async for chunk in response.content.iter_chunked(16384):
+            total += len(chunk)
+            if total > max_bytes:
+                if truncate:
+                    chunks.append(chunk[:max_bytes - total])
+                    break
+                raise ResponseTooLarge(f"body exceeds {max_bytes} bytes")
+            chunks.append(chunk)
+        return b''.join(chunks)
+
+    async def fetch(self, url, headers=None, max_bytes=None, truncate=False):
+        """Fetch one URL, retrying on connection errors and retryable statuses.
+
+        With truncate=True an oversized body is cut at max_bytes instead of failing,
+        which is what you want for HTML where only the <head> matters.
+        """
+        max_bytes = max_bytes or self.max_bytes
+        limiter = self.host_limiter(url)
+        started = time.monotonic()
+        result = FetchResult(url)
+
+        for attempt in range(1, self.max_retries + 2):
+            result.attempts = attempt
+            # Wait for the host's turn before taking one of the global slots
+            async with limiter.semaphore:
+                await limiter.wait_turn()
+                async with self.global_semaphore:
+                    try:
+                        async with self.session.get(url, headers=headers, allow_redirects=True) as response:
+                            result.status = response.status
+                            result.final_url = str(response.url)
+                            result.headers = dict(response.headers)
+                            if response.status == 200:
+                                result.content = await self.read_capped(response, max_bytes, truncate)
+                                result.error = None
+                                break
+                            result.error = f"HTTP {response.status}"
+                            if response.status not in RETRY_STATUSES:
+                                break
+                    except ResponseTooLarge as e:
+                        result.error = str(e)
+                        break
+                    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                        result.error = f"{type(e).__name__}: {e}"
+
+            if attempt <= self.max_retries:
+                # Exponential backoff with jitter, outside the concurrency slots
+                await asyncio.sleep(self.backoff_base * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5))
+
+        result.elapsed = time.monotonic() - started
+        return result
+
+    async def fetch_all(self, urls, **kwargs):
+        """Fetch all URLs concurrently, results are returned in input order"""
+        return await asyncio.gather(*(self.fetch(url, **kwargs) for url in urls))
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        print("Usage: python fetch_engine.py URL [URL ...]")
+        sys.exit(1)
+
+    async def fetch_args():
+        async with FetchEngine() as engine:
+            return await engine.fetch_all(sys.argv[1:])
+
+    start = time.monotonic()
+    for result in asyncio.run(fetch_args()):
+        status = "✅" if result.ok else "❌"
+        size = len(result.content) if result.content is not None else 0
+        print(f"{status} {result.url} -> {result.status} ({size} bytes, {result.attempts} attempts, {result.elapsed:.2f}s) {result.error or ''}")
+    print(f"Fetched {len(sys.argv) - 1} URLs in {time.monotonic() - start:.2f}s")
@@ -1,55 +1,101 @@
-import csv
 import os
 import time
 import base64
-import requests
-from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException, WebDriverException
+from selenium.common.exceptions import (ElementClickInterceptedException, ElementNotInteractableException,
+                                        StaleElementReferenceException, TimeoutException, WebDriverException)
 import re
 import random # Import random for variable delays
+import threading
+from urllib.parse import urlparse
+from image_downloader import get_downloader
+from blob_store import content_sha256, open_blob_store, seed_google_placeholders
+from favicon_ingest import InvalidImage, ingest_favicon
+from serp_extraction import extract_page_data, find_favicon_candidates
+from serp_parser import parse_page_data
+from page_readiness import probe_results, wait_for_results
+from pacing import Pacer
+from metrics import configure_metrics, get_metrics, worker_prom_path
+from status_store import SUCCESS, open_store
+from job_journal import JobJournal, completed_indices
+from shop_input import count_shops, iter_batches
+from site_favicon_resolver import resolve_site_favicons
+from domain_cache import HIT, NEGATIVE_TTL, POSITIVE_TTL, normalize_domain, open_cache
+from consent_cookies import open_consent_store
+from browser_profile import add_lean_arguments, apply_resource_blocking
+from recycle_policy import RecyclePolicy
+from driver_manager import DriverManager
+from driver_factory import get_driver_factory
+from favicon_pipeline import FaviconPipeline, PipelineJob
 
 # Create directory for storing images if it doesn't exist
-os.makedirs('favicons', exist_ok=True)
+os.makedirs('favicons/originals', exist_ok=True)
+
+# Where searches go; the benchmark points this at its local SERP stand-in
+SEARCH_BASE_URL = os.environ.get('FAVICON_SEARCH_BASE_URL', 'https://www.google.com').rstrip('/')
+# Accept button of the cookie dialog (common for EU visitors)
+CONSENT_XPATH = "//button[contains(., 'Alles accepteren') or contains(., 'Accept all')]"
+# Seconds a shop's results page gets from driver.get until it is ready to extract from
+PAGE_DEADLINE = float(os.environ.get('FAVICON_PAGE_DEADLINE', '20'))
+# Headless Chrome with fonts, media, stylesheets and ad scripts blocked (see browser_profile.py)
+LEAN_BROWSER = os.environ.get('FAVICON_LEAN_BROWSER', '') not in ('', '0')
+# Warm up the next browser in the background before a rotation is due
+STANDBY_BROWSER = os.environ.get('FAVICON_STANDBY_BROWSER', '1') not in ('', '0')
+# Results pages loading at the same time in one browser, each in its own tab
+TABS_PER_BROWSER = max(1, int(os.environ.get('FAVICON_TABS', '1')))
+# Longest single wait on one loading tab before the other tabs are looked at again
+TAB_WAIT = 1.0
+# Threads downloading and validating favicons while the browser moves on (0: in the browser thread),
+# and how many shops may wait in front of each pipeline stage
+PIPELINE_WORKERS = int(os.environ.get('FAVICON_PIPELINE_WORKERS', '4'))
+PIPELINE_QUEUE = int(os.environ.get('FAVICON_PIPELINE_QUEUE', '8'))
 
 # Function to sanitize filename for filesystem compatibility
 def sanitize_filename(filename):
     """Remove or replace characters that are invalid in filenames"""
     return re.sub(r'[<>:"/\\|?*]', '_', filename)
 
-# Function to extract and save base64 image from src attribute
-def save_base64_image(img_src, filename):
+# Function to decode a base64 image from a src attribute
+def decode_base64_image(img_src):
     if 'base64' in img_src:
         # Extract the base64 part
         base64_data = img_src.split('base64,')[1]
-        # Save the image
-        with open(filename, 'wb') as f:
-            f.write(base64.b64decode(base64_data))
-        return True
-    return False
+        return base64.b64decode(base64_data)
+    return None
 
 # Function to download regular image URL
-def download_image(img_url, filename):
-    try:
-        response = requests.get(img_url, stream=True)
-        if response.status_code == 200:
-            with open(filename, 'wb') as f:
-                for chunk in response:
-                    f.write(chunk)
-            return True
-    except Exception as e:
-        print(f"Error downloading image: {e}")
-    return False
+def download_image(img_url):
+    # Pooled connections, timeouts, retries, a size cap and conditional GETs live in the downloader
+    result = get_downloader().fetch(img_url)
+    if result.ok:
+        return result.content
+    print(f"Error downloading image: {result.error}")
+    return None
+
+# Function to count every command a driver sends to chromedriver
+def count_round_trips(driver):
+    """Route driver.execute through the metrics, so each lookup knows its WebDriver round trips"""
+    execute = driver.execute
+
+    def counted_execute(driver_command, params=None):
+        get_metrics().record_command()
+        return execute(driver_command, params)
+
+    driver.execute = counted_execute  # Elements call their parent driver's execute as well
+    return driver
 
 # Set up Chrome options for Selenium with anti-detection measures
-def setup_driver():
+def setup_driver(lean=None):
+    lean = LEAN_BROWSER if lean is None else lean
     chrome_options = Options()
     chrome_options.add_argument("--disable-blink-features=AutomationControlled")
-    chrome_options.add_argument("--start-maximized")
+    if lean:
+        add_lean_arguments(chrome_options)  # Headless with a small window instead of maximized
+    else:
+        chrome_options.add_argument("--start-maximized")
     chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
     chrome_options.add_experimental_option("useAutomationExtension", False)
     user_agents = [
@@ -65,13 +111,49 @@ def setup_driver():
     chrome_options.add_argument("--incognito") # Incognito might help, or might be a flag, test this
     chrome_options.add_argument("--disable-plugins-discovery")
     chrome_options.add_argument("--disable-popup-blocking")
+    # driver.get returns at DOMContentLoaded; page_readiness decides when the results are there
+    chrome_options.page_load_strategy = 'eager'
 
-    driver = webdriver.Chrome(options=chrome_options)
+    # A new session on the process's long-lived chromedriver, binaries resolved once and cached
+    driver = count_round_trips(get_driver_factory().new_driver(chrome_options))
+    driver.set_page_load_timeout(PAGE_DEADLINE)
+    driver.set_script_timeout(PAGE_DEADLINE + 5)  # The readiness script enforces the deadline itself
+    if lean:
+        apply_resource_blocking(driver)
     driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
     driver.execute_script("Object.defineProperty(navigator, 'languages', {get: () => ['nl-NL', 'nl']});")
     driver.execute_script("Object.defineProperty(navigator, 'plugins', {get: () => [1, 2, 3, 4, 5]});") # Mock plugins
+
+    # Cookies of an earlier accepted consent dialog, so the session starts past the cookie wall
+    try:
+        restored = open_consent_store().inject(driver, urlparse(SEARCH_BASE_URL).hostname, SEARCH_BASE_URL)
+        if restored:
+            print(f"  🍪 Restored {restored} consent cookies")
+    except WebDriverException as e:
+        print(f"  Could not restore consent cookies: {e}")
     return driver
 
+# Function to click the cookie dialog away if the page shows one
+def accept_consent(driver):
+    """Click the consent dialog's accept button, returns True when it was shown and accepted.
+
+    Called when the readiness wait saw the dialog; the cookies it leaves are saved, so
+    later browser sessions start with consent already given.
+    """
+    buttons = driver.find_elements(By.XPATH, CONSENT_XPATH)
+    if not buttons:
+        return False
+    try:
+        buttons[0].click()
+        # Wait for the dialog itself to go away instead of sleeping a fixed time
+        WebDriverWait(driver, 5).until(EC.invisibility_of_element(buttons[0]))
+    except (ElementClickInterceptedException, ElementNotInteractableException, StaleElementReferenceException,
+            TimeoutException) as e:
+        print(f"  Could not accept the consent dialog: {type(e).__name__}")
+        return False
+    open_consent_store().save(urlparse(SEARCH_BASE_URL).hostname, driver.get_cookies())
+    return True
+
 # Function to generate the HTML gallery with all favicons
 def generate_favicon_gallery():
     # Create favicons directory if it doesn't exist
@@ -341,481 +423,918 @@ def create_standalone_html():
 # Function to check if favicon already exists for this shop
 def check_existing_favicon(shop_id, shop_domain):
     """Check if favicon already exists for this shop"""
-    # Check for various possible filename formats
-    possible_filenames = [
-        f"favicons/{shop_id}_{shop_domain.replace('.', '_')}.png",
-        f"favicons/{shop_id}_{shop_domain.replace('.', '_')}.jpg",
-        f"favicons/{shop_id}_{shop_domain.replace('.', '_')}.jpeg",
-        f"favicons/{shop_id}_{shop_domain.replace('.', '_')}.gif"
-    ]
-    
-    for filename in possible_filenames:
-        if os.path.exists(filename):
-            return True, filename
+    record = open_store().get(shop_id)
+    if record and record['status'] == SUCCESS:
+        return True, record['file_path']
     
     return False, None
 
 def scan_existing_favicons():
-    """Scan existing favicons and return a set of shop IDs that already have favicons"""
-    existing_shop_ids = set()
-    
-    if not os.path.exists('favicons'):
-        return existing_shop_ids
-    
-    favicon_files = [f for f in os.listdir('favicons') if f.endswith(('.png', '.jpg', '.jpeg', '.gif'))]
-    
-    for favicon_file in favicon_files:
-        # Extract shop ID from filename (format: ShopID_domain_name.extension)
-        parts = favicon_file.split('_', 1)
-        if len(parts) >= 1:
-            shop_id = parts[0]
-            existing_shop_ids.add(shop_id)
+    """Return the set of shop IDs that already have favicons, from the status store"""
+    existing_shop_ids = open_store().shop_ids_with_status(SUCCESS)
     
     print(f"Found existing favicons for {len(existing_shop_ids)} shops")
     return existing_shop_ids
 
-# Main function to search Google and download favicons
-def search_and_download_favicons(csv_path, start_from=0, max_shops=None):
-    print(f"Starting favicon scraper...")
-    
-    existing_shop_ids = scan_existing_favicons()
-    driver = None  # Initialize driver to None
-    
-    # Configuration for browser restart
-    SHOPS_PER_BROWSER_SESSION = random.randint(8, 12)  # Restart browser every 8-12 shops
-    shops_in_current_session = 0
-    
+# Function to build the path a shop's favicon is stored under
+def favicon_path(shop_id, shop_domain):
+    return f"favicons/{shop_id}_{shop_domain.replace('.', '_')}.png"
+
+# Function to build the path the original bytes of a shop's favicon are kept under
+def original_path(shop_id, shop_domain, extension):
+    return f"favicons/originals/{shop_id}_{shop_domain.replace('.', '_')}.{extension}"
+
+# Function to check favicon bytes, wherever they came from, before anything is stored
+def prepare_favicon(content, shop_domain):
+    """Validate and normalize favicon bytes, returns an IngestedFavicon or None when unusable or a placeholder"""
     try:
-        with open(csv_path, 'r', encoding='utf-8') as csv_file:
-            csv_reader = csv.reader(csv_file, delimiter=';')
-            headers = next(csv_reader)  # Skip header row
-            
-            # Convert to list for easier indexing and counting
-            all_shops = list(csv_reader)
-            total_shops = len(all_shops)
-            
-            print(f"Total shops to process: {total_shops}")
-            print(f"Starting from index: {start_from}")
-            
-            if max_shops:
-                end_at = min(start_from + max_shops, total_shops)
-                print(f"Will process up to shop index: {end_at-1}")
+        favicon = ingest_favicon(content)
+    except InvalidImage as e:
+        print(f"  Rejected image for {shop_domain}: {e}")
+        return None
+    blobs = open_blob_store()
+    if blobs.is_placeholder(content_sha256(favicon.canonical)) or blobs.is_placeholder(content_sha256(favicon.original)):
+        print(f"  Placeholder icon for {shop_domain}, not counted as a favicon")
+        return None
+    return favicon
+
+# Function to store a prepared favicon for a shop
+def save_favicon(shop_id, shop_domain, favicon):
+    """Link the canonical PNG at the shop's path and keep the original bytes, returns the canonical hash"""
+    blobs = open_blob_store()
+    blobs.store_file(favicon.original, original_path(shop_id, shop_domain, favicon.extension))
+    return blobs.store_file(favicon.canonical, favicon_path(shop_id, shop_domain))
+
+# Raised when Google answers with its /sorry/ captcha page instead of results
+class GoogleBlocked(Exception):
+    pass
+
+# Function to build the results page URL of a shop
+def search_url(shop_domain):
+    # Use the full domain name for searching (including extension)
+    return f"{SEARCH_BASE_URL}/search?q={shop_domain}"
+
+# Function to look up a single shop on Google with an already running driver
+def scrape_shop_favicon(driver, shop_id, shop_domain, save_debug_html=False, offline_extract=False, pacer=None,
+                        pipeline=None):
+    """Search Google for one shop and save the favicon next to its result, returns True on success.
+
+    With a pipeline the candidates are handed over to it and the PipelineJob is returned instead.
+    With offline_extract the page HTML is grabbed once and parsed without the browser.
+    The page gets PAGE_DEADLINE seconds to become ready; pacing sleeps go through the pacer,
+    which is also told how the page behaved.
+
+    WebDriverException is left to the caller, which owns the driver and decides whether to restart it,
+    and a block page raises GoogleBlocked so it is never mistaken for a shop without favicon.
+    """
+    print(f"  Searching Google for: {shop_domain}")
+
+    metrics = get_metrics()
+    request_started = time.monotonic()
+    deadline = request_started + PAGE_DEADLINE  # Everything up to extraction shares one deadline
+    with metrics.span('get'):
+        try:
+            driver.get(search_url(shop_domain))
+        except TimeoutException:
+            # With the eager strategy this means not even the DOM arrived; the readiness wait reports the rest
+            print(f"  Page load timeout for {shop_domain}")
+
+    # One wait that returns as soon as favicons rendered, the page turned out to have none,
+    # the cookie dialog or a block page showed up, or the deadline passed
+    with metrics.span('results_wait'):
+        state, page_url = wait_for_results(driver, deadline - time.monotonic(), CONSENT_XPATH)
+
+    page_url = settle_results_page(driver, shop_domain, state, page_url, request_started, deadline, pacer)
+    return extract_and_save(driver, shop_id, shop_domain, page_url, save_debug_html, offline_extract, pipeline)
+
+# Function to handle what the readiness wait found: consent dialog, timeouts and block pages
+def settle_results_page(driver, shop_domain, state, page_url, request_started, deadline, pacer=None):
+    """Accept a consent dialog and wait again, count the page state and tell the pacer, returns the page URL.
+
+    Raises GoogleBlocked for a block page.
+    """
+    pacer = pacer or Pacer()
+    metrics = get_metrics()
+    # Accept cookies if the dialog appears (after the first time its cookies are restored on every new browser)
+    consent_shown = False
+    for _ in range(2):
+        if state == 'consent':
+            with metrics.span('consent'):
+                consent_shown = accept_consent(driver) or consent_shown
+            if consent_shown:
+                metrics.count('favicon_consent_clicks_total')
+        elif state != 'navigated':  # A redirect or consent reload replaced the page, wait for the new one
+            break
+        with metrics.span('results_wait'):
+            state, page_url = wait_for_results(driver, deadline - time.monotonic(), CONSENT_XPATH)
+
+    metrics.count('favicon_page_states_total', state=state)
+    if state == 'timeout':
+        metrics.count('favicon_result_timeouts_total')
+        print(f"  Timeout waiting for search results or favicons for {shop_domain}")
+        # Continue anyway, maybe partial results loaded
+    elif state == 'empty':
+        print(f"  No favicons on the results page for {shop_domain}")
+
+    page_url = page_url or driver.current_url
+    # Google sends suspicious clients to /sorry/ with a captcha
+    blocked = state == 'blocked' or '/sorry/' in page_url
+    pacer.observe(response_time=time.monotonic() - request_started, consent=consent_shown, blocked=blocked)
+    if blocked:
+        print(f"  🚫 Google block page for {shop_domain}")
+        raise GoogleBlocked(page_url)
+    return page_url
+
+# Function to pick the favicon from a results page that is ready and save it
+def extract_and_save(driver, shop_id, shop_domain, page_url, save_debug_html=False, offline_extract=False, pipeline=None):
+    """Extract the candidates from the current page and save the first usable one, returns True on success.
+
+    With a pipeline only the extraction happens here: the candidates go to its fetch stage
+    and the PipelineJob is returned, so the browser can move on right away.
+    """
+    candidates = extract_candidates(driver, shop_id, shop_domain, page_url, save_debug_html, offline_extract, pipeline)
+    if pipeline is not None:
+        return pipeline.submit(PipelineJob(shop_id, shop_domain, candidates, get_metrics().current_lookup()))
+    chosen = fetch_favicon(shop_domain, candidates)
+    if chosen is None:
+        return False
+    store_favicon(shop_id, shop_domain, *chosen)
+    return True
+
+# Function to collect the favicon candidates of the current results page
+def extract_candidates(driver, shop_id, shop_domain, page_url, save_debug_html=False, offline_extract=False, pipeline=None):
+    """(approach, img_src, base64_only) candidates in the priority order of approaches 1-3, without duplicates"""
+    metrics = get_metrics()
+    page_source = None
+    if save_debug_html or offline_extract:
+        with metrics.span('page_source'):
+            page_source = driver.page_source
+
+    # DEBUG: Save HTML to see what Selenium sees (only for first few shops)
+    if save_debug_html:
+        # Sanitize filename by removing invalid characters
+        safe_domain = sanitize_filename(shop_domain)
+        debug_html_file = f"debug_{shop_id}_{safe_domain.replace('.', '_')}.html"
+        if pipeline is not None:
+            pipeline.write_text(debug_html_file, page_source)  # Written by the store stage
+        else:
+            with open(debug_html_file, 'w', encoding='utf-8') as f:
+                f.write(page_source)
+        print(f"  DEBUG: Saved HTML to {debug_html_file}")
+
+    # Everything the approaches need comes back from a single script round trip
+    # (or from the already fetched HTML), the domain matching itself happens in Python
+    with metrics.span('extract'):
+        if offline_extract:
+            page_data = parse_page_data(page_source, base_url=page_url)
+        else:
+            page_data = extract_page_data(driver)
+    
+    # Also print all cite texts found on the page for debugging
+    all_cites = page_data['cites']
+    print(f"\n  DEBUG: Found {len(all_cites)} total cite elements on page")
+    if all_cites and save_debug_html:
+        print("  DEBUG: First 5 cite texts:")
+        for j, cite in enumerate(all_cites[:5]):
+            print(f"    {j+1}. '{cite['text']}'")
+    print(f"  DEBUG: Found {len(page_data['xno5ab'])} XNo5Ab images, {len(page_data['q0vns'])} q0vns divs, {len(page_data['ddkf1c'])} DDKf1c spans")
+
+    candidates = []
+    tried_srcs = set()
+    for approach, img_src, base64_only in find_favicon_candidates(page_data, shop_domain):
+        if (img_src, base64_only) not in tried_srcs:
+            tried_srcs.add((img_src, base64_only))
+            candidates.append((approach, img_src, base64_only))
+    return candidates
+
+# Function to fetch candidates in order until one is a usable favicon
+def fetch_favicon(shop_domain, candidates):
+    """(approach, IngestedFavicon) of the first candidate that decodes or downloads to a valid favicon, or None"""
+    metrics = get_metrics()
+    for approach, img_src, base64_only in candidates:
+        # Try to decode as base64 first, then download as a regular image
+        with metrics.span(f"approach_{approach}"):
+            content = decode_base64_image(img_src)
+            if content is None and not base64_only:
+                with metrics.span('image_download'):
+                    content = download_image(img_src)
+            favicon = prepare_favicon(content, shop_domain) if content is not None else None
+        if content is None:
+            print(f"  Could not save favicon for {shop_domain}: {img_src[:50]}...")
+            continue
+        if favicon is not None:
+            return approach, favicon
+    return None
+
+# Function to save the chosen favicon of a shop
+def store_favicon(shop_id, shop_domain, approach, favicon):
+    metrics = get_metrics()
+    with metrics.span('image_save'):
+        save_favicon(shop_id, shop_domain, favicon)
+    metrics.count('favicon_approach_hits_total', approach=str(approach))
+    print(f"  Successfully saved favicon for {shop_domain} (approach {approach}, {favicon.format} {favicon.width}x{favicon.height})")
+
+# Long-lived scraper that the command line and the continuous runner drive in-process
+class FaviconScraper:
+    """Resolve favicons for batches of shops, keeping the browser, pacer and stores alive between run() calls.
+
+    Shops are (index, shop_id, shop_domain) tuples, where index is the CSV row that the
+    job journal records. Every Google lookup runs under a watchdog that kills the browser
+    when a single shop takes longer than shop_timeout seconds, and the recycle policy
+    decides from the session's health when the browser is replaced.
+    """
+
+    def __init__(self, site_first=True, offline_extract=False, rate=4.0, workers=1, journal=None,
+                 journal_done=None, shop_timeout=180, stop_event=None, domain_cache=None, recycle_policy=None,
+                 tabs=None):
+        self.site_first = site_first
+        self.offline_extract = offline_extract
+        self.rate = rate
+        self.workers = workers
+        self.journal = journal
+        # CSV row index -> status of shops finished by this job, kept up to date in memory
+        self.journal_done = journal_done if journal_done is not None else (completed_indices(journal.path) if journal else {})
+        self.shop_timeout = shop_timeout
+        self.stop_event = stop_event or threading.Event()
+        self.store = open_store()
+        self.metrics = get_metrics()
+        self.pacer = Pacer(target_rate=rate, on_sleep=self.metrics.record_sleep)
+        self.existing_shop_ids = None  # Loaded on the first run()
+        self.domain_cache = domain_cache  # Opened on the first run()
+
+        self.driver = None  # The browser is only started once a shop actually needs it
+        self.recycle = recycle_policy or RecyclePolicy.from_env()
+        self.drivers = DriverManager(setup_driver, standby=STANDBY_BROWSER, metrics=self.metrics)
+        self.tabs = max(1, tabs or TABS_PER_BROWSER)
+        # Favicon downloads and writes run behind the browser (see favicon_pipeline.py), started by
+        # the first in-process Google loop: a worker pool parent never needs one, nor threads when it forks
+        self.pipeline = None
+        self.shops_in_session = 0
+        self.google_lookups = 0
+        self.watchdog_fired = False
+
+    def quit_driver(self):
+        if self.driver:
+            try:
+                self.driver.quit()
+            except Exception as e:
+                print(f"  Error quitting WebDriver: {e}")
+            self.driver = None
+
+    def _watchdog_expired(self, shop_domain):
+        print(f"  ⏰ Watchdog: {shop_domain} took longer than {self.shop_timeout}s, killing the browser")
+        self.watchdog_fired = True
+        driver = self.driver
+        if driver:
+            try:
+                # Killing the browser makes the blocked WebDriver call fail right away
+                get_driver_factory().kill(driver)
+            except Exception:
+                pass
+
+    def _start_driver(self):
+        with self.metrics.span('driver_start'):
+            self.driver = self.drivers.take()  # The warmed-up standby when one is ready
+        self.shops_in_session = 0
+        self.recycle.reset()
+
+    def _restart_if_due(self):
+        """Replace the browser when the recycle policy says its session is no longer healthy"""
+        if self.driver is None:
+            return
+        verdict = self.recycle.check(self.driver)
+        if self.recycle.last_rss is not None:
+            self.metrics.set_gauge('favicon_browser_rss_bytes', self.recycle.last_rss)
+        if verdict is None:
+            return
+        reason, detail = verdict
+        print(f"  🔄 Recycling browser after {self.shops_in_session} shops: {detail}")
+        self.metrics.count('favicon_browser_restarts_total', reason=reason)
+        self.metrics.log_event('recycle', reason=reason, detail=detail, shops=self.shops_in_session)
+        self.drivers.retire(self.driver)  # Quit in the background, the standby takes over
+        self.driver = None
+        if reason == 'blocked':
+            # Only a block is worth a cool-down, health recycles start the next browser right away
+            restart_delay = self.pacer.pause('restart', 10, 20)
+            print(f"  😴 Waited {restart_delay:.1f} seconds before starting new browser session...")
+        self._start_driver()
+        print(f"  ✅ New browser session started")
+
+    def lookup_google(self, shop_id, shop_domain, on_done=None):
+        """Search one shop on Google, returns (favicon_found, error).
+
+        Given on_done and a pipeline, the favicon is fetched and stored in the background:
+        (None, None) is returned and on_done(favicon_found, error) follows from deliver().
+        """
+        self.metrics.start_lookup(shop_id, shop_domain)
+        self._restart_if_due()
+
+        favicon_found = False
+        error = None
+        job = None
+        self.watchdog_fired = False
+        watchdog = threading.Timer(self.shop_timeout, self._watchdog_expired, args=(shop_domain,))
+        watchdog.daemon = True
+        try:
+            if self.driver is None: # First Google lookup, or driver was quit due to an error
+                print("  Starting WebDriver...")
+                self._start_driver()
+
+            self.pacer.wait_for_slot()
+            watchdog.start()
+            scrape_started = time.monotonic()
+            result = scrape_shop_favicon(self.driver, shop_id, shop_domain, save_debug_html=self.google_lookups < 3,
+                                         offline_extract=self.offline_extract, pacer=self.pacer,
+                                         pipeline=self.pipeline if on_done else None)
+            self.shops_in_session += 1  # Increment session counter
+            scrape_seconds = time.monotonic() - scrape_started
+            if isinstance(result, PipelineJob):
+                job = result
+
+                def job_done(job, scrape_seconds=scrape_seconds):
+                    self.recycle.record(scrape_seconds, job.found)
+                    on_done(job.found, job.error)
+
+                job.on_done = job_done  # Only called by deliver() in this thread, so never too late
             else:
-                end_at = total_shops
-            
-            shops_processed = 0
-            shops_successful = 0
-            shops_skipped = 0
+                favicon_found = result
+                self.recycle.record(scrape_seconds, favicon_found)
+            if self.recycle.nearing():
+                self.drivers.prepare_standby()  # Starts while this browser finishes its last shops
 
-            driver = setup_driver() # Setup driver outside the loop initially
-            
-            for i, row in enumerate(all_shops[start_from:end_at]):
-                current_index = start_from + i
-                shop_id = row[0]
-                shop_domain = row[1]
-                
-                print(f"Processing ({current_index+1}/{total_shops}) {shop_id}: {shop_domain}")
-                
-                if shop_id in existing_shop_ids:
-                    print(f"  ✓ Favicon already exists for {shop_domain} - skipping")
-                    shops_skipped += 1
+        except WebDriverException as wde:
+            error = f"WebDriverException: {wde}"
+            print(f"  ❌ WebDriverException for {shop_domain}: {wde}")
+            print("  Attempting to quit current WebDriver and restart for the next shop.")
+            self.quit_driver() # Signal to restart driver in the next iteration
+
+        except GoogleBlocked:
+            error = "blocked by Google"
+            self.recycle.record(time.monotonic() - scrape_started, False, blocked=True)
+
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            print(f"  💥 Unexpected error for {shop_domain}: {e}")
+            if self.watchdog_fired:
+                self.quit_driver()
+
+        finally:
+            watchdog.cancel()
+
+        if self.watchdog_fired:
+            error = f"watchdog: shop took longer than {self.shop_timeout}s"
+        self.google_lookups += 1
+        self.metrics.set_gauge('favicon_pacer_backoff', self.pacer.backoff)
+        if job is not None:
+            self.metrics.resume_lookup(None)  # The pipeline finishes the lookup
+            return None, None
+        self.metrics.finish_lookup(favicon_found, error)
+        return favicon_found, error
+
+    def google_loop(self, shops, on_result):
+        """Look up (index, shop_id, shop_domain) items on Google with this scraper's browser.
+
+        on_result(index, shop_id, shop_domain, favicon_found, error) is called once per shop.
+        """
+        if self.pipeline is None and PIPELINE_WORKERS > 0:
+            self.pipeline = FaviconPipeline(lambda job: fetch_favicon(job.shop_domain, job.candidates),
+                                            lambda job: store_favicon(job.shop_id, job.shop_domain, job.approach, job.favicon),
+                                            workers=PIPELINE_WORKERS, queue_size=PIPELINE_QUEUE, metrics=self.metrics)
+        if self.tabs > 1:
+            return self.google_loop_tabs(shops, on_result)
+        for index, shop_id, shop_domain in shops:
+            if self.pipeline:
+                self.pipeline.deliver()  # Shops whose favicon was fetched in the meantime
+            if self.stop_event.is_set():
+                print("  🛑 Stop requested, not starting more Google lookups")
+                break
+            print(f"Searching ({index+1}) {shop_id}: {shop_domain}")
+
+            def done(favicon_found, error, index=index, shop_id=shop_id, shop_domain=shop_domain):
+                if not favicon_found:
+                    print(f"  Could not find favicon for {shop_domain}")
+                on_result(index, shop_id, shop_domain, favicon_found, error)
+
+            favicon_found, error = self.lookup_google(shop_id, shop_domain, on_done=done)
+            if favicon_found is not None:
+                done(favicon_found, error)
+        if self.pipeline:
+            self.pipeline.drain()
+
+    def _open_tabs(self):
+        """Window handles of self.tabs tabs in the current browser, the first one being the window it started with"""
+        handles = [self.driver.current_window_handle]
+        while len(handles) < self.tabs:
+            self.driver.switch_to.new_window('tab')
+            if LEAN_BROWSER:
+                apply_resource_blocking(self.driver)  # Request blocking is set per tab
+            handles.append(self.driver.current_window_handle)
+        return handles
+
+    def google_loop_tabs(self, shops, on_result):
+        """google_loop with up to self.tabs results pages loading at once in one browser.
+
+        Navigations start one pacer slot apart, in whichever tab is free. In between, the
+        oldest tab is waited on (until it is ready, the next pacer slot or TAB_WAIT) and the
+        others are checked once, and each page is extracted as soon as it is ready, so a slow
+        page no longer holds up the ones behind it. Every tab has its own PAGE_DEADLINE, after
+        which whatever loaded is extracted, and its shop its own watchdog. A block page fails
+        only its own shop (and makes the recycle policy retire the browser once the other tabs
+        are done); a dead browser fails every shop still in flight.
+        """
+        shops = iter(shops)
+        pending = None  # The next shop, taken from the iterator once a tab is free for it
+        in_flight = {}  # window handle -> {'shop', 'lookup', 'started', 'deadline', 'watchdog'}
+        free_tabs = []
+        tabs_driver = None  # The browser free_tabs belong to
+        draining = False  # The recycle policy asked for a new browser: finish the tabs first
+        exhausted = False
+
+        def finish(tab, favicon_found, error, seconds=None, pipelined=False):
+            index, shop_id, shop_domain = tab['shop']
+            if error is None:
+                self.recycle.record(seconds or time.monotonic() - tab['started'], favicon_found)
+            if not pipelined:  # Counted when the page was done, the pipeline finished the lookup
+                self.google_lookups += 1
+                self.shops_in_session += 1
+                self.metrics.set_gauge('favicon_pacer_backoff', self.pacer.backoff)
+                self.metrics.finish_lookup(favicon_found, error, lookup=tab['lookup'])
+            if not favicon_found:
+                print(f"  Could not find favicon for {shop_domain}")
+            on_result(index, shop_id, shop_domain, favicon_found, error)
+
+        while True:
+            if self.pipeline:
+                self.pipeline.deliver()
+            if not exhausted and pending is None and not self.stop_event.is_set():
+                pending = next(shops, None)
+                exhausted = pending is None
+            if self.stop_event.is_set() and pending is not None:
+                print("  🛑 Stop requested, not starting more Google lookups")
+                pending, exhausted = None, True
+            if pending is None and not in_flight:
+                if self.pipeline:
+                    self.pipeline.drain()
+                break
+
+            try:
+                if not in_flight:
+                    if draining:
+                        self._restart_if_due()
+                        draining = False
+                    if self.driver is None:  # First Google lookup, or driver was quit due to an error
+                        print("  Starting WebDriver...")
+                        self._start_driver()
+                    if self.driver is not tabs_driver:
+                        free_tabs, tabs_driver = self._open_tabs(), self.driver
+                        self.metrics.set_gauge('favicon_browser_tabs', len(free_tabs))
+
+                # Start the next search in a free tab once the pacer has a slot for it
+                started = False
+                can_start = pending is not None and free_tabs and not draining
+                if can_start:
+                    if in_flight:
+                        started = self.pacer.try_slot()
+                    else:
+                        self.pacer.wait_for_slot()  # Nothing else to do in the meantime
+                        started = True
+                if started:
+                    index, shop_id, shop_domain = pending
+                    pending = None
+                    handle = free_tabs.pop()
+                    print(f"Searching ({index+1}) {shop_id}: {shop_domain} [tab {len(in_flight) + 1}/{self.tabs}]")
+                    lookup = self.metrics.start_lookup(shop_id, shop_domain)
+                    now = time.monotonic()
+                    watchdog = threading.Timer(self.shop_timeout, self._watchdog_expired, args=(shop_domain,))
+                    watchdog.daemon = True
+                    watchdog.start()
+                    in_flight[handle] = {'shop': (index, shop_id, shop_domain), 'lookup': lookup, 'started': now,
+                                         'deadline': now + PAGE_DEADLINE, 'watchdog': watchdog}
+                    with self.metrics.span('get'):
+                        self.driver.switch_to.window(handle)
+                        # Returns right away, the page loads while the other tabs are handled
+                        self.driver.execute_script("window.location.href = arguments[0];", search_url(shop_domain))
+                    self.metrics.set_gauge('favicon_tabs_in_flight', len(in_flight))
                     continue
-                
-                # Check if we need to restart the browser
-                if shops_in_current_session >= SHOPS_PER_BROWSER_SESSION:
-                    print(f"  🔄 Restarting browser after {shops_in_current_session} shops...")
-                    if driver:
-                        driver.quit()
-                        driver = None
-                    # Random delay before starting new browser
-                    restart_delay = random.uniform(10, 20)
-                    print(f"  😴 Waiting {restart_delay:.1f} seconds before starting new browser session...")
-                    time.sleep(restart_delay)
-                    driver = setup_driver()
-                    shops_in_current_session = 0
-                    SHOPS_PER_BROWSER_SESSION = random.randint(8, 12)  # Randomize next session length
-                    print(f"  ✅ New browser session started (will process {SHOPS_PER_BROWSER_SESSION} shops)")
-                
+
+                # Oldest navigation first: wait on it until it is ready (or a new search is due),
+                # then take the first tab that is ready or out of time
+                wait = min(TAB_WAIT, self.pacer.next_slot_in()) if can_start else TAB_WAIT
+                ready = None
+                for position, (handle, tab) in enumerate(sorted(in_flight.items(), key=lambda item: item[1]['started'])):
+                    self.metrics.resume_lookup(tab['lookup'])
+                    self.driver.switch_to.window(handle)
+                    remaining = tab['deadline'] - time.monotonic()
+                    result = probe_results(self.driver, tab['shop'][2], remaining, CONSENT_XPATH,
+                                           wait=min(wait, remaining) if position == 0 else 0)
+                    if result is None and tab['deadline'] <= time.monotonic():
+                        result = ('timeout', None)
+                    if result is not None:
+                        ready = handle, tab, result
+                        break
+                if ready is None:
+                    continue
+
+                handle, tab, (state, page_url) = ready
+                tab['watchdog'].cancel()
+                del in_flight[handle]
+                free_tabs.append(handle)
+                self.metrics.set_gauge('favicon_tabs_in_flight', len(in_flight))
+                index, shop_id, shop_domain = tab['shop']
+                self.metrics.record_span('results_wait', time.monotonic() - tab['started'])
                 try:
-                    # Use the full domain name for searching (including extension)
-                    domain_for_search = shop_domain
-                    print(f"  Searching Google for: {domain_for_search}")
-                    
-                    if driver is None: # If driver was quit due to an error, restart it
-                        print("  Restarting WebDriver...")
-                        driver = setup_driver()
-                        shops_in_current_session = 0
-                    
-                    driver.get(f"https://www.google.com/search?q={domain_for_search}")
-                    
-                    # Accept cookies if the dialog appears (common for EU visitors)
-                    try:
-                        WebDriverWait(driver, 10).until( # Increased from 5 to 10
-                            EC.element_to_be_clickable((By.XPATH, "//button[contains(., 'Alles accepteren') or contains(., 'Accept all')]"))
-                        ).click()
-                        time.sleep(random.uniform(1.5, 3.0))  # Wait for the cookie dialog to disappear
-                    except TimeoutException:
-                        # Cookie dialog might not appear if already accepted
-                        pass
-                    
-                    # Wait for search results to load
-                    try:
-                        WebDriverWait(driver, 15).until( # Increased from 10 to 15
-                            EC.presence_of_element_located((By.ID, "search"))
-                        )
-                        WebDriverWait(driver, 10).until( # Increased from 5 to 10
-                            EC.presence_of_element_located((By.CLASS_NAME, "XNo5Ab"))
-                        )
-                    except TimeoutException:
-                        print(f"  Timeout waiting for search results or favicons for {shop_domain}")
-                        # Continue anyway, maybe partial results loaded
-                    
-                    time.sleep(random.uniform(2.5, 5.5)) # Variable delay, increased base
-                    
-                    # DEBUG: Save HTML to see what Selenium sees (only for first few shops)
-                    if shops_processed < 3:
-                        # Sanitize filename by removing invalid characters
-                        safe_domain = sanitize_filename(shop_domain)
-                        debug_html_file = f"debug_{shop_id}_{safe_domain.replace('.', '_')}.html"
-                        with open(debug_html_file, 'w', encoding='utf-8') as f:
-                            f.write(driver.page_source)
-                        print(f"  DEBUG: Saved HTML to {debug_html_file}")
-                    
-                    # Also print all cite texts found on the page for debugging
-                    all_cites = driver.find_elements(By.TAG_NAME, "cite")
-                    print(f"\n  DEBUG: Found {len(all_cites)} total cite elements on page")
-                    if all_cites and shops_processed < 3:
-                        print("  DEBUG: First 5 cite texts:")
-                        for j, cite in enumerate(all_cites[:5]):
-                            print(f"    {j+1}. '{cite.text}'")
-                    
-                    # Look for the website in organic search results using multiple approaches
-                    favicon_found = False
-                    
-                    # APPROACH 1: Look for the domain in cite elements and find nearby images
-                    try:
-                        # First look for results with the domain in the cite element
-                        # Use domain name without TLD for more flexible matching (case-insensitive)
-                        domain_name_only = shop_domain.split('.')[0]
-                        cite_elements = driver.find_elements(By.XPATH, f"//cite[contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), '{domain_name_only.lower()}')]")
-                        
-                        print(f"  DEBUG: Found {len(cite_elements)} cite elements containing '{domain_name_only}' (searching without TLD)")
-                        
-                        if cite_elements:
-                            for i, cite in enumerate(cite_elements):
-                                try:
-                                    # First, try to find the parent div that contains both cite and image
-                                    parent_div = cite.find_element(By.XPATH, "./ancestor::div[contains(@class, 'yuRUbf') or contains(@class, 'g') or contains(@class, 'MjjYud')]")
-                                    
-                                    # Find any image within this parent
-                                    img_elements = parent_div.find_elements(By.TAG_NAME, "img")
-                                    
-                                    print(f"    DEBUG: Cite #{i+1} - Found {len(img_elements)} images in parent div")
-                                    
-                                    if img_elements:
-                                        for j, img in enumerate(img_elements):
-                                            img_src = img.get_attribute('src')
-                                            
-                                            if img_src:
-                                                # Create filename
-                                                filename = f"favicons/{shop_id}_{shop_domain.replace('.', '_')}.png"
-                                                
-                                                # Try to save as base64 first, then as a regular image
-                                                if save_base64_image(img_src, filename):
-                                                    print(f"  Successfully saved favicon for {shop_domain}")
-                                                    favicon_found = True
-                                                    break
-                                                elif download_image(img_src, filename):
-                                                    print(f"  Successfully downloaded favicon for {shop_domain}")
-                                                    favicon_found = True
-                                                    break
-                                                else:
-                                                    print(f"  Could not save favicon for {shop_domain}: {img_src[:50]}...")
-                                    
-                                    if favicon_found:
-                                        break
-                                    
-                                except NoSuchElementException:
-                                    continue
-                            
-                            if favicon_found:
-                                pass  # Allow loop to continue to the next shop
-                    
-                    except Exception as e:
-                        print(f"  Error with approach 1 for {shop_domain}: {e}")
-                    
-                    # APPROACH 2: Look for specific favicon structure with XNo5Ab class
-                    if not favicon_found:
-                        try:
-                            # Look for the favicon images directly
-                            favicon_imgs = driver.find_elements(By.XPATH, "//img[contains(@class, 'XNo5Ab')]")
-                            
-                            print(f"  DEBUG: Found {len(favicon_imgs)} images with XNo5Ab class")
-                            
-                            for img_idx, img in enumerate(favicon_imgs):
-                                # Find the closest cite element to check if it's for our domain
-                                try:
-                                    # Find parent element that might contain the cite
-                                    parent = img.find_element(By.XPATH, "./ancestor::div[contains(@class, 'g') or contains(@class, 'MjjYud') or contains(@class, 'yuRUbf')]")
-                                    
-                                    # Find cite elements in this parent
-                                    cite_elements = parent.find_elements(By.TAG_NAME, "cite")
-                                    
-                                    for cite in cite_elements:
-                                        cite_text = cite.text.lower()
-                                        domain_name_only = shop_domain.split('.')[0].lower()
-                                        # Check if domain name (without TLD) is in cite text
-                                        if domain_name_only in cite_text:
-                                            img_src = img.get_attribute('src')
-                                            
-                                            if img_src:
-                                                # Create filename
-                                                filename = f"favicons/{shop_id}_{shop_domain.replace('.', '_')}.png"
-                                                
-                                                # Try to save as base64 first, then as a regular image
-                                                if save_base64_image(img_src, filename):
-                                                    print(f"  Successfully saved favicon for {shop_domain}")
-                                                    favicon_found = True
-                                                    break
-                                                elif download_image(img_src, filename):
-                                                    print(f"  Successfully downloaded favicon for {shop_domain}")
-                                                    favicon_found = True
-                                                    break
-                                                else:
-                                                    print(f"  Could not save favicon for {shop_domain}: {img_src[:50]}...")
-                                    
-                                    if favicon_found:
-                                        pass  # Allow loop to continue to the next shop
-                        
-                                except NoSuchElementException:
-                                    continue
-                            
-                            if favicon_found:
-                                pass  # Allow loop to continue to the next shop
-                        
-                        except Exception as e:
-                            print(f"  Error with approach 2 for {shop_domain}: {e}")
-                    
-                    # APPROACH 2.5: Look for the specific Google structure with q0vns class
-                    if not favicon_found:
-                        try:
-                            # Look for the parent div with class q0vns that contains both favicon and cite
-                            result_divs = driver.find_elements(By.XPATH, "//div[@class='q0vns']")
-                            print(f"  DEBUG: Found {len(result_divs)} result divs with q0vns class")
-                            
-                            for div in result_divs:
-                                try:
-                                    # Check if this div contains our domain in the cite
-                                    cite = div.find_element(By.TAG_NAME, "cite")
-                                    cite_text = cite.text.lower()
-                                    # More flexible domain matching - handle www. prefix and path suffixes
-                                    domain_lower = shop_domain.lower()
-                                    domain_without_www = domain_lower.replace('www.', '')
-                                    # Also try without TLD for better matching
-                                    domain_name_only = domain_lower.split('.')[0]
-                                    
-                                    # Check various possible matches
-                                    matches = [
-                                        domain_lower in cite_text,
-                                        domain_without_www in cite_text,
-                                        f".{domain_lower}" in cite_text,  # with leading dot
-                                        f".{domain_without_www}" in cite_text,
-                                        domain_name_only in cite_text and '.' in cite_text,  # domain name with any TLD
-                                        cite_text.startswith(f"https://{domain_lower}"),
-                                        cite_text.startswith(f"https://www.{domain_without_www}"),
-                                        cite_text.startswith(f"www.{domain_lower}"),
-                                        cite_text.startswith(domain_lower)
-                                    ]
-                                    
-                                    if any(matches):
-                                        print(f"    DEBUG: Found matching cite with text: {cite.text}")
-                                        
-                                        # Look for the favicon image with XNo5Ab class
-                                        try:
-                                            favicon_img = div.find_element(By.CLASS_NAME, "XNo5Ab")
-                                            img_src = favicon_img.get_attribute('src')
-                                            print(f"    DEBUG: Found favicon with src length: {len(img_src) if img_src else 0}")
-                                            
-                                            if img_src:
-                                                filename = f"favicons/{shop_id}_{shop_domain.replace('.', '_')}.png"
-                                                
-                                                if save_base64_image(img_src, filename):
-                                                    print(f"  Successfully saved favicon for {shop_domain}")
-                                                    favicon_found = True
-                                                    break
-                                                elif download_image(img_src, filename):
-                                                    print(f"  Successfully downloaded favicon for {shop_domain}")
-                                                    favicon_found = True
-                                                    break
-                                        except NoSuchElementException:
-                                            print(f"    DEBUG: No XNo5Ab image found in this result div")
-                                except NoSuchElementException:
-                                    continue
-                        except Exception as e:
-                            print(f"  DEBUG: Error with approach 2.5: {e}")
-                    
-                    # APPROACH 2.6: Look for the specific DDKf1c span structure
-                    if not favicon_found:
-                        try:
-                            # Look for spans with DDKf1c class that contain favicon images
-                            favicon_spans = driver.find_elements(By.CLASS_NAME, "DDKf1c")
-                            print(f"  DEBUG: Found {len(favicon_spans)} DDKf1c spans")
-                            
-                            domain_name_only = shop_domain.split('.')[0].lower()
-                            
-                            for span_idx, span in enumerate(favicon_spans):
-                                try:
-                                    # Find the XNo5Ab image within this span
-                                    favicon_img = span.find_element(By.CLASS_NAME, "XNo5Ab")
-                                    
-                                    # Now find the nearest cite element to verify it's for our domain
-                                    # Go up to find a common parent, then look for cite
-                                    parent = span
-                                    for _ in range(5):  # Try up to 5 levels up
-                                        try:
-                                            parent = parent.find_element(By.XPATH, "..")
-                                            cites = parent.find_elements(By.TAG_NAME, "cite")
-                                            if cites:
-                                                for cite in cites:
-                                                    if domain_name_only in cite.text.lower():
-                                                        print(f"    DEBUG: Found matching domain in cite: {cite.text}")
-                                                        img_src = favicon_img.get_attribute('src')
-                                                        if img_src:
-                                                            filename = f"favicons/{shop_id}_{shop_domain.replace('.', '_')}.png"
-                                                            if save_base64_image(img_src, filename):
-                                                                print(f"  Successfully saved favicon for {shop_domain}")
-                                                                favicon_found = True
-                                                                break
-                                            if favicon_found:
-                                                break
-                                        except:
-                                            continue
-                                    if favicon_found:
-                                        break
-                                except NoSuchElementException:
-                                    continue
-                        except Exception as e:
-                            print(f"  DEBUG: Error with approach 2.6: {e}")
-                    
-                    # APPROACH 3: Look for any image near the cite with our domain
-                    if not favicon_found:
-                        try:
-                            all_cites = driver.find_elements(By.TAG_NAME, "cite")
-                            domain_name_only = shop_domain.split('.')[0].lower()
-                            for cite in all_cites:
-                                cite_text = cite.text.lower()
-                                if domain_name_only in cite_text:
-                                    # Get parent node to look for nearby images
-                                    try:
-                                        parent_node = cite.find_element(By.XPATH, "./..")
-                                        img_elements = parent_node.find_elements(By.TAG_NAME, "img")
-                                        
-                                        if not img_elements:
-                                            # Try one level up
-                                            parent_node = parent_node.find_element(By.XPATH, "./..")
-                                            img_elements = parent_node.find_elements(By.TAG_NAME, "img")
-                                        
-                                        for img in img_elements:
-                                            img_src = img.get_attribute('src')
-                                            
-                                            if img_src:
-                                                # Create filename
-                                                filename = f"favicons/{shop_id}_{shop_domain.replace('.', '_')}.png"
-                                                
-                                                # Try to save as base64 first, then as a regular image
-                                                if save_base64_image(img_src, filename):
-                                                    print(f"  Successfully saved favicon for {shop_domain}")
-                                                    favicon_found = True
-                                                    break
-                                                elif download_image(img_src, filename):
-                                                    print(f"  Successfully downloaded favicon for {shop_domain}")
-                                                    favicon_found = True
-                                                    break
-                                                else:
-                                                    print(f"  Could not save favicon for {shop_domain}: {img_src[:50]}...")
-                                        
-                                        if favicon_found:
-                                            break
-                                        
-                                    except Exception:
-                                        continue
-                        
-                        except Exception as e:
-                            print(f"  Error with approach 3 for {shop_domain}: {e}")
-                    
-                    # Track success and increment processed count
-                    if favicon_found:
-                        shops_successful += 1
-                    else:
-                        print(f"  Could not find favicon for {shop_domain}")
-                    
-                    shops_processed += 1
-                    shops_in_current_session += 1  # Increment session counter
-                    
-                    # Increased and randomized delay between requests
-                    delay = random.uniform(7, 15) # Random delay between 7 and 15 seconds
-                    print(f"  😴 Sleeping for {delay:.1f} seconds...")
-                    time.sleep(delay)
-                
-                except WebDriverException as wde:
-                    print(f"  ❌ WebDriverException for {shop_domain}: {wde}")
-                    print("  Attempting to quit current WebDriver and restart for the next shop.")
-                    if driver:
-                        driver.quit()
-                        driver = None # Signal to restart driver in the next iteration
-                    favicon_found = False # Ensure it counts as a failure
-                
+                    page_url = settle_results_page(self.driver, shop_domain, state, page_url, tab['started'],
+                                                   tab['deadline'], self.pacer)
+                    favicon_found = extract_and_save(self.driver, shop_id, shop_domain, page_url,
+                                                     save_debug_html=self.google_lookups < 3,
+                                                     offline_extract=self.offline_extract, pipeline=self.pipeline)
+                except GoogleBlocked:
+                    self.recycle.record(time.monotonic() - tab['started'], False, blocked=True)
+                    finish(tab, False, "blocked by Google")
+                except WebDriverException:
+                    raise
                 except Exception as e:
                     print(f"  💥 Unexpected error for {shop_domain}: {e}")
-                    # Potentially quit and restart driver here too if it seems to cause persistent issues
-                    favicon_found = False # Ensure it counts as a failure
-
-                # Track success and increment processed count
-                if favicon_found:
-                    shops_successful += 1
+                    finish(tab, False, f"{type(e).__name__}: {e}")
                 else:
-                    print(f"  Could not find favicon for {shop_domain}")
-                
-                shops_processed += 1
-                
-                # Increased and randomized delay between requests
-                delay = random.uniform(7, 15) # Random delay between 7 and 15 seconds
-                print(f"  😴 Sleeping for {delay:.1f} seconds...")
-                time.sleep(delay)
-            
-            print(f"\nCompleted processing!")
-            total_processed = shops_processed + shops_skipped
-            print(f"  Total processed: {total_processed}")
-            print(f"  Successful downloads: {shops_successful}")
-            print(f"  Skipped (already exist): {shops_skipped}")
-            print(f"  Failed: {shops_processed - shops_successful}")
-            print(f"  Success rate: {(shops_successful/total_processed*100) if total_processed > 0 else 0:.1f}%")
+                    if isinstance(favicon_found, PipelineJob):
+                        seconds = time.monotonic() - tab['started']
+                        favicon_found.on_done = lambda job, tab=tab, seconds=seconds: \
+                            finish(tab, job.found, job.error, seconds, pipelined=True)
+                        self.google_lookups += 1
+                        self.shops_in_session += 1
+                    else:
+                        finish(tab, favicon_found, None)
+                if self.recycle.check(self.driver) is not None:
+                    draining = True  # Recycled by _restart_if_due once the other tabs are done
+                elif self.recycle.nearing():
+                    self.drivers.prepare_standby()
+
+            except WebDriverException as wde:
+                error = f"watchdog: shop took longer than {self.shop_timeout}s" if self.watchdog_fired \
+                    else f"WebDriverException: {wde}"
+                print(f"  ❌ WebDriverException with {len(in_flight)} tabs loading: {wde}")
+                print("  Attempting to quit current WebDriver and restart for the next shop.")
+                self.quit_driver()
+                for tab in in_flight.values():
+                    tab['watchdog'].cancel()
+                    finish(tab, False, error)
+                in_flight.clear()
+                self.watchdog_fired = False
+
+            finally:
+                self.metrics.resume_lookup(None)
+
+    def run(self, shops, total_shops=None):
+        """Process a batch of (index, shop_id, shop_domain) shops and return its stats"""
+        if self.existing_shop_ids is None:
+            self.existing_shop_ids = scan_existing_favicons()
+        cache = self.domain_cache = self.domain_cache or open_cache()
+
+        stats = {'processed': 0, 'successful': 0, 'skipped': 0, 'cached': 0}
+        shops = [shop for shop in shops if shop[0] not in self.journal_done]  # Finished by an earlier run of this job
+        total_label = f"/{total_shops}" if total_shops else ""
+
+        def record_result(index, shop_id, shop_domain, favicon_found, error=None, content_hash=None, source='google', retry=False):
+            stats['processed'] += 1
+            self.metrics.shop_outcome(shop_id, 'success' if favicon_found else 'failed', error, source)
+            if favicon_found:
+                stats['successful'] += 1
+                self.existing_shop_ids.add(shop_id)
+                self.store.mark_success(shop_id, shop_domain, favicon_path(shop_id, shop_domain), content_hash)
+            else:
+                self.store.mark_failed(shop_id, shop_domain, error or 'favicon not found')
+            # A transient error is journaled as 'retry', so a resumed run looks the shop up again
+            self.record_journal(index, shop_id, 'success' if favicon_found else ('retry' if retry else 'failed'), error)
+
+        # Shops whose domains normalize to the same key share a single lookup
+        groups = {}
+        for index, shop_id, shop_domain in shops:
+            print(f"Processing ({index+1}{total_label}) {shop_id}: {shop_domain}")
+
+            if shop_id in self.existing_shop_ids:
+                print(f"  ✓ Favicon already exists for {shop_domain} - skipping")
+                stats['skipped'] += 1
+                self.metrics.shop_outcome(shop_id, 'skipped')
+                self.record_journal(index, shop_id, 'skipped')
+                continue
+
+            groups.setdefault(normalize_domain(shop_domain), []).append((index, shop_id, shop_domain))
+
+        def finish_group(key, favicon, error=None, source='google'):
+            """Hand one domain's result (a prepared favicon or None) to every shop of its group"""
+            # Same rule as the domain cache: a Google lookup that ended in an error is not a real miss
+            retry = error is not None and source == 'google'
+            for index, shop_id, shop_domain in groups.pop(key):
+                if favicon is not None:
+                    try:
+                        content_hash = save_favicon(shop_id, shop_domain, favicon)
+                        record_result(index, shop_id, shop_domain, True, content_hash=content_hash, source=source)
+                        continue
+                    except OSError as e:
+                        print(f"  Could not save favicon for {shop_domain}: {e}")
+                        error, retry = f"{type(e).__name__}: {e}", True
+                record_result(index, shop_id, shop_domain, False, error, source=source, retry=retry)
+
+        # Domains resolved (or found to have no favicon) recently need no lookup at all
+        for key in list(groups):
+            entry = cache.get(key)
+            if entry is None:
+                continue
+            stats['cached'] += len(groups[key])
+            if entry['result'] == HIT:
+                print(f"  💾 Cached favicon for {key} (from {entry['source']})")
+                favicon = prepare_favicon(entry['content'], key)
+                finish_group(key, favicon, None if favicon else 'cached favicon is not usable', source='cache')
+            else:
+                print(f"  💾 Cached: no favicon for {key} (from {entry['source']})")
+                finish_group(key, None, f"no favicon (cached {entry['source']} result)", source='cache')
+
+        # Cheap first pass: resolve every remaining domain of this batch concurrently
+        # over plain HTTP against the shop's own website
+        if self.site_first and groups:
+            leaders = {key: group[0][2] for key, group in groups.items()}
+            print(f"Resolving {len(leaders)} domains directly from their websites...")
+            with self.metrics.span('site_batch'):
+                # The full check (decodes, not a placeholder) runs per candidate, so a bad first icon
+                # moves on to the site's other icons instead of sending the domain to Google
+                site_results = resolve_site_favicons(list(leaders.values()),
+                                                     accept=lambda content, domain: prepare_favicon(content, domain) is not None)
+            found = 0
+            for key, shop_domain in leaders.items():
+                content, icon_url = site_results.get(shop_domain, (None, None))
+                # A broken image or generic placeholder on the site still deserves a Google search
+                favicon = prepare_favicon(content, shop_domain) if content else None
+                if favicon is not None:
+                    found += 1
+                    print(f"  Found favicon for {shop_domain} on its website ({icon_url})")
+                    cache.put_hit(key, content, icon_url, source='site')
+                    finish_group(key, favicon, source='site')
+            print(f"Found {found} favicons on shop websites, {len(groups)} domains queued for Google search")
+
+        def record_google_result(index, shop_id, shop_domain, favicon_found, error=None):
+            key = normalize_domain(shop_domain)
+            favicon = None
+            if favicon_found:
+                # The other shops of the domain get the canonical PNG the lookup produced
+                with open(favicon_path(shop_id, shop_domain), 'rb') as f:
+                    content = f.read()
+                cache.put_hit(key, content, source='google')
+                favicon = prepare_favicon(content, shop_domain)
+            elif error is None:
+                # Blocks, crashes and watchdog kills say nothing about the domain, only real misses are cached
+                cache.put_miss(key, source='google')
+            finish_group(key, favicon, error)
+
+        google_shops = [group[0] for group in groups.values()]
+        if google_shops and self.workers > 1:
+            run_worker_pool(google_shops, min(self.workers, len(google_shops)), record_google_result, self.offline_extract, self.rate)
+        elif google_shops:
+            self.google_loop(google_shops, record_google_result)
+
+        cache.evict()
+        return stats
+
+    def record_journal(self, index, shop_id, status, error=None):
+        self.journal_done[index] = status
+        if self.journal:
+            self.journal.record_shop(index, shop_id, status, error)
+
+    def close(self):
+        """Quit the browsers and report how the run was paced and where the time went"""
+        self.quit_driver()
+        self.drivers.close()
+        if self.pipeline:
+            self.pipeline.close()
+        if self.google_lookups:
+            print(f"  {self.pacer.summary()}")
+            launches = get_driver_factory().summary()
+            if launches:
+                print(f"  {launches}")
+            phases = self.metrics.phase_summary()
+            if phases:
+                print(f"  {phases}")
+        self.metrics.close()
+
+# Function to print the totals of a run
+def print_summary(stats):
+    shops_processed = stats['processed']
+    shops_successful = stats['successful']
+    shops_skipped = stats['skipped']
+    
+    print(f"\nCompleted processing!")
+    total_processed = shops_processed + shops_skipped
+    print(f"  Total processed: {total_processed}")
+    print(f"  Successful downloads: {shops_successful}")
+    print(f"  Skipped (already exist): {shops_skipped}")
+    if stats.get('cached'):
+        print(f"  Answered from domain cache: {stats['cached']}")
+    print(f"  Failed: {shops_processed - shops_successful}")
+    print(f"  Success rate: {(shops_successful/total_processed*100) if total_processed > 0 else 0:.1f}%")
+
+# Stream wrapper that tags every line a worker prints with its name
+class PrefixedOutput:
+    def __init__(self, stream, prefix):
+        self.stream = stream
+        self.prefix = prefix
+        self.at_line_start = True
+
+    def write(self, text):
+        for part in text.splitlines(keepends=True):
+            if self.at_line_start:
+                self.stream.write(self.prefix)
+            self.stream.write(part)
+            self.at_line_start = part.endswith('\n')
+        return len(text)
+
+    def flush(self):
+        self.stream.flush()
+
+# Entry point of a worker process in --workers mode
+def google_worker(worker_id, task_queue, result_queue, offline_extract=False, rate=4.0, metrics_paths=(None, None)):
+    """Pull shops from the shared queue until the None sentinel and report every result"""
+    import sys
+    sys.stdout = PrefixedOutput(sys.stdout, f"[w{worker_id}] ")
+    # Lookups are timed here, outcomes are counted by the parent
+    jsonl_path, prom_path = metrics_paths
+    configure_metrics(jsonl_path, worker_prom_path(prom_path, worker_id), labels={'worker': str(worker_id)})
+
+    scraper = FaviconScraper(site_first=False, offline_extract=offline_extract, rate=rate)
+    # Stagger browser launches so the workers don't all hit Google at the same moment
+    scraper.pacer.pause('stagger', worker_id * 2, worker_id * 5)
+
+    def report(index, shop_id, shop_domain, favicon_found, error=None):
+        result_queue.put((worker_id, index, shop_id, shop_domain, favicon_found, error))
+        sys.stdout.flush()
+
+    try:
+        scraper.google_loop(iter(task_queue.get, None), report)
+    finally:
+        scraper.close()
+        result_queue.put((worker_id, None, None, None, None, None))  # Worker finished
+        sys.stdout.flush()
+
+# Function to spread the Google lookups over several browser processes
+def run_worker_pool(shops, workers, on_result, offline_extract=False, rate=4.0):
+    """Run N browser worker processes over a shared queue and aggregate their results centrally.
+
+    rate is the combined Google lookups per minute, split evenly over the workers.
+    """
+    import multiprocessing
+    import queue
+
+    task_queue = multiprocessing.Queue()
+    result_queue = multiprocessing.Queue()
+    for shop in shops:
+        task_queue.put(shop)
+    for _ in range(workers):
+        task_queue.put(None)  # One stop sentinel per worker
+
+    metrics = get_metrics()
+    metrics_paths = (metrics.jsonl_path, metrics.prom_path)
+    processes = [multiprocessing.Process(target=google_worker, args=(worker_id, task_queue, result_queue, offline_extract, rate / workers, metrics_paths), daemon=True)
+                 for worker_id in range(workers)]
+    for process in processes:
+        process.start()
+    print(f"Started {workers} browser workers for {len(shops)} shops")
+
+    per_worker = {worker_id: 0 for worker_id in range(workers)}
+    running = workers
+    try:
+        while running:
+            try:
+                worker_id, index, shop_id, shop_domain, favicon_found, error = result_queue.get(timeout=5)
+            except queue.Empty:
+                # A worker killed hard (OOM, segfault) never sends its finish message
+                running = sum(1 for process in processes if process.is_alive())
+                continue
+            if shop_id is None:
+                running -= 1
+                continue
+            per_worker[worker_id] += 1
+            on_result(index, shop_id, shop_domain, favicon_found, error)
+    finally:
+        for process in processes:
+            process.join(timeout=30)
+            if process.is_alive():
+                process.terminate()
+
+    for worker_id, count in per_worker.items():
+        print(f"  Worker {worker_id}: {count} shops")
+
+# Shops handed to FaviconScraper.run at a time when processing a whole input
+CHUNK_SIZE = 500
+
+# Main function to search Google and download favicons
+def search_and_download_favicons(csv_path, start_from=0, max_shops=None, site_first=True, workers=1, offline_extract=False, rate=4.0, journal_path=None):
+    print(f"Starting favicon scraper...")
+    
+    # With a journal, shops finished by an earlier (possibly killed) run are skipped
+    # and every shop finished now is recorded durably
+    journal = JobJournal(journal_path) if journal_path else None
+    scraper = None
+    
+    try:
+        # Counting uses the row index, a plain CSV is only scanned the first time
+        total_shops = count_shops(csv_path)
+        if total_shops is not None:
+            print(f"Total shops to process: {total_shops}")
+        print(f"Starting from index: {start_from}")
+        
+        end_at = start_from + max_shops if max_shops else None
+        if total_shops is not None:
+            end_at = min(end_at, total_shops) if end_at is not None else total_shops
+        if end_at is not None:
+            print(f"Will process up to shop index: {end_at-1}")
+        
+        scraper = FaviconScraper(site_first=site_first, offline_extract=offline_extract, rate=rate, workers=workers, journal=journal)
+        stats = {'processed': 0, 'successful': 0, 'skipped': 0, 'cached': 0}
+        # Rows are streamed in chunks, so a huge (or piped) input never sits in memory at once
+        for shops in iter_batches(csv_path, CHUNK_SIZE, start_from, end_at):
+            for key, value in scraper.run(shops, total_shops).items():
+                stats[key] += value
+            if scraper.stop_event.is_set():
+                break
+        print_summary(stats)
             
     except Exception as e:
         print(f"Error: {e}")
     
     finally:
-        if driver: # Ensure driver is quit if it exists
-            driver.quit()
+        if scraper:
+            scraper.close()
+        if journal:
+            journal.close()
         generate_favicon_gallery()
 
 if __name__ == "__main__":
+    import argparse
+    import signal
     import sys
     
-    # Default values
-    csv_file = 'remaining_shops.csv'
-    start_index = 0
-    max_to_process = None
+    parser = argparse.ArgumentParser(description="Download shop favicons from Google search results")
+    parser.add_argument('csv_file', nargs='?', default='remaining_shops.csv', help="Semicolon separated CSV with 'Shop ID;Shop' (.csv, .csv.gz or - for stdin)")
+    parser.add_argument('start_index', nargs='?', type=int, default=0, help="Row to start from (0-based, header excluded)")
+    parser.add_argument('max_to_process', nargs='?', type=int, default=None, help="Number of shops to process")
+    parser.add_argument('--workers', type=int, default=1, help="Number of browser processes pulling from a shared queue")
+    parser.add_argument('--rate', type=float, default=4.0, help="Target Google lookups per minute (adapts to slow/blocked responses)")
+    parser.add_argument('--offline-extract', action='store_true', help="Grab the page HTML once and parse it offline instead of scripting the live DOM")
+    parser.add_argument('--journal', help="Append-only job journal: skip shops it marks as done and record every finished shop")
+    parser.add_argument('--no-site-first', action='store_true', help="Skip the direct-from-site HTTP pass and go straight to Google")
+    parser.add_argument('--cache-ttl', type=float, default=POSITIVE_TTL / 3600, help="Hours a favicon found for a domain is reused")
+    parser.add_argument('--metrics-jsonl', help="Append one JSON line per lookup and per finished shop to this file")
+    parser.add_argument('--metrics-file', help="Keep Prometheus text metrics up to date in this file (e.g. metrics.prom)")
+    parser.add_argument('--metrics-port', type=int, help="Serve Prometheus metrics on http://localhost:PORT/metrics")
+    parser.add_argument('--negative-ttl', type=float, default=NEGATIVE_TTL / 3600, help="Hours before a domain without favicon is searched again")
+    parser.add_argument('--page-deadline', type=float, default=PAGE_DEADLINE, help="Seconds a results page gets to show its favicons")
+    parser.add_argument('--lean', action='store_true', default=LEAN_BROWSER, help="Headless browsers that skip fonts, media, stylesheets and ad scripts")
+    parser.add_argument('--recycle-rss-mb', type=float, help="Replace a browser whose renderers use more memory than this (0: off)")
+    parser.add_argument('--recycle-latency', type=float, help="Replace a browser whose median lookup takes longer than this many seconds")
+    parser.add_argument('--recycle-failures', type=int, help="Replace a browser after this many lookups in a row without favicon")
+    parser.add_argument('--recycle-blocks', type=int, help="Replace a browser after this many block pages")
+    parser.add_argument('--recycle-max-shops', type=int, help="Replace a browser after this many shops however healthy it is")
+    parser.add_argument('--no-standby', action='store_true', help="Don't warm up the next browser before a rotation (saves memory)")
+    parser.add_argument('--tabs', type=int, default=TABS_PER_BROWSER, help="Results pages loading at once in each browser, one per tab")
+    parser.add_argument('--pipeline-workers', type=int, default=PIPELINE_WORKERS, help="Threads fetching favicons behind the browser (0: fetch in the browser thread)")
+    parser.add_argument('--search-base-url', default=SEARCH_BASE_URL, help="Search engine to query (e.g. the benchmark's local SERP server)")
+    parser.add_argument('--seed-placeholders', action='store_true', help="Fetch Google's globe icon and list it as a placeholder before starting")
+    args = parser.parse_args()
+
+    # Through the environment as well, so worker processes pick it up however they are started
+    SEARCH_BASE_URL = os.environ['FAVICON_SEARCH_BASE_URL'] = args.search_base_url.rstrip('/')
+    PAGE_DEADLINE = args.page_deadline
+    os.environ['FAVICON_PAGE_DEADLINE'] = str(args.page_deadline)
+    LEAN_BROWSER = args.lean
+    os.environ['FAVICON_LEAN_BROWSER'] = '1' if args.lean else ''
+    if args.no_standby:
+        STANDBY_BROWSER = False
+        os.environ['FAVICON_STANDBY_BROWSER'] = '0'
+    TABS_PER_BROWSER = max(1, args.tabs)
+    os.environ['FAVICON_TABS'] = str(TABS_PER_BROWSER)
+    PIPELINE_WORKERS = max(0, args.pipeline_workers)
+    os.environ['FAVICON_PIPELINE_WORKERS'] = str(PIPELINE_WORKERS)
+    # Recycle thresholds go through the environment so every worker process uses them
+    for option, variable in (('recycle_rss_mb', 'FAVICON_RECYCLE_RSS_MB'), ('recycle_latency', 'FAVICON_RECYCLE_LATENCY'),
+                             ('recycle_failures', 'FAVICON_RECYCLE_FAILURES'), ('recycle_blocks', 'FAVICON_RECYCLE_BLOCKS'),
+                             ('recycle_max_shops', 'FAVICON_RECYCLE_MAX_SHOPS')):
+        if getattr(args, option) is not None:
+            os.environ[variable] = str(getattr(args, option))
     
-    # Parse command line arguments if provided
-    if len(sys.argv) > 1:
-        csv_file = sys.argv[1]
-    if len(sys.argv) > 2:
-        start_index = int(sys.argv[2])
-    if len(sys.argv) > 3:
-        max_to_process = int(sys.argv[3])
+    csv_file = args.csv_file
+    start_index = args.start_index
+    max_to_process = args.max_to_process
     
     print(f"Starting scraper with CSV: {csv_file}, Starting at index: {start_index}" + 
-          (f", Processing up to {max_to_process} shops" if max_to_process else ""))
+          (f", Processing up to {max_to_process} shops" if max_to_process else "") +
+          (f", {args.workers} browser workers" if args.workers > 1 else ""))
+    
+    open_cache(positive_ttl=args.cache_ttl * 3600, negative_ttl=args.negative_ttl * 3600)
+    if args.seed_placeholders:
+        seed_google_placeholders(search_base_url=SEARCH_BASE_URL)
+    configure_metrics(args.metrics_jsonl, args.metrics_file, args.metrics_port)
+    
+    # Turn SIGTERM into a normal exit so the browser is quit and the journal is closed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
     
-    search_and_download_favicons(csv_file, start_index, max_to_process)
\ No newline at end of file
+    search_and_download_favicons(csv_file, start_index, max_to_process, site_first=not args.no_site_first, workers=args.workers,
+                                 offline_extract=args.offline_extract, rate=args.rate, journal_path=args.journal)
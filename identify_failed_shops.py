@@ -5,25 +5,12 @@ Creates a new CSV file with only the shops that don't have favicons yet
 """
 
 import csv
-import os
+
+from status_store import SUCCESS, open_store
 
 def get_existing_favicon_shop_ids():
-    """Get all shop IDs that have favicons"""
-    shop_ids = set()
-    
-    if not os.path.exists('favicons'):
-        return shop_ids
-    
-    favicon_files = [f for f in os.listdir('favicons') if f.endswith(('.png', '.jpg', '.jpeg', '.gif'))]
-    
-    for favicon_file in favicon_files:
-        # Extract shop ID from filename (format: ShopID_domain_name.extension)
-        parts = favicon_file.split('_', 1)
-        if len(parts) >= 1:
-            shop_id = parts[0]
-            shop_ids.add(shop_id)
-    
-    return shop_ids
+    """Get all shop IDs that have favicons (indexed lookup in the status store)"""
+    return open_store().shop_ids_with_status(SUCCESS)
 
 def create_failed_shops_csv(input_csv='remaining_shops2_fresh.csv', output_csv='failed_shops.csv'):
     """Create a CSV with shops that don't have favicons"""
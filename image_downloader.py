@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Image Downloader
+Blocking download path for favicon URLs found on Google result pages. Every
+download goes through a shared keep-alive connection pool with connect/read
+timeouts, an overall deadline, retries with backoff on 5xx/429, a size cap and
+a content-type check. ETag/Last-Modified validators are stored per URL along
+with the content hash, so downloading the same icon again is a cheap
+conditional GET answered from the blob store.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from blob_store import content_sha256, open_blob_store
+from site_favicon_resolver import DEFAULT_HEADERS, MAX_ICON_BYTES, looks_like_image
+
+VALIDATOR_DB = os.environ.get('FAVICON_DOWNLOAD_DB', 'download_validators.db')
+
+# Status codes worth another attempt
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Longest Retry-After we honour, in seconds; a host asking for more gets this much
+MAX_RETRY_AFTER = 3.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS validators (
+    url           TEXT PRIMARY KEY,
+    etag          TEXT,
+    last_modified TEXT,
+    content_hash  TEXT NOT NULL,
+    size          INTEGER NOT NULL,
+    updated_at    REAL NOT NULL
+);
+"""
+
+class DownloadResult:
+    """Outcome of a single download"""
+
+    def __init__(self, url, status=None, content=None, error=None, not_modified=False, elapsed=0.0):
+        self.url = url
+        self.status = status
+        self.content = content
+        self.error = error
+        self.not_modified = not_modified
+        self.elapsed = elapsed
+
+    @property
+    def ok(self):
+        return self.error is None and self.content is not None
+
+    def __repr__(self):
+        size = len(self.content) if self.content is not None else 0
+        return f"DownloadResult({self.url!r}, status={self.status}, bytes={size}, not_modified={self.not_modified}, error={self.error!r})"
+
+class ValidatorStore:
+    """ETag/Last-Modified of downloaded URLs and the hash of the content they returned"""
+
+    def __init__(self, path=VALIDATOR_DB):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, url):
+        row = self._connection().execute('SELECT * FROM validators WHERE url = ?', (url,)).fetchone()
+        return dict(row) if row else None
+
+    def put(self, url, etag, last_modified, content_hash, size):
+        conn = self._connection()
+        with conn:
+            conn.execute('INSERT OR REPLACE INTO validators VALUES (?, ?, ?, ?, ?, ?)',
+                         (url, etag, last_modified, content_hash, size, time.time()))
+
+class CappedRetry(Retry):
+    """Retry that honours Retry-After only up to MAX_RETRY_AFTER, so one host can't park a download thread"""
+
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        return None if retry_after is None else min(retry_after, MAX_RETRY_AFTER)
+
+class ImageDownloader:
+    """Pooled, bounded image downloads.
+
+    Each thread gets its own Session (requests sessions are not thread-safe),
+    all of them configured with the same pool size, retry policy and limits.
+    """
+
+    def __init__(self, pool_size=16, connect_timeout=3.0, read_timeout=5.0, total_timeout=15.0,
+                 max_retries=2, backoff_factor=0.5, max_bytes=MAX_ICON_BYTES, validators=None):
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.total_timeout = total_timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_bytes = max_bytes
+        self.validators = validators if validators is not None else ValidatorStore()
+        self.blobs = open_blob_store()
+        self._local = threading.local()
+
+    @property
+    def session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            retry = CappedRetry(total=self.max_retries, connect=self.max_retries, read=self.max_retries,
+                                status=self.max_retries, backoff_factor=self.backoff_factor,
+                                status_forcelist=RETRY_STATUSES, allowed_methods=frozenset(['GET']),
+                                respect_retry_after_header=True, raise_on_status=False)
+            adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size, max_retries=retry)
+            session = requests.Session()
+            session.headers.update(DEFAULT_HEADERS)
+            session.headers['Accept'] = 'image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8'
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            self._local.session = session
+        return session
+
+    def _read_body(self, response, deadline):
+        """Stream the body in 16 KB chunks, bounded by the size cap and the overall deadline"""
+        declared = response.headers.get('Content-Length')
+        if declared and declared.isdigit() and int(declared) > self.max_bytes:
+            raise ValueError(f"Content-Length {declared} exceeds {self.max_bytes} bytes")
+        chunks = []
+        total = 0
+        for chunk in response.iter_content(chunk_size=16384):
+            total += len(chunk)
+            if total > self.max_bytes:
+                raise ValueError(f"body exceeds {self.max_bytes} bytes")
+            # The read timeout only covers the gap between chunks, a host dripping
+            # bytes slowly is cut off here
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"download took longer than {self.total_timeout}s")
+            chunks.append(chunk)
+        return b''.join(chunks)
+
+    def fetch(self, url):
+        """Download an image URL, using a conditional GET when it was downloaded before"""
+        started = time.monotonic()
+        result = DownloadResult(url)
+        previous = self.validators.get(url)
+        if previous and not self.blobs.exists(previous['content_hash']):
+            previous = None  # Nothing to fall back on for a 304
+
+        headers = {}
+        if previous and previous['etag']:
+            headers['If-None-Match'] = previous['etag']
+        if previous and previous['last_modified']:
+            headers['If-Modified-Since'] = previous['last_modified']
+
+        try:
+            with self.session.get(url, headers=headers, timeout=self.timeout, stream=True, allow_redirects=True) as response:
+                result.status = response.status_code
+                if response.status_code == 304 and previous:
+                    result.content = self.blobs.read(previous['content_hash'])
+                    result.not_modified = True
+                elif response.status_code != 200:
+                    result.error = f"HTTP {response.status_code}"
+                else:
+                    content = self._read_body(response, started + self.total_timeout)
+                    if looks_like_image(content, response.headers.get('Content-Type')):
+                        result.content = content
+                        etag = response.headers.get('ETag')
+                        last_modified = response.headers.get('Last-Modified')
+                        if etag or last_modified:
+                            self.validators.put(url, etag, last_modified, content_sha256(content), len(content))
+                    else:
+                        result.error = f"not an image (Content-Type {response.headers.get('Content-Type')!r})"
+        except (requests.RequestException, ValueError, TimeoutError, OSError) as e:
+            result.error = f"{type(e).__name__}: {e}"
+
+        result.elapsed = time.monotonic() - started
+        return result
+
+_default_downloader = None
+
+def get_downloader():
+    """Downloader shared by the whole process, so connections are reused across shops"""
+    global _default_downloader
+    if _default_downloader is None:
+        _default_downloader = ImageDownloader()
+    return _default_downloader
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        print("Usage: python image_downloader.py URL [URL ...]")
+        sys.exit(1)
+
+    downloader = get_downloader()
+    for url in sys.argv[1:]:
+        result = downloader.fetch(url)
+        status = "✅" if result.ok else "❌"
+        size = len(result.content) if result.content is not None else 0
+        print(f"{status} {url} -> {result.status} ({size} bytes{', not modified' if result.not_modified else ''}, "
+              f"{result.elapsed:.2f}s) {result.error or ''}")
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Job Journal
+Append-only, fsynced JSON-lines journal of a scraping run. Every finished shop
+gets its own record, so a crashed or killed run can resume exactly where it
+stopped instead of from a guessed start index.
+"""
+
+import json
+import os
+import time
+
+# Shop statuses that count as done for a resumed run. 'failed' is a real miss;
+# a shop that hit a transient error (blocked, browser crash, watchdog) is
+# journaled as 'retry' and looked up again.
+DONE_STATUSES = ('success', 'failed', 'skipped')
+
+class JobJournal:
+    """Writer for a journal file; every record is flushed and fsynced before returning"""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'a', encoding='utf-8')
+        # Terminate a torn last line from a crash so the next record starts cleanly
+        if self.file.tell() > 0:
+            with open(path, 'rb') as existing:
+                existing.seek(-1, os.SEEK_END)
+                if existing.read(1) != b'\n':
+                    self.file.write('\n')
+
+    def record(self, record_type, **fields):
+        entry = {'type': record_type, 'ts': time.time()}
+        entry.update(fields)
+        self.file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def record_shop(self, index, shop_id, status, error=None):
+        """Mark one shop (by CSV row index) as finished"""
+        fields = {'index': index, 'shop_id': shop_id, 'status': status}
+        if error:
+            fields['error'] = error
+        self.record('shop', **fields)
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def read_journal(path):
+    """All intact records of a journal, in order (missing file -> empty list)"""
+    records = []
+    if not os.path.exists(path):
+        return records
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # Torn write from a crash or power loss, everything before it is intact
+                continue
+    return records
+
+def completed_indices(path):
+    """Map of CSV row index -> status for every shop the journal marks as done"""
+    done = {}
+    for entry in read_journal(path):
+        if entry.get('type') == 'shop' and entry.get('status') in DONE_STATUSES:
+            done[entry['index']] = entry['status']
+    return done
+
+def journal_path_for(csv_file):
+    """Default journal location next to the input CSV"""
+    return f"{csv_file}.journal"
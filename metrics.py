@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Scraper Metrics
+Per-shop timing spans and outcome counters. Each Google lookup is written as
+one JSON line with the seconds spent in every phase (driver startup,
+driver.get, consent, result wait, extraction, each approach, image save,
+pacing sleeps) and the number of WebDriver round trips it took. Aggregates are rendered in the Prometheus text format, written
+to a file (for node_exporter's textfile collector) and/or served over HTTP, so
+throttling trends show up while a run is still going.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Histogram buckets in seconds, shared by every phase
+BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32, 64, 128)
+# Minimum seconds between two writes of the Prometheus file
+WRITE_INTERVAL = 5.0
+
+def failure_reason(error):
+    """Short label for why a shop failed, for the outcome counters"""
+    if not error:
+        return 'not_found'
+    error = error.lower()
+    for marker, reason in (('blocked', 'blocked'), ('watchdog', 'watchdog'), ('webdriver', 'webdriver'),
+                           ('placeholder', 'placeholder'), ('cached', 'cached_miss'), ('lease', 'lease'),
+                           ('retries exhausted', 'retries_exhausted')):
+        if marker in error:
+            return reason
+    return 'error'
+
+def series(name, label_text):
+    """Metric name with its labels, without braces when there are none"""
+    label_text = label_text.lstrip(',')
+    return f'{name}{{{label_text}}}' if label_text else name
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class Metrics:
+    """Thread-safe collection of spans, counters and gauges for one process"""
+
+    def __init__(self, jsonl_path=None, prom_path=None, labels=None):
+        self.jsonl_path = jsonl_path
+        self.prom_path = prom_path
+        self.labels = labels or {}
+        self.lock = threading.Lock()
+        self.histograms = {}  # phase -> [bucket counts..., sum, count]
+        self.counters = {}    # (name, ((label, value), ...)) -> value
+        self.gauges = {}      # (name, ((label, value), ...)) -> value
+        self.started = time.time()
+        self.last_write = 0.0
+        self._local = threading.local()
+        self._jsonl = None
+
+    # ----- spans -----
+
+    @contextmanager
+    def span(self, phase):
+        """Time a block and attribute it to `phase` of the current lookup"""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record_span(phase, time.monotonic() - started)
+
+    def record_span(self, phase, seconds):
+        with self.lock:
+            histogram = self.histograms.setdefault(phase, [0] * len(BUCKETS) + [0.0, 0])
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    histogram[i] += 1
+            histogram[-2] += seconds
+            histogram[-1] += 1
+        lookup = getattr(self._local, 'lookup', None)
+        if lookup is not None:
+            lookup['spans'].append([phase, round(seconds, 3)])
+
+    def record_sleep(self, reason, seconds):
+        """Hook for the pacer: every sleep becomes a span"""
+        self.record_span(f"sleep_{reason}", seconds)
+
+    def start_lookup(self, shop_id, shop_domain):
+        """Begin collecting the spans of one shop's lookup in this thread, returns the lookup"""
+        self._local.lookup = {'shop_id': shop_id, 'domain': shop_domain, 'spans': [], 'commands': 0,
+                              'started': time.monotonic()}
+        return self._local.lookup
+
+    def current_lookup(self):
+        """The lookup spans are attributed to in this thread, or None"""
+        return getattr(self._local, 'lookup', None)
+
+    def resume_lookup(self, lookup):
+        """Make an earlier started lookup the current one again (several tabs take turns in one thread)"""
+        self._local.lookup = lookup
+
+    def record_command(self):
+        """Count one WebDriver round trip, for the process and for the current lookup"""
+        self.count('favicon_webdriver_commands_total')
+        lookup = getattr(self._local, 'lookup', None)
+        if lookup is not None:
+            lookup['commands'] += 1
+
+    def finish_lookup(self, found, error=None, lookup=None):
+        """Write the current (or the given) lookup as a JSON line and refresh the exported aggregates"""
+        if lookup is None:
+            lookup = getattr(self._local, 'lookup', None)
+            if lookup is None:
+                return
+        if getattr(self._local, 'lookup', None) is lookup:
+            self._local.lookup = None
+        total = time.monotonic() - lookup['started']
+        self.record_span('lookup', total)
+        entry = {'type': 'lookup', 'ts': time.time(), 'shop_id': lookup['shop_id'], 'domain': lookup['domain'],
+                 'found': found, 'reason': None if found else failure_reason(error), 'seconds': round(total, 3),
+                 'commands': lookup['commands'], 'spans': lookup['spans']}
+        entry.update(self.labels)
+        self.write_jsonl(entry)
+        self.maybe_write_prom()
+
+    # ----- counters and gauges -----
+
+    def _key(self, name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def count(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        with self.lock:
+            self.gauges[self._key(name, labels)] = value
+
+    def shop_outcome(self, shop_id, outcome, error=None, source=None):
+        """Count a finished shop (success/skipped/failed) and log it as a JSON line"""
+        reason = failure_reason(error) if outcome == 'failed' else None
+        labels = {'outcome': outcome}
+        if reason:
+            labels['reason'] = reason
+        self.count('favicon_shops_total', **labels)
+        entry = {'type': 'shop', 'ts': time.time(), 'shop_id': shop_id, 'outcome': outcome, 'reason': reason}
+        if source:
+            entry['source'] = source
+        entry.update(self.labels)
+        self.write_jsonl(entry)
+        self.maybe_write_prom()
+
+    def log_event(self, event_type, **fields):
+        """Write a one-off event (a browser recycle, ...) as a JSON line"""
+        entry = {'type': event_type, 'ts': time.time()}
+        entry.update(fields)
+        entry.update(self.labels)
+        self.write_jsonl(entry)
+
+    # ----- export -----
+
+    def write_jsonl(self, entry):
+        if not self.jsonl_path:
+            return
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        with self.lock:
+            if self._jsonl is None:
+                self._jsonl = open(self.jsonl_path, 'a', encoding='utf-8', buffering=1)
+            self._jsonl.write(line)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        base = ''.join(f',{k}="{escape_label(v)}"' for k, v in sorted(self.labels.items()))
+        lines = []
+        with self.lock:
+            lines.append('# HELP favicon_phase_seconds Seconds spent per lookup phase')
+            lines.append('# TYPE favicon_phase_seconds histogram')
+            for phase, histogram in sorted(self.histograms.items()):
+                labels = f'phase="{escape_label(phase)}"{base}'
+                for bound, bucket in zip(BUCKETS, histogram):
+                    lines.append(f'favicon_phase_seconds_bucket{{{labels},le="{bound}"}} {bucket}')
+                lines.append(f'favicon_phase_seconds_bucket{{{labels},le="+Inf"}} {histogram[-1]}')
+                lines.append(f'favicon_phase_seconds_sum{{{labels}}} {histogram[-2]:.3f}')
+                lines.append(f'favicon_phase_seconds_count{{{labels}}} {histogram[-1]}')
+            for kind, values in (('counter', self.counters), ('gauge', self.gauges)):
+                typed = set()
+                for (name, labels), value in sorted(values.items()):
+                    if name not in typed:
+                        lines.append(f'# TYPE {name} {kind}')
+                        typed.add(name)
+                    label_text = ','.join(f'{k}="{escape_label(v)}"' for k, v in labels) + base
+                    lines.append(f'{series(name, label_text)} {value}')
+        lines.append(f'# TYPE favicon_run_start_time_seconds gauge')
+        lines.append(f'{series("favicon_run_start_time_seconds", base)} {self.started:.0f}')
+        return '\n'.join(lines) + '\n'
+
+    def write_prom(self):
+        if not self.prom_path:
+            return
+        tmp_path = f"{self.prom_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.render())
+        os.replace(tmp_path, self.prom_path)  # Scrapers never see a half written file
+        self.last_write = time.monotonic()
+
+    def maybe_write_prom(self):
+        if self.prom_path and time.monotonic() - self.last_write >= WRITE_INTERVAL:
+            self.write_prom()
+
+    def serve(self, port):
+        """Serve /metrics over HTTP from a daemon thread"""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        metrics = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass  # Keep scrapes out of the scraper output
+
+        server = ThreadingHTTPServer(('0.0.0.0', port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"📈 Metrics on http://localhost:{port}/metrics")
+        return server
+
+    def phase_summary(self):
+        """One line with the share of lookup time per phase"""
+        with self.lock:
+            totals = {phase: histogram[-2] for phase, histogram in self.histograms.items() if phase != 'lookup'}
+            lookup = self.histograms.get('lookup')
+        if not lookup or not lookup[-1]:
+            return None
+        spent = sum(totals.values()) or 1.0
+        top = sorted(totals.items(), key=lambda item: -item[1])[:6]
+        parts = ', '.join(f"{phase} {seconds / spent * 100:.0f}%" for phase, seconds in top)
+        return f"Phases over {lookup[-1]} lookups ({lookup[-2] / lookup[-1]:.1f}s avg): {parts}"
+
+    def close(self):
+        self.write_prom()
+        with self.lock:
+            if self._jsonl is not None:
+                self._jsonl.close()
+                self._jsonl = None
+
+_default_metrics = None
+
+def get_metrics():
+    """Metrics of this process (collected in memory even when nothing is exported)"""
+    global _default_metrics
+    if _default_metrics is None:
+        _default_metrics = Metrics()
+    return _default_metrics
+
+def configure_metrics(jsonl_path=None, prom_path=None, port=None, labels=None):
+    """Start a fresh Metrics for this process with the given exports, returns it.
+
+    Call before anything grabs get_metrics(); worker processes call it again with their own labels.
+    """
+    global _default_metrics
+    _default_metrics = Metrics(jsonl_path, prom_path, labels)
+    if port:
+        _default_metrics.serve(port)
+    return _default_metrics
+
+def worker_prom_path(prom_path, worker_id):
+    """Per-worker Prometheus file next to the main one (metrics.prom -> metrics_w1.prom)"""
+    if not prom_path:
+        return None
+    root, ext = os.path.splitext(prom_path)
+    return f"{root}_w{worker_id}{ext}"
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Adaptive Pacing
+One place for every sleep the scraper does. A token bucket with jitter keeps
+Google lookups at a configurable target rate, backs off on slow responses,
+consent walls and block pages, speeds up again while things are healthy, and
+keeps track of how much wall time goes into sleeping versus working.
+"""
+
+import random
+import time
+
+class Pacer:
+    """Token bucket pacing with adaptive backoff.
+
+    target_rate is in requests per minute. The effective interval between
+    requests is the base interval times the current backoff factor.
+    """
+
+    def __init__(self, target_rate=4.0, burst=1, jitter=0.3, slow_threshold=8.0,
+                 min_backoff=1.0, max_backoff=8.0, sleep=time.sleep, clock=time.monotonic, on_sleep=None):
+        self.base_interval = 60.0 / target_rate
+        self.capacity = burst
+        self.jitter = jitter
+        self.slow_threshold = slow_threshold
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.backoff = min_backoff
+        self._sleep = sleep
+        self._clock = clock
+        self.on_sleep = on_sleep  # Called with (reason, seconds) after every sleep
+
+        self.tokens = float(burst)
+        self.last_refill = clock()
+        self._slot_at = None  # When try_slot's pending slot opens
+        self.started = self.last_refill
+        self.sleep_time = {}  # reason -> seconds slept
+        self.events = {'slow': 0, 'consent': 0, 'blocked': 0, 'healthy': 0}
+
+    @property
+    def interval(self):
+        return self.base_interval * self.backoff
+
+    def _refill(self):
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) / self.interval)
+        self.last_refill = now
+
+    def _do_sleep(self, seconds, reason):
+        if seconds <= 0:
+            return
+        self._sleep(seconds)
+        self.sleep_time[reason] = self.sleep_time.get(reason, 0.0) + seconds
+        if self.on_sleep:
+            self.on_sleep(reason, seconds)
+
+    def wait_for_slot(self):
+        """Block until the next request may start, returns the seconds slept"""
+        self._refill()
+        waited = 0.0
+        if self.tokens < 1:
+            delay = (1 - self.tokens) * self.interval
+            delay *= random.uniform(1 - self.jitter, 1 + self.jitter)
+            print(f"  😴 Pacing: waiting {delay:.1f} seconds (interval {self.interval:.1f}s, backoff x{self.backoff:.2f})...")
+            self._do_sleep(delay, 'pacing')
+            waited = delay
+            self._refill()
+        self.tokens = max(0.0, self.tokens - 1)
+        self._slot_at = None
+        return waited
+
+    def next_slot_in(self):
+        """Seconds until try_slot will take the next slot (0 when it is open now)"""
+        self._refill()
+        now = self._clock()
+        if self._slot_at is None:
+            delay = max(0.0, 1 - self.tokens) * self.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+            self._slot_at = now + delay
+        return max(0.0, self._slot_at - now)
+
+    def try_slot(self):
+        """Take the next request slot if it is open right now, without sleeping; returns True when taken.
+
+        For callers with other work to do meanwhile (tabs still loading). The wait until the
+        slot opens is the one wait_for_slot would sleep, jitter included, drawn once per slot.
+        """
+        if self.next_slot_in() > 0:
+            return False
+        self._slot_at = None
+        self.tokens = max(0.0, self.tokens - 1)
+        return True
+
+    def pause(self, reason, low, high=None):
+        """A short fixed wait (page settle, dialog animation, browser restart), scaled by the backoff"""
+        seconds = random.uniform(low, high if high is not None else low) * self.backoff
+        self._do_sleep(seconds, reason)
+        return seconds
+
+    def observe(self, response_time=None, consent=False, blocked=False):
+        """Feed back what the last request looked like so the pace can adapt"""
+        if blocked:
+            self.events['blocked'] += 1
+            self.backoff = min(self.max_backoff, self.backoff * 3)
+            print(f"  🚫 Block page detected, backing off to x{self.backoff:.2f}")
+        elif consent or (response_time is not None and response_time > self.slow_threshold):
+            self.events['consent' if consent else 'slow'] += 1
+            self.backoff = min(self.max_backoff, self.backoff * 1.5)
+        else:
+            self.events['healthy'] += 1
+            self.backoff = max(self.min_backoff, self.backoff * 0.9)
+
+    def stats(self):
+        """Sleep/work split of the wall time since the pacer was created"""
+        wall = self._clock() - self.started
+        slept = sum(self.sleep_time.values())
+        return {
+            'wall_seconds': wall,
+            'sleep_seconds': slept,
+            'work_seconds': max(0.0, wall - slept),
+            'sleep_fraction': slept / wall if wall > 0 else 0.0,
+            'sleep_by_reason': dict(self.sleep_time),
+            'events': dict(self.events),
+            'backoff': self.backoff,
+        }
+
+    def summary(self):
+        stats = self.stats()
+        reasons = ', '.join(f"{reason} {seconds:.0f}s" for reason, seconds in sorted(stats['sleep_by_reason'].items()))
+        return (f"Pacing: {stats['wall_seconds']:.0f}s wall, {stats['work_seconds']:.0f}s working, "
+                f"{stats['sleep_seconds']:.0f}s sleeping ({stats['sleep_fraction']*100:.0f}%)"
+                + (f" [{reasons}]" if reasons else "")
+                + f", final backoff x{stats['backoff']:.2f}")
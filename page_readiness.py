@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+SERP Page Readiness
+Decides when a results page is ready to extract from, in one async script
+round trip instead of a chain of fixed waits. Pages are loaded with the
+'eager' strategy (driver.get returns at DOMContentLoaded); the script then
+watches the DOM with a MutationObserver and resolves with the first of:
+
+  ready       result containers with a cite and favicon images are present
+              and the DOM stopped changing for a moment
+  empty       the page finished loading without any favicon next to a cite
+  consent     the cookie dialog is showing (or the consent.google.com redirect)
+  blocked     the page is Google's /sorry/ captcha
+  timeout     the shop's deadline passed first
+
+wait_for_results blocks until then; probe_results waits at most a given time,
+so several tabs can load at once and be handled in the order they become ready.
+"""
+
+from selenium.common.exceptions import JavascriptException, TimeoutException
+
+# Seconds the DOM has to stay unchanged once favicons showed up, and the most
+# time spent waiting for late favicons after the first one
+QUIET_PERIOD = 0.3
+MAX_SETTLE = 1.5
+# Seconds to give scripts after the load event before a page without favicons counts as empty
+EMPTY_GRACE = 1.0
+
+# Watches the current document and calls done({state, url}) once, see the module docstring
+WATCH_FUNCTION = r"""
+function watchResults(timeoutMs, quietMs, maxSettleMs, emptyGraceMs, consentXPath, done) {
+    let finished = false, firstSeen = null, quietTimer = null, emptyTimer = null, observer = null;
+
+    function finish(state) {
+        if (finished) return;
+        finished = true;
+        if (observer) observer.disconnect();
+        clearTimeout(quietTimer); clearTimeout(emptyTimer); clearTimeout(deadline);
+        done({state: state, url: location.href});
+    }
+    function consentShown() {
+        const button = document.evaluate(consentXPath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+        return button !== null && button.getClientRects().length > 0;
+    }
+    function hasFavicons() {
+        const search = document.getElementById('search');
+        if (!search || !search.getElementsByTagName('cite').length) return false;
+        for (const img of search.getElementsByTagName('img')) {
+            if (img.getAttribute('src')) return true;
+        }
+        return false;
+    }
+    function check() {
+        if (finished) return;
+        if (location.pathname.indexOf('/sorry/') === 0) return finish('blocked');
+        if (location.hostname.indexOf('consent.') === 0 || consentShown()) return finish('consent');
+        if (hasFavicons()) {
+            clearTimeout(emptyTimer);
+            const now = Date.now();
+            if (firstSeen === null) firstSeen = now;
+            if (now - firstSeen >= maxSettleMs) return finish('ready');
+            // Every change restarts the quiet period, so late favicons still make it in
+            clearTimeout(quietTimer);
+            quietTimer = setTimeout(() => finish('ready'), quietMs);
+        } else if (document.readyState === 'complete' && emptyTimer === null) {
+            emptyTimer = setTimeout(() => hasFavicons() ? check() : finish('empty'), emptyGraceMs);
+        }
+    }
+    const deadline = setTimeout(() => finish(hasFavicons() ? 'ready' : 'timeout'), timeoutMs);
+    observer = new MutationObserver(check);
+    observer.observe(document.documentElement, {childList: true, subtree: true, attributes: true, attributeFilter: ['src', 'style', 'class']});
+    document.addEventListener('readystatechange', check);
+    check();
+}
+"""
+
+# Blocks (async script) until the page is ready
+READY_SCRIPT = WATCH_FUNCTION + r"""
+watchResults(arguments[0], arguments[1], arguments[2], arguments[3], arguments[4], arguments[arguments.length - 1]);
+"""
+
+# Async: the state once the page in this tab is ready, null when it is not ready within
+# arguments[6] ms. The first call on a new results page starts the watcher, later calls
+# join it; a page that is not yet the search for arguments[5] (the previous one, or
+# about:blank) counts as loading, and the wait on it ends when the new page replaces it.
+PROBE_SCRIPT = WATCH_FUNCTION + r"""
+const done = arguments[arguments.length - 1], waitMs = arguments[6];
+function waitFor(ms, register) {
+    if (ms <= 0) return done(null);
+    const timer = setTimeout(() => done(null), ms);
+    if (register) register(result => { clearTimeout(timer); done(result); });
+}
+if (location.pathname.indexOf('/sorry/') === 0) return done({state: 'blocked', url: location.href});
+if (location.hostname.indexOf('consent.') === 0) return done({state: 'consent', url: location.href});
+if (new URLSearchParams(location.search).get('q') !== arguments[5] || document.readyState === 'loading') return waitFor(waitMs);
+if (!window.__faviconWaiters) {
+    window.__faviconWaiters = [];
+    watchResults(arguments[0], arguments[1], arguments[2], arguments[3], arguments[4], result => {
+        window.__faviconReady = result;
+        window.__faviconWaiters.forEach(waiter => waiter(result));
+    });
+}
+if (window.__faviconReady) return done(window.__faviconReady);
+waitFor(waitMs, waiter => window.__faviconWaiters.push(waiter));
+"""
+
+def wait_for_results(driver, timeout, consent_xpath, quiet=QUIET_PERIOD, max_settle=MAX_SETTLE, empty_grace=EMPTY_GRACE):
+    """Block until the current results page is ready (see the module docstring), returns (state, url).
+
+    The driver's script timeout must be longer than `timeout`; url is None when the
+    page went away while waiting (a navigation or a killed browser).
+    """
+    if timeout <= 0:
+        return 'timeout', None
+    try:
+        result = driver.execute_async_script(READY_SCRIPT, int(timeout * 1000), int(quiet * 1000),
+                                             int(max_settle * 1000), int(empty_grace * 1000), consent_xpath)
+    except TimeoutException:
+        return 'timeout', None
+    except JavascriptException:
+        # The document was replaced mid-wait (consent reload, redirect); the caller decides what to do
+        return 'navigated', None
+    return result['state'], result['url']
+
+def probe_results(driver, query, timeout, consent_xpath, wait=0.0, quiet=QUIET_PERIOD, max_settle=MAX_SETTLE,
+                  empty_grace=EMPTY_GRACE):
+    """Readiness of the search for `query` in the current tab, waiting at most `wait` seconds.
+
+    Returns (state, url) as soon as the page is ready, None when it is still loading
+    after `wait`. For several tabs loading at once: each tab's watcher keeps running
+    while the others are waited on; `timeout` is the page's own deadline. `wait` must
+    stay below the driver's script timeout.
+    """
+    try:
+        result = driver.execute_async_script(PROBE_SCRIPT, int(max(timeout, 0) * 1000), int(quiet * 1000),
+                                             int(max_settle * 1000), int(empty_grace * 1000), consent_xpath, query,
+                                             int(max(wait, 0) * 1000))
+    except (JavascriptException, TimeoutException):
+        return None  # The document was replaced while waiting: the new one is probed next time
+    return (result['state'], result['url']) if result else None
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Browser Recycling Policy
+Decides when a browser session should be replaced, from measured signals
+instead of a fixed shop count:
+
+  memory     the renderer processes grew past a size limit (leaks)
+  latency    the rolling median lookup time went over a limit (throttling)
+  failures   too many lookups in a row found nothing (a broken session)
+  blocked    Google showed its captcha page (a fresh session and a cool-down)
+  shops      a very high safety cap on shops per session
+
+Thresholds default to the FAVICON_RECYCLE_* environment variables, which the
+scraper's --recycle-* options set, so worker processes use the same policy.
+Memory is read with psutil (in requirements.txt) and from /proc when it is
+missing; where neither works the memory signal is off, which is printed once.
+"""
+
+import os
+import statistics
+from collections import deque
+
+try:
+    import psutil
+except ImportError:  # /proc is read directly on Linux
+    psutil = None
+
+# Environment variable, default threshold
+ENVIRONMENT = {
+    'max_rss_mb': ('FAVICON_RECYCLE_RSS_MB', 1500.0),
+    'max_latency': ('FAVICON_RECYCLE_LATENCY', 20.0),
+    'max_failures': ('FAVICON_RECYCLE_FAILURES', 6),
+    'max_blocks': ('FAVICON_RECYCLE_BLOCKS', 1),
+    'max_shops': ('FAVICON_RECYCLE_MAX_SHOPS', 250),
+}
+LATENCY_WINDOW = 8  # Lookups in the rolling latency median
+
+_memory_off_reported = False
+
+def memory_readable():
+    """Whether process memory can be read here (psutil, or /proc on Linux)"""
+    return psutil is not None or os.path.isdir('/proc')
+
+def process_table():
+    """pid -> (parent pid, RSS bytes, command line) of every visible process"""
+    table = {}
+    if psutil is not None:
+        for process in psutil.process_iter(['pid', 'ppid', 'memory_info', 'cmdline']):
+            info = process.info
+            if info['memory_info'] is not None:
+                table[info['pid']] = (info['ppid'], info['memory_info'].rss, ' '.join(info['cmdline'] or ()))
+        return table
+    if not os.path.isdir('/proc'):
+        raise OSError("no psutil and no /proc to read processes from")
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', 'rb') as f:
+                parent = int(f.read().rsplit(b')', 1)[1].split()[1])  # The name in () may contain spaces
+            with open(f'/proc/{entry}/statm', 'rb') as f:
+                rss = int(f.read().split()[1]) * page_size
+            with open(f'/proc/{entry}/cmdline', 'rb') as f:
+                cmdline = f.read().replace(b'\0', b' ').decode('utf-8', 'replace')
+        except (OSError, ValueError, IndexError):
+            continue  # Gone in the meantime, or not ours to read
+        table[int(entry)] = (parent, rss, cmdline)
+    return table
+
+def chrome_children(table, parent_pid):
+    """Chrome main processes started by a chromedriver process (renderers and helpers excluded)"""
+    return {pid for pid, (parent, _, cmdline) in table.items() if parent == parent_pid and '--type=' not in cmdline}
+
+def _browser_roots(driver, table):
+    """Process ids of a driver's Chrome main process.
+
+    The factory records them when the session starts (launched_pids); other drivers are
+    found by the profile directory chromedriver reports, which is unique per session.
+    Several browsers under one chromedriver are told apart either way.
+    """
+    launched = [pid for pid in getattr(driver, 'launched_pids', ()) if pid in table]
+    if launched:
+        return launched
+    user_data_dir = ((getattr(driver, 'capabilities', None) or {}).get('chrome') or {}).get('userDataDir')
+    if not user_data_dir:
+        return []
+    return [pid for pid, (_, _, cmdline) in table.items()
+            if f'--user-data-dir={user_data_dir}' in cmdline and '--type=' not in cmdline]
+
+def browser_pids(driver):
+    """Main process ids of a driver's browser (empty when they cannot be found)"""
+    if getattr(driver, 'launched_pids', None):
+        return list(driver.launched_pids)
+    try:
+        return _browser_roots(driver, process_table())
+    except OSError:
+        return []
+
+def browser_memory(driver):
+    """(renderer RSS, whole browser RSS) in bytes for a driver's Chrome, or None when unknown"""
+    try:
+        table = process_table()
+    except OSError:
+        return None
+    roots = _browser_roots(driver, table)
+    if not roots:
+        return None
+
+    children = {}
+    for pid, (parent, _, _) in table.items():
+        children.setdefault(parent, []).append(pid)
+    renderers = total = 0
+    stack = list(roots)
+    while stack:
+        pid = stack.pop()
+        if pid not in table:
+            continue
+        _, rss, cmdline = table[pid]
+        total += rss
+        if '--type=renderer' in cmdline:
+            renderers += rss
+        stack.extend(children.get(pid, ()))
+    return renderers, total
+
+class RecyclePolicy:
+    """Health signals of the current browser session and the thresholds that end it"""
+
+    def __init__(self, max_rss_mb=1500.0, max_latency=20.0, max_failures=6, max_blocks=1, max_shops=250,
+                 latency_window=LATENCY_WINDOW):
+        self.max_rss_mb = max_rss_mb
+        self.max_latency = max_latency
+        self.max_failures = max_failures
+        self.max_blocks = max_blocks
+        self.max_shops = max_shops
+        self.latencies = deque(maxlen=latency_window)
+        self.reset()
+
+        global _memory_off_reported
+        if max_rss_mb and not memory_readable() and not _memory_off_reported:
+            print("⚠️  Memory-based browser recycling is off: install psutil (pip install psutil) to enable it")
+            _memory_off_reported = True
+
+    @classmethod
+    def from_env(cls, **overrides):
+        options = {}
+        for name, (variable, default) in ENVIRONMENT.items():
+            value = os.environ.get(variable)
+            options[name] = type(default)(value) if value not in (None, '') else default
+        options.update(overrides)
+        return cls(**options)
+
+    def reset(self):
+        """A new browser session starts with a clean slate"""
+        self.shops = 0
+        self.consecutive_failures = 0
+        self.blocks = 0
+        self.latencies.clear()
+        self.last_rss = None
+        self.last_renderer_rss = None
+
+    def record(self, seconds, found, blocked=False):
+        """Account one finished lookup"""
+        self.shops += 1
+        self.latencies.append(seconds)
+        self.consecutive_failures = 0 if found else self.consecutive_failures + 1
+        if blocked:
+            self.blocks += 1
+
+    def check(self, driver=None):
+        """(reason, detail) when the session should be recycled, None while it is healthy.
+
+        A threshold of 0 switches its signal off.
+        """
+        if self.max_blocks and self.blocks >= self.max_blocks:
+            return 'blocked', f"{self.blocks} block pages"
+        if self.max_failures and self.consecutive_failures >= self.max_failures:
+            return 'failures', f"{self.consecutive_failures} lookups in a row without favicon"
+        if self.max_latency and len(self.latencies) == self.latencies.maxlen:
+            median = statistics.median(self.latencies)
+            if median > self.max_latency:
+                return 'latency', f"median lookup {median:.1f}s over the last {len(self.latencies)} shops"
+        if self.max_rss_mb and driver is not None:
+            memory = browser_memory(driver)
+            if memory is not None:
+                self.last_renderer_rss, self.last_rss = memory
+                if memory[0] > self.max_rss_mb * 1024 * 1024:
+                    return 'memory', f"renderers use {memory[0] / 1024 / 1024:.0f} MB"
+        if self.max_shops and self.shops >= self.max_shops:
+            return 'shops', f"{self.shops} shops in one session"
+        return None
+
+    def nearing(self, share=0.75):
+        """True once a signal is within `share` of its threshold: time to warm up a standby browser"""
+        if self.max_shops and self.shops >= self.max_shops * share:
+            return True
+        if self.max_failures and self.consecutive_failures >= max(1, int(self.max_failures * share)):
+            return True
+        if self.max_latency and len(self.latencies) * 2 >= self.latencies.maxlen \
+                and statistics.median(self.latencies) > self.max_latency * share:
+            return True
+        return bool(self.max_rss_mb and self.last_renderer_rss
+                    and self.last_renderer_rss > self.max_rss_mb * 1024 * 1024 * share)
+
+    def describe(self):
+        return (f"recycle at {self.max_rss_mb:.0f} MB renderers, {self.max_latency:.0f}s median latency, "
+                f"{self.max_failures} failures in a row, {self.max_blocks} blocks or {self.max_shops} shops")
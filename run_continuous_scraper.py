@@ -1,133 +1,178 @@
 #!/usr/bin/env python3
 """
 Continuous Favicon Scraper
-This script runs the favicon scraper continuously until all shops are processed.
+This script runs the favicon scraper continuously until all shops are processed,
+in batches handled by one long-lived in-process scraper.
+Progress is kept in an append-only job journal, so a killed run can be resumed
+exactly where it stopped with --resume.
 """
 
-import subprocess
+import signal
+import sys
+import threading
 import time
 import os
 
+from status_store import SUCCESS, open_store
+from job_journal import JobJournal, completed_indices, journal_path_for
+from shop_input import count_shops, iter_shops
+from google_favicon_scraper import FaviconScraper, print_summary, generate_favicon_gallery
+from metrics import configure_metrics
+
+# Give up on a shop after the batch starting with it crashed this many times in a row
+MAX_BATCH_RETRIES = 3
+BATCH_SIZE = 50  # Process 50 shops per batch
+
 def count_favicons():
-    """Count the current number of favicon files"""
-    if not os.path.exists('favicons'):
-        return 0
-    
-    favicon_files = [f for f in os.listdir('favicons') if f.endswith(('.png', '.jpg', '.jpeg', '.gif'))]
-    return len(favicon_files)
-
-def count_remaining_shops(csv_file):
-    """Count the number of shops in the CSV file"""
-    try:
-        with open(csv_file, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-            return len(lines) - 1  # Subtract 1 for header
-    except FileNotFoundError:
-        return 0
+    """Count the shops that currently have a favicon (indexed count in the status store)"""
+    return open_store().count(SUCCESS)
 
-def run_continuous_scraper(csv_file='remaining_shops2_fresh.csv', max_iterations=100):
+def next_batch(csv_file, done, start, limit):
+    """The first `limit` shops from row `start` on that the journal does not mark as done"""
+    batch = []
+    for shop in iter_shops(csv_file, start):
+        if shop[0] not in done:
+            batch.append(shop)
+            if len(batch) >= limit:
+                break
+    return batch
+
+def run_continuous_scraper(csv_file='remaining_shops2_fresh.csv', max_iterations=100, resume=False, journal_path=None):
     """Run the favicon scraper continuously until all shops are processed"""
-    
+
+    journal_path = journal_path or journal_path_for(csv_file)
+    if not resume and os.path.exists(journal_path):
+        # Keep the previous journal around instead of silently mixing two jobs
+        backup_path = f"{journal_path}.{int(time.time())}"
+        os.rename(journal_path, backup_path)
+        print(f"📒 Previous journal moved to {backup_path} (use --resume to continue it)")
+
     print(f"🚀 Starting continuous favicon scraper...")
     print(f"📁 Processing file: {csv_file}")
-    
+    print(f"📒 Journal: {journal_path}" + (" (resuming)" if resume else ""))
+
     initial_favicon_count = count_favicons()
-    total_shops = count_remaining_shops(csv_file)
-    
+    total_shops = count_shops(csv_file)
+    done = completed_indices(journal_path)
+
     print(f"📊 Initial state:")
     print(f"   - Existing favicons: {initial_favicon_count}")
     print(f"   - Shops to process: {total_shops}")
+    print(f"   - Already done according to journal: {len(done)}")
     print(f"   - Max iterations: {max_iterations}")
     print()
-    
+
+    journal = JobJournal(journal_path)
+    journal.record('run_start', csv=csv_file, total_shops=total_shops, resume=resume)
+
+    # SIGTERM/SIGINT: let the current shop finish and leave the journal consistent
+    stop_requested = threading.Event()
+
+    def request_stop(signum, frame):
+        print(f"\n🛑 Received signal {signum}, finishing the current shop...")
+        stop_requested.set()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    # One scraper for the whole run: the browser, pacer and store connections stay
+    # alive between batches, and `done` is updated in place as shops finish
+    scraper = FaviconScraper(journal=journal, journal_done=done, stop_event=stop_requested)
+
     iteration = 0
-    start_index = 0
-    
-    while iteration < max_iterations:
-        iteration += 1
-        current_favicon_count = count_favicons()
-        
-        print(f"🔄 Iteration {iteration}/{max_iterations}")
-        print(f"   Current favicons: {current_favicon_count}")
-        print(f"   Starting from index: {start_index}")
-        
-        # Run the scraper for a batch of shops
-        batch_size = 50  # Process 50 shops per batch
-        cmd = [
-            'python', 
-            'google_favicon_scraper.py', 
-            csv_file, 
-            str(start_index), 
-            str(batch_size)
-        ]
-        
-        try:
-            print(f"   Running: {' '.join(cmd)}")
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)  # 10 minute timeout
-            
-            if result.returncode == 0:
-                print(f"   ✅ Batch completed successfully")
-                
-                # Check if we downloaded any new favicons
-                new_favicon_count = count_favicons()
-                new_favicons = new_favicon_count - current_favicon_count
-                
+    cursor = 0  # Every row before this one is done, the next batch is searched from here
+    retries = {}  # first index of a batch -> consecutive crashed batches starting there
+
+    try:
+        while iteration < max_iterations and not stop_requested.is_set():
+            batch = next_batch(csv_file, done, cursor, BATCH_SIZE)
+            if not batch:
+                print(f"🎉 All shops processed! Final favicon count: {count_favicons()}")
+                break
+
+            start_index, start_shop_id, _ = batch[0]
+            # A shop that keeps crashing its batch is set aside so the run can move on; --resume tries it again
+            if retries.get(start_index, 0) >= MAX_BATCH_RETRIES:
+                print(f"   ⚠️  Giving up on shop at index {start_index} after {MAX_BATCH_RETRIES} failed batches")
+                scraper.record_journal(start_index, start_shop_id, 'retry', error='batch retries exhausted')
+                continue
+
+            iteration += 1
+            current_favicon_count = count_favicons()
+
+            print(f"🔄 Iteration {iteration}/{max_iterations}")
+            print(f"   Current favicons: {current_favicon_count}")
+            print(f"   Starting from index: {start_index}")
+
+            batch_ok = False
+            try:
+                print_summary(scraper.run(batch, total_shops))
+                batch_ok = True
+
+                if stop_requested.is_set():
+                    print(f"   🛑 Batch interrupted by shutdown")
+                else:
+                    print(f"   ✅ Batch completed successfully")
+
+                new_favicons = count_favicons() - current_favicon_count
                 if new_favicons > 0:
                     print(f"   📥 Downloaded {new_favicons} new favicons")
                 else:
                     print(f"   ⏭️  No new favicons (likely all shops in batch already processed)")
-                
-                # Move to next batch
-                start_index += batch_size
-                
-                # Check if we've processed all shops
-                if start_index >= total_shops:
-                    print(f"🎉 All shops processed! Final favicon count: {new_favicon_count}")
-                    break
-                    
+
+            except Exception as e:
+                print(f"   💥 Batch crashed: {e}")
+                scraper.quit_driver()  # Start the next batch with a fresh browser
+
+            journal.record('batch', start_index=start_index, batch_size=len(batch), ok=batch_ok)
+
+            # Shops the batch did not finish are picked up again by the next iteration
+            unfinished = [shop[0] for shop in batch if shop[0] not in done]
+            cursor = unfinished[0] if unfinished else batch[-1][0] + 1
+            if batch_ok or start_index in done:
+                retries.pop(start_index, None)
             else:
-                print(f"   ❌ Batch failed with return code: {result.returncode}")
-                print(f"   Error output: {result.stderr}")
-                
-                # Try to continue with next batch anyway
-                start_index += batch_size
-                
-        except subprocess.TimeoutExpired:
-            print(f"   ⏰ Batch timed out after 10 minutes")
-            start_index += batch_size
-            
-        except Exception as e:
-            print(f"   💥 Unexpected error: {e}")
-            start_index += batch_size
-        
-        # Add a delay between batches to avoid overwhelming Google
-        print(f"   😴 Waiting 30 seconds before next batch...")
-        time.sleep(30)
-        print()
-    
+                retries[start_index] = retries.get(start_index, 0) + 1
+            print()
+
+    finally:
+        scraper.close()
+        journal.record('run_stop', reason='signal' if stop_requested.is_set() else 'finished', iterations=iteration)
+        journal.close()
+        # The gallery is rebuilt once per run, not after every batch
+        generate_favicon_gallery()
+
     final_favicon_count = count_favicons()
     total_downloaded = final_favicon_count - initial_favicon_count
-    
+
     print(f"🏁 Scraping session completed!")
     print(f"   Total iterations: {iteration}")
     print(f"   Initial favicons: {initial_favicon_count}")
     print(f"   Final favicons: {final_favicon_count}")
     print(f"   New favicons downloaded: {total_downloaded}")
-    
-    if iteration >= max_iterations:
+
+    if stop_requested.is_set():
+        print(f"   🛑 Stopped by signal, continue with --resume")
+    elif iteration >= max_iterations:
         print(f"   ⚠️  Stopped due to max iterations limit")
-    
+
     return total_downloaded
 
 if __name__ == "__main__":
-    import sys
-    
-    csv_file = 'remaining_shops2_fresh.csv'
-    max_iterations = 100
-    
-    if len(sys.argv) > 1:
-        csv_file = sys.argv[1]
-    if len(sys.argv) > 2:
-        max_iterations = int(sys.argv[2])
-    
-    run_continuous_scraper(csv_file, max_iterations) 
\ No newline at end of file
+    import argparse
+
+    # Stream progress line by line, also when the output goes to a log file
+    sys.stdout.reconfigure(line_buffering=True)
+
+    parser = argparse.ArgumentParser(description="Run the favicon scraper in batches until all shops are processed")
+    parser.add_argument('csv_file', nargs='?', default='remaining_shops2_fresh.csv')
+    parser.add_argument('max_iterations', nargs='?', type=int, default=100)
+    parser.add_argument('--resume', action='store_true', help="Continue the job recorded in the journal instead of starting over")
+    parser.add_argument('--journal', help="Journal file (default: <csv_file>.journal)")
+    parser.add_argument('--metrics-jsonl', help="Append one JSON line per lookup and per finished shop to this file")
+    parser.add_argument('--metrics-file', help="Keep Prometheus text metrics up to date in this file (e.g. metrics.prom)")
+    parser.add_argument('--metrics-port', type=int, help="Serve Prometheus metrics on http://localhost:PORT/metrics")
+    args = parser.parse_args()
+
+    configure_metrics(args.metrics_jsonl, args.metrics_file, args.metrics_port)
+    run_continuous_scraper(args.csv_file, args.max_iterations, resume=args.resume, journal_path=args.journal)
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+SERP Favicon Extraction
+Pulls everything the favicon approaches need out of a Google results page in a
+single execute_script round trip, then matches the shop domain in Python using
+the same priority order as the original approaches:
+
+  1   cite containing the domain -> images in its result container
+  2   XNo5Ab favicon images -> cites in their result container
+  2.5 q0vns result divs -> cite + XNo5Ab favicon
+  2.6 DDKf1c favicon spans -> cites up to 5 levels up (base64 only)
+  3   cite containing the domain -> images in its parent or grandparent
+"""
+
+# Collects, in one pass over the DOM, the cites, favicon images and result
+# containers. Image sources are de-duplicated into `srcs` and referenced by
+# index to keep the payload small (most of them are base64 data URIs).
+EXTRACT_SCRIPT = r"""
+const srcs = [];
+const srcIndex = new Map();
+function srcId(img) {
+    const src = img && img.src;
+    if (!src) return null;
+    if (!srcIndex.has(src)) { srcIndex.set(src, srcs.length); srcs.push(src); }
+    return srcIndex.get(src);
+}
+function imgIds(root) {
+    const ids = [];
+    if (!root) return ids;
+    for (const img of root.getElementsByTagName('img')) {
+        const id = srcId(img);
+        if (id !== null) ids.push(id);
+    }
+    return ids;
+}
+function citeTexts(root) {
+    return root ? Array.from(root.getElementsByTagName('cite'), c => c.innerText || '') : [];
+}
+function isContainer(el) {
+    if (el.tagName !== 'DIV') return false;
+    const cls = el.getAttribute('class') || '';
+    return cls.indexOf('yuRUbf') !== -1 || cls.indexOf('g') !== -1 || cls.indexOf('MjjYud') !== -1;
+}
+// The outermost matching ancestor: find_element on ./ancestor::div[...] returns the first in document order
+function container(el) {
+    let found = null;
+    for (let node = el.parentElement; node; node = node.parentElement) {
+        if (isContainer(node)) found = node;
+    }
+    return found;
+}
+function ownText(el) {
+    for (const node of el.childNodes) {
+        if (node.nodeType === Node.TEXT_NODE) return node.nodeValue;
+    }
+    return '';
+}
+
+const cites = Array.from(document.getElementsByTagName('cite'), cite => {
+    const parent = cite.parentElement;
+    let nearby = imgIds(parent);
+    if (!nearby.length && parent) nearby = imgIds(parent.parentElement);
+    return {text: cite.innerText || '', own_text: ownText(cite), container_imgs: imgIds(container(cite)), nearby_imgs: nearby};
+});
+
+const xno5ab = Array.from(document.querySelectorAll('img[class*="XNo5Ab"]'), img => (
+    {src: srcId(img), container_cites: citeTexts(container(img))}
+));
+
+const q0vns = Array.from(document.querySelectorAll('div[class="q0vns"]'), div => {
+    const cite = div.getElementsByTagName('cite')[0];
+    return {cite: cite ? (cite.innerText || '') : null, favicon: srcId(div.getElementsByClassName('XNo5Ab')[0])};
+});
+
+const ddkf1c = Array.from(document.getElementsByClassName('DDKf1c'), span => {
+    const favicon = span.getElementsByClassName('XNo5Ab')[0];
+    const levels = [];
+    let node = span;
+    for (let i = 0; favicon && i < 5 && node.parentElement; i++) {
+        node = node.parentElement;
+        levels.push(citeTexts(node));
+    }
+    return {favicon: favicon ? srcId(favicon) : null, levels: levels};
+});
+
+return {srcs: srcs, cites: cites, xno5ab: xno5ab, q0vns: q0vns, ddkf1c: ddkf1c};
+"""
+
+def cite_matches_domain(cite_text, shop_domain):
+    """Flexible cite/domain matching used by approach 2.5 (www. prefix, path suffixes, other TLDs)"""
+    cite_text = cite_text.lower()
+    domain_lower = shop_domain.lower()
+    domain_without_www = domain_lower.replace('www.', '')
+    domain_name_only = domain_lower.split('.')[0]
+
+    matches = [
+        domain_lower in cite_text,
+        domain_without_www in cite_text,
+        f".{domain_lower}" in cite_text,  # with leading dot
+        f".{domain_without_www}" in cite_text,
+        domain_name_only in cite_text and '.' in cite_text,  # domain name with any TLD
+        cite_text.startswith(f"https://{domain_lower}"),
+        cite_text.startswith(f"https://www.{domain_without_www}"),
+        cite_text.startswith(f"www.{domain_lower}"),
+        cite_text.startswith(domain_lower)
+    ]
+    return any(matches)
+
+def find_favicon_candidates(page_data, shop_domain):
+    """Return ordered (approach, img_src, base64_only) candidates for a shop.
+
+    page_data is the dict produced by EXTRACT_SCRIPT (or the offline parser).
+    """
+    srcs = page_data.get('srcs', [])
+    domain_name_only = shop_domain.split('.')[0].lower()
+    candidates = []
+
+    def add(approach, src_ids, base64_only=False):
+        for src_id in src_ids:
+            if src_id is not None:
+                candidates.append((approach, srcs[src_id], base64_only))
+
+    # APPROACH 1: cites containing the domain name, images in their result container
+    for cite in page_data.get('cites', []):
+        if domain_name_only in cite['own_text'].lower():
+            add('1', cite['container_imgs'])
+
+    # APPROACH 2: XNo5Ab favicons whose result container cites our domain
+    for img in page_data.get('xno5ab', []):
+        for cite_text in img['container_cites']:
+            if domain_name_only in cite_text.lower():
+                add('2', [img['src']])
+
+    # APPROACH 2.5: q0vns result divs with a matching cite
+    for div in page_data.get('q0vns', []):
+        if div['cite'] is not None and cite_matches_domain(div['cite'], shop_domain):
+            add('2.5', [div['favicon']])
+
+    # APPROACH 2.6: DDKf1c favicon spans with a matching cite up to 5 levels up
+    for span in page_data.get('ddkf1c', []):
+        for level in span['levels']:
+            if any(domain_name_only in cite_text.lower() for cite_text in level):
+                add('2.6', [span['favicon']], base64_only=True)
+
+    # APPROACH 3: any image next to a cite containing the domain name
+    for cite in page_data.get('cites', []):
+        if domain_name_only in cite['text'].lower():
+            add('3', cite['nearby_imgs'])
+
+    return candidates
+
+def extract_page_data(driver):
+    """Run the extraction script in the current page: one WebDriver round trip"""
+    return driver.execute_script(EXTRACT_SCRIPT)
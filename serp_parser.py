@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Offline SERP Parser
+Builds the same page_data as serp_extraction.EXTRACT_SCRIPT from raw HTML
+(driver.page_source or a saved debug_*.html file), so favicon candidates can be
+extracted without a live browser. Running it as a script re-extracts a whole
+corpus of saved SERPs in parallel.
+"""
+
+import base64
+import binascii
+import glob
+import os
+import re
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+from blob_store import PlaceholderIcon, content_sha256, open_blob_store
+from favicon_ingest import InvalidImage, ingest_favicon
+from serp_extraction import find_favicon_candidates
+
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'param', 'source', 'track', 'wbr'}
+# Text inside these never shows up in innerText
+HIDDEN_TAGS = {'script', 'style', 'noscript', 'template'}
+
+class Node:
+    """Minimal element node: tag, attributes, parent and mixed children (Nodes and strings)"""
+    __slots__ = ('tag', 'attrs', 'parent', 'children')
+
+    def __init__(self, tag, attrs=None, parent=None):
+        self.tag = tag
+        self.attrs = attrs or {}
+        self.parent = parent
+        self.children = []
+
+    @property
+    def classes(self):
+        return self.attrs.get('class', '').split()
+
+    def iter_elements(self):
+        """Yield all descendant elements in document order"""
+        stack = [child for child in reversed(self.children) if isinstance(child, Node)]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(child for child in reversed(node.children) if isinstance(child, Node))
+
+    def by_tag(self, tag):
+        return [node for node in self.iter_elements() if node.tag == tag]
+
+    def by_class(self, class_name):
+        return [node for node in self.iter_elements() if class_name in node.classes]
+
+    def text(self):
+        """Approximation of innerText: all visible text, whitespace collapsed"""
+        parts = []
+        stack = [self]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, str):
+                parts.append(item)
+            elif item.tag not in HIDDEN_TAGS:
+                stack.extend(reversed(item.children))
+        return ' '.join(''.join(parts).split())
+
+    def own_text(self):
+        """The first direct text node, like XPath text() in a string context"""
+        for child in self.children:
+            if isinstance(child, str):
+                return child
+        return ''
+
+class TreeBuilder(HTMLParser):
+    """Turn an HTML document into a tree of Nodes, tolerating unclosed tags"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = Node('#document')
+        self.stack = [self.root]
+
+    def handle_starttag(self, tag, attrs):
+        node = Node(tag, {k: (v or '') for k, v in attrs}, self.stack[-1])
+        self.stack[-1].children.append(node)
+        if tag not in VOID_TAGS:
+            self.stack.append(node)
+
+    def handle_startendtag(self, tag, attrs):
+        node = Node(tag, {k: (v or '') for k, v in attrs}, self.stack[-1])
+        self.stack[-1].children.append(node)
+
+    def handle_endtag(self, tag):
+        # Close up to the matching open tag; stray end tags are ignored
+        for depth in range(len(self.stack) - 1, 0, -1):
+            if self.stack[depth].tag == tag:
+                del self.stack[depth:]
+                return
+
+    def handle_data(self, data):
+        self.stack[-1].children.append(data)
+
+def parse_html(html):
+    """Parse a document and return its root Node"""
+    builder = TreeBuilder()
+    builder.feed(html)
+    builder.close()
+    return builder.root
+
+def is_container(node):
+    """Same predicate as the ancestor::div XPath of approaches 1 and 2"""
+    if node.tag != 'div':
+        return False
+    cls = node.attrs.get('class', '')
+    return 'yuRUbf' in cls or 'g' in cls or 'MjjYud' in cls
+
+def find_container(node):
+    """Outermost container ancestor, the one the XPath's find_element returned (document order)"""
+    found = None
+    parent = node.parent
+    while parent is not None:
+        if is_container(parent):
+            found = parent
+        parent = parent.parent
+    return found
+
+def parse_page_data(html, base_url='https://www.google.com/'):
+    """Produce the page_data dict of EXTRACT_SCRIPT from raw HTML"""
+    root = parse_html(html)
+    srcs = []
+    src_index = {}
+
+    def src_id(img):
+        src = img.attrs.get('src') if img is not None else None
+        if not src:
+            return None
+        if not src.startswith('data:'):
+            src = urljoin(base_url, src)  # img.src is always absolute in the browser
+        if src not in src_index:
+            src_index[src] = len(srcs)
+            srcs.append(src)
+        return src_index[src]
+
+    def img_ids(node):
+        if node is None:
+            return []
+        return [i for i in (src_id(img) for img in node.by_tag('img')) if i is not None]
+
+    def cite_texts(node):
+        return [cite.text() for cite in node.by_tag('cite')] if node is not None else []
+
+    cites = []
+    for cite in root.by_tag('cite'):
+        parent = cite.parent
+        nearby = img_ids(parent)
+        if not nearby and parent is not None:
+            nearby = img_ids(parent.parent)
+        cites.append({'text': cite.text(), 'own_text': cite.own_text(),
+                      'container_imgs': img_ids(find_container(cite)), 'nearby_imgs': nearby})
+
+    xno5ab = [{'src': src_id(img), 'container_cites': cite_texts(find_container(img))}
+              for img in root.by_tag('img') if 'XNo5Ab' in img.attrs.get('class', '')]
+
+    q0vns = []
+    for div in root.by_tag('div'):
+        if div.attrs.get('class') != 'q0vns':
+            continue
+        div_cites = div.by_tag('cite')
+        favicons = div.by_class('XNo5Ab')
+        q0vns.append({'cite': div_cites[0].text() if div_cites else None,
+                      'favicon': src_id(favicons[0]) if favicons else None})
+
+    ddkf1c = []
+    for span in root.by_class('DDKf1c'):
+        favicons = span.by_class('XNo5Ab')
+        levels = []
+        node = span
+        for _ in range(5):
+            if not favicons or node.parent is None or node.parent is root:
+                break
+            node = node.parent
+            levels.append(cite_texts(node))
+        ddkf1c.append({'favicon': src_id(favicons[0]) if favicons else None, 'levels': levels})
+
+    return {'srcs': srcs, 'cites': cites, 'xno5ab': xno5ab, 'q0vns': q0vns, 'ddkf1c': ddkf1c}
+
+def extract_candidates_from_html(html, shop_domain):
+    """Favicon candidates for a shop from raw SERP HTML, same order as the live extraction"""
+    return find_favicon_candidates(parse_page_data(html), shop_domain)
+
+def load_shop_domains(csv_path):
+    """Map shop ID -> domain from a semicolon separated shop CSV"""
+    import csv
+
+    domains = {}
+    with open(csv_path, 'r', encoding='utf-8') as f:
+        csv_reader = csv.reader(f, delimiter=';')
+        next(csv_reader, None)  # Skip header row
+        for row in csv_reader:
+            if len(row) >= 2:
+                domains[row[0]] = row[1]
+    return domains
+
+def reextract_file(args):
+    """Worker: re-extract one saved SERP, returns (path, shop_id, domain, candidates or error)"""
+    path, shop_id, shop_domain, save_dir = args
+    try:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            candidates = extract_candidates_from_html(f.read(), shop_domain)
+    except Exception as e:
+        return path, shop_id, shop_domain, f"error: {e}"
+
+    if save_dir:
+        # Only inline base64 favicons can be saved without touching the network
+        filename = os.path.join(save_dir, f"{shop_id}_{shop_domain.replace('.', '_')}.png")
+        for _, img_src, _ in candidates:
+            if 'base64,' in img_src and save_data_uri(img_src, filename):
+                break
+    return path, shop_id, shop_domain, candidates
+
+def save_data_uri(img_src, filename):
+    """Decode, validate and store a base64 favicon as canonical PNG, returns False when it is unusable"""
+    try:
+        favicon = ingest_favicon(base64.b64decode(img_src.split('base64,', 1)[1]))
+        blobs = open_blob_store()
+        if blobs.is_placeholder(content_sha256(favicon.original)):
+            return False
+        blobs.store_file(favicon.canonical, filename)
+        return True
+    except (binascii.Error, ValueError, InvalidImage, PlaceholderIcon, OSError):
+        return False
+
+def reextract_corpus(pattern='debug_*.html', csv_path=None, save_dir=None, processes=None):
+    """Re-extract favicon candidates for every saved SERP matching pattern, in parallel"""
+    from concurrent.futures import ProcessPoolExecutor
+
+    domains = load_shop_domains(csv_path) if csv_path else {}
+    jobs = []
+    for path in sorted(glob.glob(pattern)):
+        match = re.match(r'^debug_([^_]+)_(.+)\.html$', os.path.basename(path))
+        if not match:
+            print(f"  Skipping {path}: not a debug_<shopid>_<domain>.html file")
+            continue
+        shop_id = match.group(1)
+        # Without the CSV the best guess is the filename with '_' turned back into '.'
+        shop_domain = domains.get(shop_id, match.group(2).replace('_', '.'))
+        jobs.append((path, shop_id, shop_domain, save_dir))
+
+    if save_dir:
+        os.makedirs(save_dir, exist_ok=True)
+
+    print(f"Re-extracting {len(jobs)} saved SERPs...")
+    found = 0
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        for path, shop_id, shop_domain, candidates in executor.map(reextract_file, jobs, chunksize=16):
+            if isinstance(candidates, str):
+                print(f"  💥 {path}: {candidates}")
+            elif candidates:
+                found += 1
+                approach, img_src, _ = candidates[0]
+                print(f"  ✅ {shop_id} {shop_domain}: approach {approach}, {len(candidates)} candidates ({img_src[:50]}...)")
+            else:
+                print(f"  ❌ {shop_id} {shop_domain}: no favicon candidates")
+
+    print(f"\nFound candidates for {found}/{len(jobs)} saved SERPs")
+    return found
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Re-extract favicons from saved Google result pages")
+    parser.add_argument('pattern', nargs='?', default='debug_*.html', help="Glob of saved SERP files")
+    parser.add_argument('--csv', help="Shop CSV to look up the real domain for each shop ID")
+    parser.add_argument('--save-dir', help="Write the best valid base64 favicon per shop into this directory (as canonical PNG)")
+    parser.add_argument('--processes', type=int, default=None, help="Number of parser processes (default: CPU count)")
+    args = parser.parse_args()
+
+    reextract_corpus(args.pattern, args.csv, args.save_dir, args.processes)
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Shop Input
+Streaming reader for the semicolon separated shop CSVs ('Shop ID;Shop').
+Rows are read in constant memory from plain files, .gz files or stdin ('-').
+For plain files a sidecar index ({csv}.idx) with the byte offset of every
+INDEX_STRIDE-th row is built once, so a batch starting at row N seeks close to
+it instead of reading the whole file again. Rows are numbered from 0 after the
+header, the same numbering the journal and the start_index argument use; every
+row is expected on its own line (shop CSVs have no quoted newlines).
+"""
+
+import csv
+import gzip
+import io
+import os
+import struct
+import sys
+from array import array
+
+INDEX_MAGIC = b'SHOPIDX1'
+INDEX_STRIDE = 1024
+# magic, source size, source mtime (ns), stride, row count
+INDEX_HEADER = struct.Struct('<8sQQQQ')
+
+def is_seekable_input(path):
+    return path != '-' and not path.endswith('.gz')
+
+def open_binary(path):
+    """Binary stream for a plain file, a .gz file or stdin ('-')"""
+    if path == '-':
+        return sys.stdin.buffer
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+def index_path_for(path):
+    return f"{path}.idx"
+
+def build_index(path):
+    """Scan the file once and record the offset of every INDEX_STRIDE-th data row"""
+    offsets = array('Q')
+    rows = 0
+    with open(path, 'rb') as f:
+        offset = len(f.readline())  # Header row
+        for line in f:
+            if rows % INDEX_STRIDE == 0:
+                offsets.append(offset)
+            offset += len(line)
+            rows += 1
+
+    stat = os.stat(path)
+    header = INDEX_HEADER.pack(INDEX_MAGIC, stat.st_size, stat.st_mtime_ns, INDEX_STRIDE, rows)
+    try:
+        with open(index_path_for(path), 'wb') as f:
+            f.write(header)
+            offsets.tofile(f)
+    except OSError as e:
+        print(f"  Could not write row index {index_path_for(path)}: {e}")
+    return rows, offsets
+
+def load_index(path):
+    """(row count, offsets) from the sidecar index, rebuilt when missing or stale"""
+    stat = os.stat(path)
+    try:
+        with open(index_path_for(path), 'rb') as f:
+            magic, size, mtime_ns, stride, rows = INDEX_HEADER.unpack(f.read(INDEX_HEADER.size))
+            if (magic, size, mtime_ns, stride) == (INDEX_MAGIC, stat.st_size, stat.st_mtime_ns, INDEX_STRIDE):
+                offsets = array('Q')
+                offsets.frombytes(f.read())
+                return rows, offsets
+    except (OSError, struct.error):
+        pass
+    print(f"Building row index for {path}...")
+    return build_index(path)
+
+def count_shops(path):
+    """Number of data rows; None for stdin, which can only be read once"""
+    if path == '-':
+        return None
+    if is_seekable_input(path):
+        return load_index(path)[0]
+    with open_binary(path) as f:
+        return max(0, sum(1 for _ in f) - 1)
+
+def iter_shops(path, start=0, stop=None):
+    """Yield (index, shop_id, shop_domain) for data rows start <= index < stop"""
+    if is_seekable_input(path):
+        raw = open(path, 'rb')
+        _, offsets = load_index(path)
+        block = start // INDEX_STRIDE
+        if block < len(offsets):
+            raw.seek(offsets[block])
+            index = block * INDEX_STRIDE
+        else:
+            raw.seek(0, os.SEEK_END)  # Past the last row
+            index = start
+    else:
+        raw = open_binary(path)
+        raw.readline()  # Header row
+        index = 0
+
+    text = io.TextIOWrapper(raw, encoding='utf-8', newline='')
+    try:
+        for row in csv.reader(text, delimiter=';'):
+            if stop is not None and index >= stop:
+                break
+            if index >= start and len(row) >= 2:
+                yield index, row[0], row[1]
+            index += 1
+    finally:
+        if path == '-':
+            text.detach()  # Leave stdin itself open
+        else:
+            text.close()
+
+def iter_batches(path, batch_size, start=0, stop=None):
+    """Yield lists of at most batch_size shops, reading the input lazily"""
+    batch = []
+    for shop in iter_shops(path, start, stop):
+        batch.append(shop)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build the row index of a shop CSV and show a slice of it")
+    parser.add_argument('csv_file', help="Shop CSV (.csv, .csv.gz or - for stdin)")
+    parser.add_argument('start', nargs='?', type=int, default=0)
+    parser.add_argument('count', nargs='?', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{args.csv_file}: {count_shops(args.csv_file)} shops")
+    for index, shop_id, shop_domain in iter_shops(args.csv_file, args.start, args.start + args.count):
+        print(f"  {index}: {shop_id};{shop_domain}")
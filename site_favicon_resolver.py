@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Direct-from-site Favicon Resolver
+Fetches a shop's own homepage over plain HTTP and resolves its favicon from
+<link rel="icon">, apple-touch-icon and manifest.json icons, falling back to
+/favicon.ico. Used as a first pass before the Selenium/Google search path.
+"""
+
+import asyncio
+import json
+import re
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlparse
+
+import favicon_ingest
+from favicon_ingest import InvalidImage, ingest_favicon
+
+# Timeouts (connect, read) for every request made by the resolver
+REQUEST_TIMEOUT = (3, 5)
+# Refuse icons larger than this, real favicons are a few KB
+MAX_ICON_BYTES = 512 * 1024
+# Only look at the start of the homepage, <head> is always near the top
+MAX_HTML_BYTES = 256 * 1024
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept-Language': 'nl-NL,nl;q=0.9,en-US;q=0.8,en;q=0.7',
+}
+
+# Preference order of the rel values we understand (lower is better)
+REL_PRIORITY = {
+    'icon': 0,
+    'shortcut icon': 0,
+    'apple-touch-icon': 1,
+    'apple-touch-icon-precomposed': 1,
+}
+
+class FaviconLinkParser(HTMLParser):
+    """Collect icon links, the manifest link and <base href> from a page"""
+
+    def __init__(self):
+        super().__init__()
+        self.icons = []  # list of (priority, href, sizes)
+        self.manifest = None
+        self.base_href = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = {k.lower(): (v or '') for k, v in attrs}
+        if tag == 'base' and attrs.get('href') and not self.base_href:
+            self.base_href = attrs['href']
+            return
+        if tag != 'link' or not attrs.get('href'):
+            return
+
+        rel = ' '.join(attrs.get('rel', '').lower().split())
+        if rel == 'manifest':
+            if not self.manifest:
+                self.manifest = attrs['href']
+        elif rel in REL_PRIORITY:
+            self.icons.append((REL_PRIORITY[rel], attrs['href'], attrs.get('sizes', '')))
+
+def parse_icon_size(sizes):
+    """Return the largest edge from a sizes attribute like '16x16 32x32' (0 if unknown)"""
+    best = 0
+    for match in re.finditer(r'(\d+)x(\d+)', sizes or '', re.IGNORECASE):
+        best = max(best, int(match.group(1)))
+    return best
+
+def looks_like_image(content, content_type):
+    """Basic check that a response body is an image and not an HTML error page"""
+    if not content:
+        return False
+    content_type = (content_type or '').lower()
+    if content_type.startswith('image/'):
+        return True
+    head = content[:256].lstrip().lower()
+    if head.startswith((b'<!doctype html', b'<html')):
+        return False
+    # Servers often send favicon.ico as application/octet-stream or text/plain
+    return head.startswith((b'\x89png', b'gif8', b'\xff\xd8', b'\x00\x00\x01\x00', b'riff', b'<svg', b'<?xml'))
+
+def icon_candidates_from_html(page_url, html):
+    """Return (ordered icon URLs, manifest URL or None) declared by a homepage"""
+    parser = FaviconLinkParser()
+    try:
+        parser.feed(html)
+    except Exception:
+        pass
+    base_url = urljoin(page_url, parser.base_href) if parser.base_href else page_url
+
+    # <link rel=icon> first, then apple-touch-icon; bigger declared sizes first within a rel
+    icons = [urljoin(base_url, href) for _, href, _ in sorted(parser.icons, key=lambda icon: (icon[0], -parse_icon_size(icon[2])))]
+    manifest_url = urljoin(base_url, parser.manifest) if parser.manifest else None
+    return icons, manifest_url
+
+def icons_from_manifest(manifest_url, content):
+    """Return manifest icon URLs, largest first"""
+    try:
+        manifest = json.loads(content[:MAX_HTML_BYTES].decode('utf-8', errors='replace'))
+    except ValueError:
+        return []
+
+    icons = []
+    for icon in manifest.get('icons', []) if isinstance(manifest, dict) else []:
+        if isinstance(icon, dict) and isinstance(icon.get('src'), str):
+            icons.append((urljoin(manifest_url, icon['src']), parse_icon_size(icon.get('sizes'))))
+    return [href for href, _ in sorted(icons, key=lambda icon: -icon[1])]
+
+def unique_fetchable(urls):
+    """Drop duplicates, inline data URIs we cannot fetch and SVGs we cannot render, keeping order"""
+    seen = set()
+    unique = []
+    for url in urls:
+        if favicon_ingest.cairosvg is None and urlparse(url).path.lower().endswith('.svg'):
+            continue  # Without cairosvg it could only be rejected after downloading it
+        if url not in seen and url.startswith(('http://', 'https://')):
+            seen.add(url)
+            unique.append(url)
+    return unique
+
+def charset_from_headers(headers, default='utf-8'):
+    """Pick the charset out of a Content-Type header"""
+    match = re.search(r'charset=([\w-]+)', headers.get('Content-Type', ''), re.IGNORECASE)
+    return match.group(1) if match else default
+
+def decodes_as_favicon(content, domain):
+    """Default check of a downloaded candidate: it decodes and passes favicon_ingest's checks"""
+    try:
+        ingest_favicon(content)
+        return True
+    except InvalidImage as e:
+        print(f"  Skipping site icon of {domain}: {e}")
+        return False
+
+async def resolve_site_favicon_async(engine, domain, schemes=('https', 'http'), accept=decodes_as_favicon):
+    """Resolve a favicon straight from the shop's website on a shared FetchEngine.
+
+    Candidates are tried in order until accept(content, domain) takes one, so an icon that
+    does not decode (or is a placeholder) falls through to the next link, the manifest
+    icons and /favicon.ico. Returns (image_bytes, icon_url) or (None, None).
+    """
+    page = None
+    for scheme in schemes:
+        result = await engine.fetch(f"{scheme}://{domain}/", max_bytes=MAX_HTML_BYTES, truncate=True)
+        if result.ok:
+            page = result
+            break
+
+    if page is None:
+        candidates = [f"{schemes[0]}://{domain}/favicon.ico"]
+    else:
+        html = page.content.decode(charset_from_headers(page.headers), errors='replace')
+        candidates, manifest_url = icon_candidates_from_html(page.final_url, html)
+        if manifest_url:
+            manifest = await engine.fetch(manifest_url, max_bytes=MAX_HTML_BYTES)
+            if manifest.ok:
+                candidates += icons_from_manifest(manifest_url, manifest.content)
+        candidates.append(urljoin(page.final_url, '/favicon.ico'))
+        candidates = unique_fetchable(candidates)
+
+    for icon_url in candidates:
+        result = await engine.fetch(icon_url, max_bytes=MAX_ICON_BYTES)
+        if result.ok and looks_like_image(result.content, result.headers.get('Content-Type')) \
+                and accept(result.content, domain):
+            return result.content, icon_url
+    return None, None
+
+def resolve_site_favicons(domains, schemes=('https', 'http'), accept=decodes_as_favicon, **engine_options):
+    """Resolve many domains concurrently through the async fetch engine.
+
+    Returns {domain: (image_bytes, icon_url)}, with (None, None) for misses.
+    """
+    from fetch_engine import FetchEngine
+
+    domains = list(dict.fromkeys(domains))
+    engine_options.setdefault('connect_timeout', REQUEST_TIMEOUT[0])
+    engine_options.setdefault('read_timeout', REQUEST_TIMEOUT[1])
+    engine_options.setdefault('max_retries', 1)
+
+    async def resolve_one(engine, domain):
+        try:
+            return await resolve_site_favicon_async(engine, domain, schemes, accept)
+        except Exception as e:
+            print(f"  Site lookup failed for {domain}: {e}")
+            return None, None
+
+    async def run():
+        async with FetchEngine(**engine_options) as engine:
+            results = await asyncio.gather(*(resolve_one(engine, domain) for domain in domains))
+        return dict(zip(domains, results))
+
+    return asyncio.run(run())
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        print("Usage: python site_favicon_resolver.py DOMAIN [DOMAIN ...]")
+        sys.exit(1)
+
+    for domain, (content, icon_url) in resolve_site_favicons(sys.argv[1:]).items():
+        if content:
+            print(f"✅ {domain}: {icon_url} ({len(content)} bytes)")
+        else:
+            print(f"❌ {domain}: no favicon found on site")
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Shop Status Store
+SQLite-backed record of every shop's favicon state, keyed by shop ID:
+status (pending/success/failed/not_correct), file path, content hash, attempt
+count, last error and timestamps. Replaces listing and stat-ing the favicons/
+directory, which takes seconds once it holds hundreds of thousands of files.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+STATUS_DB = os.environ.get('FAVICON_STATUS_DB', 'shop_status.db')
+FAVICON_DIR = 'favicons'
+NOT_CORRECT_DIR = os.path.join(FAVICON_DIR, 'not_correct')
+FAVICON_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif')
+
+PENDING = 'pending'
+SUCCESS = 'success'
+FAILED = 'failed'
+NOT_CORRECT = 'not_correct'
+STATUSES = (PENDING, SUCCESS, FAILED, NOT_CORRECT)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS shops (
+    shop_id      TEXT PRIMARY KEY,
+    domain       TEXT,
+    status       TEXT NOT NULL DEFAULT 'pending',
+    file_path    TEXT,
+    content_hash TEXT,
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    last_error   TEXT,
+    created_at   REAL NOT NULL,
+    updated_at   REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_shops_status ON shops(status);
+"""
+
+def file_sha256(path):
+    """SHA-256 of a file's content"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def shop_id_from_filename(filename):
+    """Extract the shop ID from a favicon filename (format: ShopID_domain_name.extension)"""
+    return filename.split('_', 1)[0]
+
+class ShopStatusStore:
+    """Indexed per-shop favicon status.
+
+    Safe to share between threads and to use from forked worker processes:
+    every thread/process lazily opens its own connection.
+    """
+
+    def __init__(self, path=STATUS_DB):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            conn.close()
+        self._local.conn = None
+
+    # ----- reads -----
+
+    def get(self, shop_id):
+        """Full record for a shop as a dict, or None"""
+        row = self._connection().execute('SELECT * FROM shops WHERE shop_id = ?', (str(shop_id),)).fetchone()
+        return dict(row) if row else None
+
+    def status(self, shop_id):
+        row = self._connection().execute('SELECT status FROM shops WHERE shop_id = ?', (str(shop_id),)).fetchone()
+        return row['status'] if row else None
+
+    def has_favicon(self, shop_id):
+        return self.status(shop_id) == SUCCESS
+
+    def shop_ids_with_status(self, *statuses):
+        """Set of shop IDs currently in any of the given statuses"""
+        placeholders = ','.join('?' * len(statuses))
+        rows = self._connection().execute(f'SELECT shop_id FROM shops WHERE status IN ({placeholders})', statuses)
+        return {row['shop_id'] for row in rows}
+
+    def records_with_status(self, *statuses):
+        placeholders = ','.join('?' * len(statuses))
+        rows = self._connection().execute(
+            f'SELECT * FROM shops WHERE status IN ({placeholders}) ORDER BY shop_id', statuses)
+        return [dict(row) for row in rows]
+
+    def records_with_hash(self, content_hash, status=SUCCESS):
+        """Shops whose current favicon has the given content hash"""
+        rows = self._connection().execute(
+            'SELECT * FROM shops WHERE content_hash = ? AND status = ?', (content_hash, status))
+        return [dict(row) for row in rows]
+
+    def content_hashes(self):
+        """Every content hash a shop record still refers to"""
+        rows = self._connection().execute('SELECT DISTINCT content_hash FROM shops WHERE content_hash IS NOT NULL')
+        return {row['content_hash'] for row in rows}
+
+    def shared_hashes(self, limit=20):
+        """Favicons shared by the most successful shops, with an example file"""
+        rows = self._connection().execute(
+            'SELECT content_hash, COUNT(*) AS shops, COUNT(DISTINCT domain) AS domains, MIN(file_path) AS file_path '
+            'FROM shops WHERE status = ? AND content_hash IS NOT NULL GROUP BY content_hash '
+            'HAVING COUNT(*) > 1 ORDER BY shops DESC LIMIT ?', (SUCCESS, limit))
+        return [dict(row) for row in rows]
+
+    def count(self, status=SUCCESS):
+        return self._connection().execute('SELECT COUNT(*) FROM shops WHERE status = ?', (status,)).fetchone()[0]
+
+    def counts(self):
+        """Number of shops per status"""
+        rows = self._connection().execute('SELECT status, COUNT(*) AS n FROM shops GROUP BY status')
+        return {row['status']: row['n'] for row in rows}
+
+    # ----- writes -----
+
+    def _upsert(self, shop_id, domain=None, count_attempt=False, **fields):
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                'INSERT INTO shops (shop_id, domain, created_at, updated_at) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT(shop_id) DO NOTHING', (str(shop_id), domain, now, now))
+            assignments = ['updated_at = ?']
+            values = [now]
+            if domain:
+                assignments.append('domain = ?')
+                values.append(domain)
+            if count_attempt:
+                assignments.append('attempts = attempts + 1')
+            for column, value in fields.items():
+                assignments.append(f'{column} = ?')
+                values.append(value)
+            conn.execute(f'UPDATE shops SET {", ".join(assignments)} WHERE shop_id = ?', values + [str(shop_id)])
+
+    def mark_pending(self, shop_id, domain=None):
+        self._upsert(shop_id, domain, status=PENDING)
+
+    def mark_success(self, shop_id, domain, file_path, content_hash=None, count_attempt=True):
+        """Record a saved favicon; the hash is computed from the file when not given"""
+        if content_hash is None and file_path and os.path.exists(file_path):
+            content_hash = file_sha256(file_path)
+        self._upsert(shop_id, domain, count_attempt=count_attempt, status=SUCCESS, file_path=file_path,
+                     content_hash=content_hash, last_error=None)
+
+    def mark_failed(self, shop_id, domain, error=None):
+        self._upsert(shop_id, domain, count_attempt=True, status=FAILED, last_error=error)
+
+    def mark_not_correct(self, shop_id, file_path):
+        """A reviewer rejected the favicon; it gets scraped again on the next run"""
+        self._upsert(shop_id, status=NOT_CORRECT, file_path=file_path)
+
+    # ----- bootstrap -----
+
+    def import_directory(self, favicon_dir=FAVICON_DIR, not_correct_dir=NOT_CORRECT_DIR):
+        """One-off import of existing favicon files (the last time the directory is listed)"""
+        imported = 0
+        # not_correct first, so a shop that was re-scraped after rejection ends up as success
+        for directory, status in ((not_correct_dir, NOT_CORRECT), (favicon_dir, SUCCESS)):
+            if not os.path.isdir(directory):
+                continue
+            conn = self._connection()
+            now = time.time()
+            with conn:
+                for entry in os.scandir(directory):
+                    if not entry.is_file() or not entry.name.endswith(FAVICON_EXTENSIONS):
+                        continue
+                    conn.execute(
+                        'INSERT INTO shops (shop_id, status, file_path, created_at, updated_at) VALUES (?, ?, ?, ?, ?) '
+                        'ON CONFLICT(shop_id) DO UPDATE SET status = excluded.status, file_path = excluded.file_path, '
+                        'updated_at = excluded.updated_at',
+                        (shop_id_from_filename(entry.name), status, entry.path, now, now))
+                    imported += 1
+        return imported
+
+_default_store = None
+
+def open_store(path=None):
+    """Shared store for the given path; a new database is seeded from the favicons/ directory once"""
+    global _default_store
+    path = path or STATUS_DB
+    if _default_store is not None and _default_store.path == path:
+        return _default_store
+
+    is_new = not os.path.exists(path)
+    store = ShopStatusStore(path)
+    if is_new:
+        imported = store.import_directory()
+        if imported:
+            print(f"Imported {imported} existing favicon files into {path}")
+    _default_store = store
+    return store
+
+if __name__ == "__main__":
+    import sys
+
+    store = open_store()
+    if len(sys.argv) > 1 and sys.argv[1] == '--rebuild':
+        print(f"Re-importing favicon files into {store.path}...")
+        print(f"Imported {store.import_directory()} files")
+
+    print(f"Shop status in {store.path}:")
+    counts = store.counts()
+    for status in STATUSES:
+        print(f"  {status}: {counts.get(status, 0)}")
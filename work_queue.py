@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Shared Work Queue
+Lease-based queue of shops in a SQLite file, for running scrapers on several
+hosts at once. Shops are loaded once; every worker claims a few at a time with
+a time-limited lease, extends the lease with heartbeats while it works, and
+reports each result. Leases of workers that die run out and their shops go
+back to the queue, so nothing is skipped and nothing is scraped twice while
+its worker is alive.
+
+Put the queue file on storage every host can lock (a local disk shared over
+SMB/NFS with working locks); SQLite serializes the claims.
+"""
+
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+WORK_QUEUE_DB = os.environ.get('FAVICON_WORK_QUEUE', 'work_queue.db')
+LEASE_SECONDS = 300
+MAX_ATTEMPTS = 3  # A shop whose lease expired this many times is marked failed
+
+QUEUED = 'queued'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    idx           INTEGER PRIMARY KEY,
+    shop_id       TEXT NOT NULL,
+    domain        TEXT NOT NULL,
+    state         TEXT NOT NULL DEFAULT 'queued',
+    owner         TEXT,
+    lease_expires REAL,
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    result        TEXT,
+    error         TEXT,
+    updated_at    REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_state ON tasks(state, idx);
+"""
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+class WorkQueue:
+    """Claim/heartbeat/complete over a shared SQLite task table"""
+
+    def __init__(self, path=WORK_QUEUE_DB, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            # isolation_level=None: transactions are opened explicitly with BEGIN IMMEDIATE
+            conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _write(self, statements):
+        """Run (sql, params) pairs in one write transaction, returns the rowcount of the last"""
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            cursor = None
+            for sql, params in statements:
+                cursor = conn.execute(sql, params)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return cursor.rowcount if cursor is not None else 0
+
+    def load(self, shops):
+        """Add (index, shop_id, shop_domain) shops; rows already in the queue are left alone"""
+        conn = self._connection()
+        now = time.time()
+        added = 0
+        chunk = []
+        for shop in shops:
+            chunk.append(shop)
+            if len(chunk) >= 5000:
+                added += self._insert(conn, chunk, now)
+                chunk = []
+        if chunk:
+            added += self._insert(conn, chunk, now)
+        return added
+
+    def _insert(self, conn, chunk, now):
+        conn.execute('BEGIN IMMEDIATE')
+        before = conn.total_changes
+        conn.executemany('INSERT OR IGNORE INTO tasks (idx, shop_id, domain, updated_at) VALUES (?, ?, ?, ?)',
+                         [(index, shop_id, domain, now) for index, shop_id, domain in chunk])
+        conn.execute('COMMIT')
+        return conn.total_changes - before
+
+    def expire_leases(self):
+        """Put shops with a run-out lease back in the queue (or fail them after max_attempts)"""
+        now = time.time()
+        return self._write([
+            ("UPDATE tasks SET state = 'failed', owner = NULL, error = 'lease expired too often', updated_at = ? "
+             "WHERE state = 'leased' AND lease_expires < ? AND attempts >= ?", (now, now, self.max_attempts)),
+            ("UPDATE tasks SET state = 'queued', owner = NULL, updated_at = ? "
+             "WHERE state = 'leased' AND lease_expires < ?", (now, now)),
+        ])
+
+    def claim(self, worker, limit):
+        """Lease up to `limit` queued shops to a worker, lowest row first"""
+        self.expire_leases()
+        now = time.time()
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = conn.execute("SELECT idx, shop_id, domain FROM tasks WHERE state = 'queued' ORDER BY idx LIMIT ?",
+                                (limit,)).fetchall()
+            conn.executemany("UPDATE tasks SET state = 'leased', owner = ?, lease_expires = ?, attempts = attempts + 1, "
+                             "updated_at = ? WHERE idx = ?",
+                             [(worker, now + self.lease_seconds, now, row['idx']) for row in rows])
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return [(row['idx'], row['shop_id'], row['domain']) for row in rows]
+
+    def heartbeat(self, worker):
+        """Extend the leases a worker still holds, returns how many"""
+        now = time.time()
+        return self._write([("UPDATE tasks SET lease_expires = ?, updated_at = ? WHERE state = 'leased' AND owner = ?",
+                             (now + self.lease_seconds, now, worker))])
+
+    def complete(self, worker, index, result, error=None):
+        """Record a shop's result; ignored when the lease was lost to another worker"""
+        now = time.time()
+        state = DONE if result in ('success', 'skipped') else FAILED  # 'failed' and 'retry'
+        return self._write([("UPDATE tasks SET state = ?, result = ?, error = ?, owner = NULL, lease_expires = NULL, "
+                             "updated_at = ? WHERE idx = ? AND state = 'leased' AND owner = ?",
+                             (state, result, error, now, index, worker))]) == 1
+
+    def release(self, worker):
+        """Hand every shop a worker still holds back to the queue (clean shutdown)"""
+        now = time.time()
+        return self._write([("UPDATE tasks SET state = 'queued', owner = NULL, lease_expires = NULL, "
+                             "attempts = MAX(attempts - 1, 0), updated_at = ? WHERE state = 'leased' AND owner = ?",
+                             (now, worker))])
+
+    def requeue_failed(self):
+        now = time.time()
+        return self._write([("UPDATE tasks SET state = 'queued', attempts = 0, error = NULL, updated_at = ? "
+                             "WHERE state = 'failed'", (now,))])
+
+    def counts(self):
+        rows = self._connection().execute('SELECT state, COUNT(*) AS n FROM tasks GROUP BY state')
+        return {row['state']: row['n'] for row in rows}
+
+    def workers(self):
+        """Active workers and how many shops each one holds"""
+        rows = self._connection().execute(
+            "SELECT owner, COUNT(*) AS n FROM tasks WHERE state = 'leased' GROUP BY owner ORDER BY owner")
+        return {row['owner']: row['n'] for row in rows}
+
+class QueueReporter:
+    """Stands in for the job journal: FaviconScraper reports every finished shop here"""
+
+    def __init__(self, queue, worker):
+        self.queue = queue
+        self.worker = worker
+
+    def record_shop(self, index, shop_id, status, error=None):
+        if not self.queue.complete(self.worker, index, status, error):
+            print(f"  ⚠️  Lease on shop {shop_id} was lost, result not recorded in the queue")
+
+def run_queue_worker(queue, worker=None, batch_size=20, **scraper_options):
+    """Claim batches from the queue and scrape them until it is empty or a signal arrives"""
+    import signal
+    from google_favicon_scraper import FaviconScraper, print_summary
+
+    worker = worker or default_worker_id()
+    stop_requested = threading.Event()
+
+    def request_stop(signum, frame):
+        print(f"\n🛑 Received signal {signum}, finishing the current shop...")
+        stop_requested.set()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    # Leases are extended from a background thread, so a slow batch keeps its shops
+    heartbeat_stop = threading.Event()
+
+    def heartbeat_loop():
+        while not heartbeat_stop.wait(queue.lease_seconds / 3):
+            queue.heartbeat(worker)
+
+    heartbeat = threading.Thread(target=heartbeat_loop, daemon=True)
+    heartbeat.start()
+
+    scraper = FaviconScraper(journal=QueueReporter(queue, worker), journal_done={}, stop_event=stop_requested,
+                             **scraper_options)
+    totals = {'processed': 0, 'successful': 0, 'skipped': 0, 'cached': 0}
+    print(f"👷 Worker {worker} pulling from {queue.path}")
+    try:
+        while not stop_requested.is_set():
+            batch = queue.claim(worker, batch_size)
+            if not batch:
+                print(f"🎉 Queue is empty")
+                break
+            print(f"📦 Claimed {len(batch)} shops (rows {batch[0][0]}-{batch[-1][0]})")
+            for key, value in scraper.run(batch).items():
+                totals[key] += value
+    finally:
+        scraper.close()
+        heartbeat_stop.set()
+        released = queue.release(worker)
+        if released:
+            print(f"↩️  Returned {released} unfinished shops to the queue")
+    print_summary(totals)
+    return totals
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Shared shop queue for scraping from several hosts")
+    parser.add_argument('--queue', default=WORK_QUEUE_DB, help="Queue database on shared storage")
+    parser.add_argument('--lease', type=float, default=LEASE_SECONDS, help="Lease length in seconds")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    load_parser = subparsers.add_parser('load', help="Add the shops of a CSV to the queue")
+    load_parser.add_argument('csv_file')
+
+    work_parser = subparsers.add_parser('work', help="Claim and scrape shops until the queue is empty")
+    work_parser.add_argument('--batch', type=int, default=20, help="Shops claimed per lease")
+    work_parser.add_argument('--worker', help="Worker name (default: host:pid)")
+    work_parser.add_argument('--rate', type=float, default=4.0, help="Target Google lookups per minute for this worker")
+    work_parser.add_argument('--no-site-first', action='store_true', help="Skip the direct-from-site HTTP pass")
+
+    subparsers.add_parser('status', help="Show queue counts and active workers")
+    subparsers.add_parser('requeue-failed', help="Give failed shops another round")
+    args = parser.parse_args()
+
+    queue = WorkQueue(args.queue, lease_seconds=args.lease)
+    if args.command == 'load':
+        from shop_input import iter_shops
+        print(f"Added {queue.load(iter_shops(args.csv_file))} shops to {queue.path}")
+    elif args.command == 'work':
+        run_queue_worker(queue, args.worker, args.batch, rate=args.rate, site_first=not args.no_site_first)
+    elif args.command == 'requeue-failed':
+        print(f"Requeued {queue.requeue_failed()} failed shops")
+
+    counts = queue.counts()
+    print(f"Queue {queue.path}: " + ', '.join(f"{state} {counts.get(state, 0)}" for state in (QUEUED, LEASED, DONE, FAILED)))
+    for owner, held in queue.workers().items():
+        print(f"  {owner}: {held} leased")